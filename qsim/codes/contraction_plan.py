@@ -0,0 +1,211 @@
+import numpy as np
+from functools import lru_cache
+
+"""Cached reshape/transpose plans for applying multi-qudit operators to states. The plans only depend on the shape
+of the problem, so they are computed once and shared by all code modules."""
+
+__all__ = ['ContractionPlan', 'left_multiply_plan', 'right_multiply_plan', 'left_multiply', 'right_multiply',
+           'cache_info', 'cache_clear']
+
+
+class ContractionPlan(object):
+    def __init__(self, shape_in, order_in, shape_out, order_out, sorted_apply_to, op_shape=None, op_order=None):
+        """
+        Precomputed index bookkeeping for a single left or right multiplication.
+
+        :param shape_in: Shape to reshape the state into (Fortran order) before transposing.
+        :param order_in: Transpose order bringing the qudits acted on to the front (or back) of the state.
+        :param shape_out: Shape to reshape the product into (Fortran order) before transposing back.
+        :param order_out: Transpose order restoring the original qudit ordering.
+        :param sorted_apply_to: The qudit indices the plan acts on, in sorted order.
+        :param op_shape: If apply_to was unsorted, the tensor shape to reshape the operator into.
+        :param op_order: If apply_to was unsorted, the transpose order sorting the operator's tensor factors.
+        """
+        self.shape_in = shape_in
+        self.order_in = order_in
+        self.shape_out = shape_out
+        self.order_out = order_out
+        self.sorted_apply_to = sorted_apply_to
+        self.op_shape = op_shape
+        self.op_order = op_order
+
+    def sort_operator(self, op):
+        """Permute the tensor factors of ``op`` so that it acts on ``sorted_apply_to``."""
+        if self.op_order is None:
+            return op
+        return np.reshape(np.transpose(np.reshape(op, self.op_shape, order='F'), axes=self.op_order), op.shape,
+                          order='F')
+
+
+def _operator_permutation(d, apply_to):
+    n_op = len(apply_to)
+    permut = np.argsort(apply_to)
+    transpose_ord = np.zeros(2 * n_op, dtype=int)
+    transpose_ord[:n_op] = (n_op - 1) * np.ones(n_op, dtype=int) - np.flip(permut, axis=0)
+    transpose_ord[n_op:] = (2 * n_op - 1) * np.ones(n_op, dtype=int) - np.flip(permut, axis=0)
+    return (d,) * (2 * n_op), tuple(transpose_ord.tolist()), tuple(int(i) for i in np.asarray(apply_to)[permut])
+
+
+@lru_cache(maxsize=1024)
+def _left_multiply_plan(d, dimension, apply_to, op_shape, is_ket):
+    n_op = len(apply_to)
+    op_shape_tensor, op_order = None, None
+    if any(apply_to[i + 1] < apply_to[i] for i in range(n_op - 1)):
+        op_shape_tensor, op_order, apply_to = _operator_permutation(d, apply_to)
+
+    # Generate all shapes for left multiplication
+    preshape = d * np.ones((2, n_op), dtype=int)
+    preshape[1, 0] = dimension // (d ** (1 + apply_to[n_op - 1]))
+    if n_op > 1:
+        preshape[1, 1:] = np.flip(d ** np.diff(apply_to)) // d
+
+    shape1 = np.zeros(2 * n_op + 1, dtype=int)
+    shape2 = np.zeros(2 * n_op + 1, dtype=int)
+    order1 = np.zeros(2 * n_op + 1, dtype=int)
+    order2 = np.zeros(2 * n_op + 1, dtype=int)
+
+    shape1[:-1] = np.flip(preshape, axis=0).reshape((2 * n_op), order='F')
+    shape1[-1] = -1
+    shape2[:-1] = preshape.reshape((-1), order='C')
+    shape2[-1] = -1
+
+    preorder = np.arange(2 * n_op)
+    order1[:-1] = np.flip(preorder.reshape((-1, 2), order='C'), axis=1).reshape((-1), order='F')
+    order2[:-1] = np.flip(preorder.reshape((2, -1), order='C'), axis=0).reshape((-1), order='F')
+    order1[-1] = 2 * n_op
+    order2[-1] = 2 * n_op
+    return ContractionPlan(tuple(shape1.tolist()), tuple(order1.tolist()), tuple(shape2.tolist()),
+                           tuple(order2.tolist()), apply_to, op_shape=op_shape_tensor, op_order=op_order)
+
+
+@lru_cache(maxsize=1024)
+def _right_multiply_plan(d, dimension, apply_to, op_shape, is_ket):
+    n_op = len(apply_to)
+    op_shape_tensor, op_order = None, None
+    if any(apply_to[i + 1] < apply_to[i] for i in range(n_op - 1)):
+        op_shape_tensor, op_order, apply_to = _operator_permutation(d, apply_to)
+
+    # Generate necessary shapes
+    preshape = d * np.ones((2, n_op), dtype=int)
+    preshape[0, 0] = dimension // (d ** (1 + apply_to[n_op - 1]))
+    if n_op > 1:
+        preshape[0, 1:] = np.flip(d ** np.diff(apply_to)) // d
+
+    shape3 = np.zeros(2 * n_op + 2, dtype=int)
+    shape3[0] = dimension
+    shape3[1:-1] = np.reshape(preshape, (2 * n_op), order='F')
+    shape3[-1] = -1
+
+    shape4 = np.zeros(2 * n_op + 2, dtype=int)
+    shape4[0] = dimension
+    shape4[1:n_op + 1] = preshape[0]
+    shape4[n_op + 1] = -1
+    shape4[n_op + 2:] = preshape[1]
+
+    order3 = np.zeros(2 * n_op + 2, dtype=int)
+    order3[0] = 0
+    order3[1:n_op + 2] = 2 * np.arange(n_op + 1) + np.ones(n_op + 1, dtype=int)
+    order3[n_op + 2:] = 2 * np.arange(1, n_op + 1)
+
+    order4 = np.zeros(2 * n_op + 2, dtype=int)
+    order4[0] = 0
+    order4[1] = 1
+    order4[2:] = np.flip(np.arange(2, 2 * n_op + 2).reshape((2, -1), order='C'), axis=0).reshape((-1), order='F')
+    return ContractionPlan(tuple(shape3.tolist()), tuple(order3.tolist()), tuple(shape4.tolist()),
+                           tuple(order4.tolist()), apply_to, op_shape=op_shape_tensor, op_order=op_order)
+
+
+def _key(apply_to, op_shape):
+    if isinstance(apply_to, (int, np.integer)):
+        apply_to = [apply_to]
+    return tuple(int(i) for i in apply_to), tuple(int(i) for i in op_shape)
+
+
+def left_multiply_plan(d: int, dimension: int, apply_to, op_shape, is_ket: bool):
+    """
+    Return the cached plan for left multiplying a ``d``-dimensional qudit operator of shape ``op_shape`` on the
+    qudits in ``apply_to`` of a state with leading dimension ``dimension``.
+
+    :param d: Dimension of a single (logical) qudit.
+    :type d: int
+    :param dimension: Dimension of the state the operator acts on.
+    :type dimension: int
+    :param apply_to: Zero-based indices of qudit locations to apply the operator.
+    :type apply_to: list of int
+    :param op_shape: Shape of the operator.
+    :type op_shape: tuple
+    :param is_ket: Whether the state is a ket or a density matrix.
+    :type is_ket: bool
+    :return: The contraction plan.
+    :rtype: ContractionPlan
+    """
+    apply_to, op_shape = _key(apply_to, op_shape)
+    return _left_multiply_plan(int(d), int(dimension), apply_to, op_shape, bool(is_ket))
+
+
+def right_multiply_plan(d: int, dimension: int, apply_to, op_shape, is_ket: bool):
+    """
+    Return the cached plan for right multiplying a ``d``-dimensional qudit operator of shape ``op_shape`` on the
+    qudits in ``apply_to`` of a state with leading dimension ``dimension``. See :py:func:`left_multiply_plan`.
+    """
+    apply_to, op_shape = _key(apply_to, op_shape)
+    return _right_multiply_plan(int(d), int(dimension), apply_to, op_shape, bool(is_ket))
+
+
+def left_multiply(state, apply_to, op, d: int):
+    """
+    Compute :math:`A\\rho` for a multi-qudit operator :math:`A` acting on the qudits in ``apply_to``.
+
+    :param state: Input wavefunction or density matrix.
+    :type state: np.ndarray
+    :param apply_to: Zero-based indices of qudit locations to apply the operator.
+    :type apply_to: list of int
+    :param op: Operator to act with.
+    :type op: np.ndarray (2-dimensional)
+    :param d: Dimension of a single (logical) qudit.
+    :type d: int
+    :return: The product, as a plain numpy array with the same shape as ``state``.
+    :rtype: np.ndarray
+    """
+    state = np.asarray(state)
+    plan = left_multiply_plan(d, state.shape[0], apply_to, op.shape, state.shape[-1] == 1)
+    op = plan.sort_operator(op)
+    out = state.reshape(plan.shape_in, order='F').transpose(plan.order_in)
+    out = np.dot(op, out.reshape((op.shape[0], -1), order='F'))
+    out = out.reshape(plan.shape_out, order='F').transpose(plan.order_out)
+    return out.reshape(state.shape, order='F')
+
+
+def right_multiply(state, apply_to, op, d: int):
+    """
+    Compute :math:`\\rho A^\\dagger` for a multi-qudit operator :math:`A` acting on the qudits in ``apply_to``.
+
+    :param state: Input density matrix.
+    :type state: np.ndarray
+    :param apply_to: Zero-based indices of qudit locations to apply the operator.
+    :type apply_to: list of int
+    :param op: Operator to act with.
+    :type op: np.ndarray (2-dimensional)
+    :param d: Dimension of a single (logical) qudit.
+    :type d: int
+    :return: The product, as a plain numpy array with the same shape as ``state``.
+    :rtype: np.ndarray
+    """
+    state = np.asarray(state)
+    plan = right_multiply_plan(d, state.shape[0], apply_to, op.shape, state.shape[-1] == 1)
+    op = plan.sort_operator(op)
+    out = state.reshape(plan.shape_in, order='F').transpose(plan.order_in)
+    out = np.dot(out.reshape((-1, op.shape[0]), order='F'), op.conj().T)
+    out = out.reshape(plan.shape_out, order='F').transpose(plan.order_out)
+    return out.reshape(state.shape, order='F')
+
+
+def cache_info():
+    """Return the hit/miss statistics of the left and right multiplication plan caches."""
+    return {'left_multiply': _left_multiply_plan.cache_info(), 'right_multiply': _right_multiply_plan.cache_info()}
+
+
+def cache_clear():
+    """Empty the left and right multiplication plan caches."""
+    _left_multiply_plan.cache_clear()
+    _right_multiply_plan.cache_clear()
@@ -3,6 +3,7 @@ from qsim import tools
 from . import qubit
 from scipy.linalg import expm
 from qsim.codes.quantum_state import State
+from qsim.codes import contraction_plan
 from typing import Union
 
 
@@ -93,50 +94,9 @@ def left_multiply(state: State, apply_to: Union[int, list], op):
             pauli = True
         else:
             op = tools.tensor_product(op)
-    n_op = len(apply_to)
     if not pauli:
-        if tools.is_sorted(apply_to):
-            # Generate all shapes for left multiplication
-            preshape = (d**n) * np.ones((2, n_op), dtype=int)
-            preshape[1, 0] = int(state.dimension / ((d**n) ** (1 + apply_to[n_op - 1])))
-            if n_op > 1:
-                preshape[1, 1:] = np.flip((d**n) ** np.diff(apply_to)) / (d**n)
-
-            shape1 = np.zeros(2 * n_op + 1, dtype=int)
-            shape2 = np.zeros(2 * n_op + 1, dtype=int)
-            order1 = np.zeros(2 * n_op + 1, dtype=int)
-            order2 = np.zeros(2 * n_op + 1, dtype=int)
-
-            shape1[:-1] = np.flip(preshape, axis=0).reshape((2 * n_op), order='F')
-            shape1[-1] = -1
-            shape2[:-1] = preshape.reshape((-1), order='C')
-            shape2[-1] = -1
-
-            preorder = np.arange(2 * n_op)
-            order1[:-1] = np.flip(preorder.reshape((-1, 2), order='C'), axis=1).reshape((-1), order='F')
-            order2[:-1] = np.flip(preorder.reshape((2, -1), order='C'), axis=0).reshape((-1), order='F')
-            order1[-1] = 2 * n_op
-            order2[-1] = 2 * n_op
-
-            # Now left multiply
-            out = state.reshape(shape1, order='F').transpose(order1)
-            out = np.dot(op, out.reshape(((d**n) ** n_op, -1), order='F'))
-            out = out.reshape(shape2, order='F').transpose(order2)
-            out = out.reshape(state.shape, order='F')
-            return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code)
-        else:
-            # Need to reshape the operator given
-            new_shape = (d**n) * np.ones(2 * n_op, dtype=int)
-            permut = np.argsort(apply_to)
-            transpose_ord = np.zeros(2 * n_op, dtype=int)
-            transpose_ord[:n_op] = permut
-            transpose_ord[n_op:] = n_op * np.ones(n_op, dtype=int) + permut
-
-            sorted_op = np.reshape(np.transpose(np.reshape(op, new_shape, order='F'), axes=transpose_ord),
-                                   ((d**n) ** n_op, (d**n) ** n_op), order='F')
-            sorted_apply_to = apply_to[permut]
-
-            return left_multiply(state, sorted_apply_to, sorted_op)
+        out = contraction_plan.left_multiply(state, apply_to, op, d ** n)
+        return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code)
     else:
         # op should be a list of Pauli operators, or
         out = state.copy()
@@ -173,54 +133,9 @@ def right_multiply(state: State, apply_to: Union[int, list], op):
             op = tools.tensor_product(op)
     if state.is_ket:
         print('Warning: right multiply functionality currently applies the operator and daggers the s.')
-    n_op = len(apply_to)
     if not pauli:
-        if tools.is_sorted(apply_to):
-            # generate necessary shapes
-            preshape = (d**n) * np.ones((2, n_op), dtype=int)
-            preshape[0, 0] = int(state.dimension / ((d**n) ** (1 + apply_to[n_op - 1])))
-            if n_op > 1:
-                preshape[0, 1:] = np.flip((d**n) ** np.diff(apply_to)) / (d**n)
-
-            shape3 = np.zeros(2 * n_op + 2, dtype=int)
-            shape3[0] = state.dimension
-            shape3[1:-1] = np.reshape(preshape, (2 * n_op), order='F')
-            shape3[-1] = -1
-
-            shape4 = np.zeros(2 * n_op + 2, dtype=int)
-            shape4[0] = state.dimension
-            shape4[1:n_op + 1] = preshape[0]
-            shape4[n_op + 1] = -1
-            shape4[n_op + 2:] = preshape[1]
-
-            order3 = np.zeros(2 * n_op + 2, dtype=int)
-            order3[0] = 0
-            order3[1:n_op + 2] = 2 * np.arange(n_op + 1) + np.ones(n_op + 1)
-            order3[n_op + 2:] = 2 * np.arange(1, n_op + 1)
-
-            order4 = np.zeros(2 * n_op + 2, dtype=int)
-            order4[0] = 0
-            order4[1] = 1
-            order4[2:] = np.flip(np.arange(2, 2 * n_op + 2).reshape((2, -1), order='C'), axis=0).reshape((-1), order='F')
-
-            # right multiply
-            out = state.reshape(shape3, order='F').transpose(order3)
-            out = np.dot(out.reshape((-1, (d**n) ** n_op), order='F'), op.conj().T)
-            out = out.reshape(shape4, order='F').transpose(order4)
-            out = out.reshape(state.shape, order='F')
-            return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code)
-        else:
-            new_shape = 2 * np.ones(2 * n_op, dtype=int)
-            permut = np.argsort(apply_to)
-            transpose_ord = np.zeros(2 * n_op, dtype=int)
-            transpose_ord[:n_op] = permut
-            transpose_ord[n_op:] = n_op * np.ones(n_op, dtype=int) + permut
-
-            sorted_op = np.reshape(np.transpose(np.reshape(op, new_shape, order='F'), axes=transpose_ord),
-                                   ((d**n) ** n_op, (d**n) ** n_op), order='F')
-            sorted_apply_to = apply_to[permut]
-
-            return right_multiply(state, sorted_apply_to, sorted_op)
+        out = contraction_plan.right_multiply(state, apply_to, op, d ** n)
+        return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code)
     else:
         out = state.copy()
         for i in range(len(apply_to)):
@@ -3,12 +3,65 @@ import networkx as nx
 from qsim.codes import qubit, rydberg
 from qsim.codes.quantum_state import State
 from qsim import tools
-from scipy.linalg import expm
+from scipy.linalg import expm, hadamard
 import scipy.sparse as sparse
 from scipy.sparse.linalg import expm_multiply
 from qsim.graph_algorithms.graph import Graph, IS_projector
 
 
+def _walsh_hadamard(state, block=5):
+    # Unnormalized Walsh-Hadamard transform of each column, computed as real matrix products on blocks of qubits
+    n = int(np.log2(state.shape[0]))
+    out = np.array(state, dtype=np.complex128).view(np.float64)
+    i = 0
+    while i < n:
+        k = min(block, n - i)
+        out = np.matmul(hadamard(2 ** k, dtype=np.float64), out.reshape((2 ** i, 2 ** k, -1)))
+        i += k
+    return out.reshape((state.shape[0], -1)).view(np.complex128)
+
+
+def _phase_lookup_table(*diagonals):
+    """
+    Factor diagonals of integer weighted Hamiltonians, which take few distinct values, into a table of distinct values
+    and a small integer index into the table for each basis state.
+
+    :param diagonals: Diagonals of the same shape, e.g. the node and edge terms of a Hamiltonian, tabulated jointly so
+        that they can be recombined with any energies.
+    :type diagonals: np.ndarray
+    :return: The distinct values of each diagonal, as a list of arrays of the same length, and the flat index array,
+        of the smallest unsigned integer type which fits.
+    :rtype: (list of np.ndarray, np.ndarray)
+    """
+    values = []
+    key = 0
+    for diagonal in diagonals:
+        unique, index = np.unique(np.asarray(diagonal).reshape(-1), return_inverse=True)
+        key = key * len(unique) + index.reshape(-1)
+        values.append(unique)
+    key, index = np.unique(key, return_inverse=True)
+    table = np.unravel_index(key, [len(unique) for unique in values])
+    return [unique[i] for unique, i in zip(values, table)], index.reshape(-1).astype(np.min_scalar_type(len(key) - 1))
+
+
+def _lookup_phases(values, index, time):
+    # exp(-i time values[index]) as a column, or one column per time if time is an array, gathered from the phases of
+    # the distinct values
+    phases = np.exp(-1j * np.multiply.outer(values, time))[index]
+    if np.ndim(time) == 0:
+        return phases[:, np.newaxis]
+    return phases
+
+
+def _cost_labels(hamiltonian):
+    # Integer part of the diagonal of a cost Hamiltonian, cached until its energies change
+    energies = tuple(np.atleast_1d(hamiltonian.energies))
+    if hamiltonian._cost_labels is None or hamiltonian._cost_labels[0] != energies:
+        diagonal = np.asarray(hamiltonian.hamiltonian.diagonal()).real.flatten()
+        hamiltonian._cost_labels = (energies, diagonal.astype(np.int64))
+    return hamiltonian._cost_labels[1]
+
+
 class HamiltonianDriver(object):
     def __init__(self, transition: tuple = (0, 1), energies: tuple = (1,), pauli='X', code=qubit, IS_subspace=False,
                  graph=None):
@@ -264,8 +317,11 @@ class HamiltonianDriver(object):
 
     def evolve(self, state: State, time):
         r"""
-        Use reshape to efficiently implement evolution under :math:`H_B=\\sum_i X_i`
+        Use reshape to efficiently implement evolution under :math:`H_B=\\sum_i X_i`. If ``time`` is an array, ``state``
+        is a batch of kets stacked as columns, and each column is evolved for the corresponding time.
         """
+        if np.ndim(time) > 0:
+            return self._evolve_batch(state, np.asarray(time))
         if not self.IS_subspace:
             # We don't want to modify the original s
             out = state.copy()
@@ -298,6 +354,35 @@ class HamiltonianDriver(object):
                                  is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
 
 
+    def _evolve_batch(self, state: State, times):
+        if self.IS_subspace:
+            out = np.hstack([self.evolve(state[:, [k]], times[k]) for k in range(len(times))])
+            return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
+        if self.code is qubit and self.pauli == 'X' and sorted(self.transition) == [0, 1]:
+            # The mixer is diagonal in the Hadamard basis, with eigenvalue n - 2|z| on the basis state z
+            number_qubits = state.number_logical_qudits
+            weights = np.zeros(state.shape[0], dtype=int)
+            for i in range(number_qubits):
+                weights += (np.arange(state.shape[0]) >> i) & 1
+            phases = np.exp(-1j * self.energies[0] * np.outer(number_qubits - 2 * np.arange(number_qubits + 1), times))
+            out = _walsh_hadamard(_walsh_hadamard(state) * phases[weights]) / 2 ** number_qubits
+            return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=state.graph)
+        # Diagonalize the single qudit operator once, then build one propagator per column
+        eigenvalues, eigenvectors = np.linalg.eigh(self._operator)
+        phases = np.exp(-1j * self.energies[0] * np.outer(times, eigenvalues))
+        propagators = np.einsum('xk,bk,yk->bxy', eigenvectors, phases, eigenvectors.conj())
+        d = eigenvectors.shape[0]
+        out = np.array(state, dtype=np.complex128)
+        for i in range(state.number_logical_qudits):
+            view = out.reshape((d ** i, d, -1, out.shape[1]))
+            temp = np.zeros_like(view)
+            for x in range(d):
+                for y in range(d):
+                    temp[:, x, :, :] += propagators[:, x, y] * view[:, y, :, :]
+            out = temp.reshape(out.shape)
+        return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=state.graph)
+
+
 class HamiltonianMaxCut(object):
     def __init__(self, G: Graph, code=qubit, energies=(1,), cost_function=True, use_Z2_symmetry=False):
         # If MIS is true, create an MIS Hamiltonian. Otherwise, make a MaxCut Hamiltonian
@@ -306,6 +391,10 @@ class HamiltonianMaxCut(object):
         """
         self.code = code
         self.energies = energies
+        self.use_Z2_symmetry = use_Z2_symmetry
+        self.use_cost_function = cost_function
+        self._phase_table = None
+        self._cost_labels = None
         # Make sure all edges have weight attribute; default to 1
 
         self.graph = G
@@ -433,25 +522,44 @@ class HamiltonianMaxCut(object):
         else:
             return -1j * self.hamiltonian
 
+    @property
+    def cost_labels(self):
+        """Integer part of the cost of each basis state at the current energies, so that the distribution of the cost
+        of a state is ``np.bincount`` of these labels weighted by its probabilities. Computed on first use and when the
+        energies change."""
+        return _cost_labels(self)
+
     @property
     def optimum(self):
         # Optimum for non-diagonal Hamiltonians can be found by computing the optimum in the standard basis,
         # which is done in self.__init__()
         return self.energies[0] * self._optimum
 
+    def _phases(self, time):
+        # The lookup table is built on first use
+        if self._phase_table is None:
+            self._phase_table = _phase_lookup_table(self._diagonal_hamiltonian)
+        (values,), index = self._phase_table
+        return _lookup_phases(values, index, time)
+
     def evolve(self, state: State, time):
         if state.is_ket:
             if self._is_diagonal:
-                # It's quicker to exponentiate a diagonal array than use expm_multiply
-                return State(np.exp(-1j * time * self._diagonal_hamiltonian) * state, is_ket=state.is_ket,
+                # It's quicker to look up the phases of the few distinct energies than use expm_multiply
+                return State(self._phases(time) * state, is_ket=state.is_ket,
+                             IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
+            elif np.ndim(time) > 0:
+                # Batch of kets stacked as columns, each evolved for its own time
+                return State(np.hstack([expm_multiply(-1j * time[k] * self.hamiltonian, state[:, [k]])
+                                        for k in range(len(time))]), is_ket=state.is_ket,
                              IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
             else:
                 return State(expm_multiply(-1j * time * self.hamiltonian, state), is_ket=state.is_ket,
                              IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
         else:
             if self._is_diagonal:
-                return State(np.exp(-1j * time * self._diagonal_hamiltonian) * state * np.exp(
-                    1j * time * self._diagonal_hamiltonian).T, is_ket=state.is_ket, IS_subspace=state.IS_subspace,
+                phases = self._phases(time)
+                return State(phases * state * phases.conj().T, is_ket=state.is_ket, IS_subspace=state.IS_subspace,
                              code=state.code, graph=self.graph)
             else:
                 temp = expm(-1j * time * self.hamiltonian)
@@ -534,6 +642,8 @@ class HamiltonianMIS(object):
         self.energies = energies
         self.IS_subspace = IS_subspace
         self.optimization = 'max'
+        self._phase_table = None
+        self._cost_labels = None
         if not self.IS_subspace:
             # Store node and edge terms separately so the Hamiltonian can be dynamically updated when energies
             # are changed
@@ -692,6 +802,13 @@ class HamiltonianMIS(object):
         else:
             return self.energies[0] * self._diagonal_hamiltonian_node_terms
 
+    @property
+    def cost_labels(self):
+        """Integer part of the cost of each basis state at the current energies, so that the distribution of the cost
+        of a state is ``np.bincount`` of these labels weighted by its probabilities. Computed on first use and when the
+        energies change."""
+        return _cost_labels(self)
+
     @property
     def optimum(self):
         # This needs to be recomputed because the optimum depends on the energies
@@ -701,18 +818,36 @@ class HamiltonianMIS(object):
         else:
             raise NotImplementedError('Optimum unknown for non-diagonal Hamiltonians')
 
+    def _phases(self, time):
+        # The lookup table of node and edge terms is built on first use, and combined with the current energies
+        if self._phase_table is None:
+            if self.IS_subspace:
+                self._phase_table = _phase_lookup_table(self._diagonal_hamiltonian_node_terms)
+            else:
+                self._phase_table = _phase_lookup_table(self._diagonal_hamiltonian_node_terms,
+                                                        self._diagonal_hamiltonian_edge_terms)
+        values, index = self._phase_table
+        if self.IS_subspace:
+            return _lookup_phases(self.energies[0] * values[0], index, time)
+        return _lookup_phases(self.energies[0] * values[0] - self.energies[1] * values[1], index, time)
+
     def evolve(self, state: State, time):
         if state.is_ket:
             if self._is_diagonal:
-                return State(np.exp(-1j * time * self._diagonal_hamiltonian) * state, is_ket=state.is_ket,
+                return State(self._phases(time) * state, is_ket=state.is_ket,
+                             IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
+            elif np.ndim(time) > 0:
+                # Batch of kets stacked as columns, each evolved for its own time
+                return State(np.hstack([expm_multiply(-1j * time[k] * self.hamiltonian, state[:, [k]])
+                                        for k in range(len(time))]), is_ket=state.is_ket,
                              IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
             else:
                 return State(expm_multiply(-1j * time * self.hamiltonian, state), is_ket=state.is_ket,
                              IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
         else:
             if self._is_diagonal:
-                return State(np.exp(-1j * time * self._diagonal_hamiltonian) * state * np.exp(
-                    1j * time * self._diagonal_hamiltonian).T, is_ket=state.is_ket, IS_subspace=state.IS_subspace,
+                phases = self._phases(time)
+                return State(phases * state * phases.conj().T, is_ket=state.is_ket, IS_subspace=state.IS_subspace,
                              code=state.code, graph=self.graph)
             else:
                 temp = expm(-1j * time * self.hamiltonian)
@@ -1174,8 +1309,12 @@ class HamiltonianEnergyShift(object):
 
     def evolve(self, state: State, time):
         r"""
-        Use reshape to efficiently implement evolution under :math:`H_B=\\sum_i X_i`
+        Evolve under :math:`H=E\\sum_i |\\text{index}\\rangle\\langle\\text{index}|_i`, which is diagonal and counts
+        the qudits in the state ``index``. If ``time`` is an array, ``state`` is a batch of kets stacked as columns, and
+        each column is evolved for the corresponding time.
         """
+        if np.ndim(time) > 0:
+            return self._evolve_batch(state, np.asarray(time))
         if not self.IS_subspace:
             # We don't want to modify the original s
             out = state.copy()
@@ -1193,6 +1332,20 @@ class HamiltonianEnergyShift(object):
                 return State(exp_hamiltonian * state * exp_hamiltonian.conj().T,
                              is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
 
+    def _evolve_batch(self, state: State, times):
+        if self.IS_subspace:
+            diagonal = self._diagonal_hamiltonian[:, 0]
+        elif not self.code.logical_code:
+            # The Hamiltonian counts the qudits in the state self.index, so it is diagonal in the computational basis
+            diagonal = np.zeros(state.shape[0])
+            for i in range(state.number_logical_qudits):
+                diagonal += (np.arange(state.shape[0]) // self.code.d ** i) % self.code.d == self.index
+        else:
+            out = np.hstack([self.evolve(state[:, [k]], times[k]) for k in range(len(times))])
+            return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
+        return State(np.exp(-1j * self.energies[0] * np.multiply.outer(diagonal, times)) * state, is_ket=state.is_ket,
+                     IS_subspace=state.IS_subspace, code=state.code, graph=self.graph)
+
 
 class HamiltonianRydberg(object):
     def __init__(self, tails_graph: Graph, hard_constraint_graph = None, index: int = 0,
@@ -1331,8 +1484,12 @@ class HamiltonianRydberg(object):
 
     def evolve(self, state: State, time):
         r"""
-        Use reshape to efficiently implement evolution under :math:`H_B=\\sum_i X_i`
+        Evolve under the diagonal Hamiltonian of the van der Waals tails between atoms further apart than the blockade
+        radius. If ``time`` is an array, ``state`` is a batch of kets stacked as columns, and each column is evolved for
+        the corresponding time.
         """
+        if np.ndim(time) > 0:
+            return self._evolve_batch(state, np.asarray(time))
         if not self.IS_subspace:
             # We don't want to modify the original s
             out = state.copy()
@@ -1350,6 +1507,11 @@ class HamiltonianRydberg(object):
                 return State(exp_hamiltonian * state * exp_hamiltonian.conj().T,
                              is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code, graph=self.hard_constraint_graph)
 
-
-
-
+    def _evolve_batch(self, state: State, times):
+        if self.IS_subspace:
+            return State(np.exp(-1j * self.energies[0] * np.multiply.outer(self._diagonal_hamiltonian[:, 0], times)) *
+                         state, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code,
+                         graph=self.hard_constraint_graph)
+        out = np.hstack([self.evolve(state[:, [k]], times[k]) for k in range(len(times))])
+        return State(out, is_ket=state.is_ket, IS_subspace=state.IS_subspace, code=state.code,
+                     graph=self.hard_constraint_graph)
@@ -0,0 +1,96 @@
+import numpy as np
+from scipy.interpolate import CubicSpline
+from scipy.sparse import csr_matrix
+
+from qsim.evolution.schedule import _energy_operators
+
+"""Interaction picture with respect to a diagonal Hamiltonian H_0(t) = sum_k e_k(t) D_k. In the frame rotating with
+U_0(t) = exp(-i sum_k E_k(t) D_k), where E_k is the integral of e_k from the initial time, a state evolves only under
+the remaining Hamiltonian and dissipators conjugated by U_0. When H_0 is a large detuning, this removes the fast phases
+which otherwise limit the step size of adaptive integrators."""
+
+__all__ = ['InteractionPicture']
+
+
+class InteractionPicture(object):
+    def __init__(self, hamiltonian, schedule=lambda t: None, t0=0, tf=1, samples=1001):
+        """
+        :param hamiltonian: Diagonal Hamiltonian, linear in its energies, to move into the frame.
+        :param schedule: Function of time which sets the energies of the Hamiltonians. It is sampled at ``samples``
+            evenly spaced times to integrate the energies of ``hamiltonian``.
+        :type schedule: callable
+        :param t0: Initial time, at which the frame coincides with the lab frame.
+        :type t0: float
+        :param tf: Final time.
+        :type tf: float
+        :param samples: Number of times at which the energies are sampled. The energies are interpolated by a cubic
+            spline, which is integrated exactly.
+        :type samples: int
+        """
+        self.hamiltonian = hamiltonian
+        self.t0 = t0
+        diagonals = []
+        for operator in _energy_operators(hamiltonian):
+            operator = csr_matrix(operator)
+            if operator.count_nonzero() != np.count_nonzero(operator.diagonal()):
+                raise ValueError('The interaction picture is only implemented for diagonal Hamiltonians.')
+            diagonals.append(operator.diagonal().real)
+        self._diagonals = np.array(diagonals)
+        if tf == t0:
+            samples = 1
+        times = np.linspace(t0, tf, num=samples)
+        energies = []
+        for t in times:
+            schedule(t)
+            energies.append(np.atleast_1d(np.asarray(self.hamiltonian.energies, dtype=np.float64)))
+        energies = np.array(energies)
+        if samples > 1:
+            self._integral = CubicSpline(times, energies, axis=0).antiderivative()
+        else:
+            self._integral = lambda t: (t - t0) * energies[0]
+
+    def phases(self, t):
+        """
+        :param t: Time.
+        :type t: float
+        :return: The diagonal of :math:`U_0(t)`.
+        :rtype: np.ndarray
+        """
+        return np.exp(-1j * (np.asarray(self._integral(t)) @ self._diagonals))
+
+    def to_lab(self, t, state, is_ket=True):
+        """
+        Transform a ket or density matrix in the interaction picture at time ``t`` to the lab frame.
+
+        :param t: Time.
+        :type t: float
+        :param state: Ket of shape ``(dim, 1)`` or density matrix of shape ``(dim, dim)``.
+        :type state: np.ndarray
+        :param is_ket: Whether ``state`` is a ket.
+        :type is_ket: bool
+        :rtype: np.ndarray
+        """
+        return _rotate(self.phases(t), state, is_ket)
+
+    def to_interaction(self, t, state, is_ket=True):
+        """
+        Transform a ket or density matrix in the lab frame at time ``t`` to the interaction picture. This is also how
+        the generator of the remaining dynamics, evaluated in the lab frame, is transformed.
+
+        :param t: Time.
+        :type t: float
+        :param state: Ket of shape ``(dim, 1)`` or density matrix of shape ``(dim, dim)``.
+        :type state: np.ndarray
+        :param is_ket: Whether ``state`` is a ket.
+        :type is_ket: bool
+        :rtype: np.ndarray
+        """
+        return _rotate(self.phases(t).conj(), state, is_ket)
+
+
+def _rotate(phases, state, is_ket):
+    # U state for a ket, U state U^dagger for a density matrix, with U = diag(phases)
+    state = np.asarray(state)
+    if is_ket:
+        return phases[:, np.newaxis] * state
+    return phases[:, np.newaxis] * state * phases.conj()[np.newaxis, :]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from qsim.tools.parallel import parallel_map
+
+"""Parareal integration of an evolution over time slices. A cheap coarse propagator G gives a first guess of the state
+at the start of every slice. Each iteration then runs the accurate fine propagator F on every slice at once, in parallel,
+and sweeps through the slices serially with the correction U_{n+1} = G(U_n) + F(U_n^old) - G(U_n^old). After k
+iterations the first k slices are exact, so the iteration always converges to the serial fine solution, and it usually
+converges in far fewer iterations than there are slices."""
+
+__all__ = ['parareal']
+
+
+def parareal(fine, coarse, state, times, workers=None, tol=1e-4, max_iterations=None):
+    """
+    :param fine: Accurate propagator, ``fine(state, t0, tf)``, returning the array ``state`` evolved from ``t0`` to
+        ``tf``. It is run in worker processes, so it must return a picklable array.
+    :type fine: callable
+    :param coarse: Cheap propagator with the same signature as ``fine``. It is run serially in this process.
+    :type coarse: callable
+    :param state: Initial state.
+    :type state: np.ndarray
+    :param times: Sorted boundaries of the time slices, beginning with the initial time.
+    :type times: np.ndarray
+    :param workers: Number of worker processes for the fine propagator, see :py:func:`qsim.tools.parallel.parallel_map`.
+    :type workers: int, optional
+    :param tol: The iteration stops once no state at a slice boundary changes by more than ``tol`` in norm.
+    :type tol: float
+    :param max_iterations: Maximum number of iterations. Defaults to the number of slices, after which the result is
+        exactly the serial fine solution.
+    :type max_iterations: int, optional
+    :return: The states at ``times``, and a dictionary with the ``times``, the number of ``iterations``, and the
+        largest change at a slice boundary in each iteration, ``errors``.
+    :rtype: tuple
+    """
+    times = np.asarray(times)
+    n = len(times) - 1
+    if max_iterations is None:
+        max_iterations = n
+    states = [np.asarray(state)]
+    coarse_states = []
+    for i in range(n):
+        coarse_states.append(np.asarray(coarse(states[i], times[i], times[i + 1])))
+        states.append(coarse_states[i])
+    errors = []
+    for k in range(min(max_iterations, n)):
+        # The states at the first k + 1 boundaries are already exact, so only the later slices need fine solves
+        fine_states = parallel_map(lambda i: np.asarray(fine(states[i], times[i], times[i + 1])), range(k, n),
+                                   workers=workers)
+        corrected = states[:k + 1]
+        for i in range(k, n):
+            coarse_state = np.asarray(coarse(corrected[i], times[i], times[i + 1]))
+            corrected.append(coarse_state + fine_states[i - k] - coarse_states[i])
+            coarse_states[i] = coarse_state
+        errors.append(max(np.linalg.norm(corrected[i] - states[i]) for i in range(k + 1, n + 1)))
+        states = corrected
+        if errors[-1] <= tol:
+            break
+    return np.array(states), {'t': times, 'iterations': len(errors), 'errors': errors}
@@ -0,0 +1,290 @@
+"""Heisenberg picture propagation of Pauli observables through circuits of commuting Pauli rotations, such as QAOA.
+Pauli strings on n qubits are stored as packed bit arrays: qubit i is bit i % 64 of word i // 64 of the x and z
+arrays, and the string (x, z) denotes the Hermitian operator i^(x.z) X^x Z^z, so that Y = iXZ."""
+
+import numpy as np
+from qsim.codes import qubit
+from qsim.evolution.hamiltonian import HamiltonianMIS, HamiltonianMaxCut, HamiltonianDriver
+from qsim.graph_algorithms.graph import Graph
+
+__all__ = ['PauliSum', 'maxcut_pauli_sum', 'mis_pauli_sum', 'driver_pauli_sum', 'from_hamiltonian']
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def _popcount(a):
+    # Number of set bits in each row of a uint64 array of shape (M, W)
+    return _POPCOUNT[np.ascontiguousarray(a).view(np.uint8)].sum(axis=-1)
+
+
+def _parity(a):
+    # Parity of the number of set bits in each row of a uint64 array of shape (M, W)
+    a = np.bitwise_xor.reduce(a, axis=-1)
+    for shift in (32, 16, 8, 4, 2, 1):
+        a = a ^ (a >> np.uint64(shift))
+    return (a & np.uint64(1)).astype(bool)
+
+
+def _hash(keys):
+    # 64 bit hash of each row of a uint64 array, mixing each word with its position by the splitmix64 finalizer
+    with np.errstate(over='ignore'):
+        h = keys + np.uint64(0x9e3779b97f4a7c15) * np.arange(1, keys.shape[1] + 1, dtype=np.uint64)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return np.sum(h ^ (h >> np.uint64(31)), axis=1, dtype=np.uint64)
+
+
+class PauliSum(object):
+    def __init__(self, n: int, x=None, z=None, coefficients=None):
+        """
+        Real linear combination of Hermitian Pauli strings.
+
+        :param n: Number of qubits.
+        :type n: int
+        :param x: Packed X bits, of shape :math:`(M, \\lceil n/64 \\rceil)`.
+        :type x: np.ndarray
+        :param z: Packed Z bits, of the same shape as ``x``.
+        :type z: np.ndarray
+        :param coefficients: Real coefficient of each string, of shape :math:`(M,)`.
+        :type coefficients: np.ndarray
+        """
+        self.n = n
+        self.words = max(1, -(-n // 64))
+        if x is None:
+            x = np.zeros((0, self.words), dtype=np.uint64)
+            z = np.zeros((0, self.words), dtype=np.uint64)
+            coefficients = np.zeros(0)
+        self.x = np.asarray(x, dtype=np.uint64).reshape(-1, self.words)
+        self.z = np.asarray(z, dtype=np.uint64).reshape(-1, self.words)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64).reshape(-1)
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    def add_term(self, coefficient, paulis: dict):
+        """
+        Append a single Pauli string.
+
+        :param coefficient: Coefficient of the string.
+        :type coefficient: float
+        :param paulis: Map from qubit index to one of ``'X'``, ``'Y'``, or ``'Z'``. Qubits not present act as the
+            identity.
+        :type paulis: dict
+        :return: ``self``, to allow chaining.
+        :rtype: PauliSum
+        """
+        x = np.zeros((1, self.words), dtype=np.uint64)
+        z = np.zeros((1, self.words), dtype=np.uint64)
+        for i, pauli in paulis.items():
+            bit = np.uint64(1) << np.uint64(i % 64)
+            if pauli in ('X', 'Y'):
+                x[0, i // 64] |= bit
+            if pauli in ('Z', 'Y'):
+                z[0, i // 64] |= bit
+        self.x = np.concatenate([self.x, x])
+        self.z = np.concatenate([self.z, z])
+        self.coefficients = np.append(self.coefficients, coefficient)
+        return self
+
+    def weight(self):
+        """
+        :return: Number of qubits each string acts on nontrivially.
+        :rtype: np.ndarray
+        """
+        return _popcount(self.x | self.z)
+
+    def simplify(self, max_weight=None, min_coefficient=0):
+        """
+        Merge repeated strings, summing their coefficients, and drop negligible strings.
+
+        :param max_weight: If not ``None``, drop strings acting on more than ``max_weight`` qubits.
+        :type max_weight: int, optional
+        :param min_coefficient: Drop strings whose coefficient has absolute value at most ``min_coefficient``.
+        :type min_coefficient: float
+        :return: The simplified sum.
+        :rtype: PauliSum
+        """
+        if len(self) == 0:
+            return self
+        # Group strings by a 64 bit hash of their packed bits, and fall back to exact sorting on a hash collision
+        keys = np.concatenate([self.x, self.z], axis=1)
+        _, first, inverse = np.unique(_hash(keys), return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        if not np.array_equal(keys[first][inverse], keys):
+            keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            keys = keys[first]
+        coefficients = np.bincount(inverse, weights=self.coefficients, minlength=len(keys))
+        keep = np.abs(coefficients) > min_coefficient
+        out = PauliSum(self.n, keys[keep, :self.words], keys[keep, self.words:], coefficients[keep])
+        if max_weight is not None:
+            keep = out.weight() <= max_weight
+            out = PauliSum(self.n, out.x[keep], out.z[keep], out.coefficients[keep])
+        return out
+
+    def evolve_adjoint(self, hamiltonian, time, max_weight=None, min_coefficient=0):
+        """
+        Conjugate by :math:`e^{-iHt}`, mapping :math:`O` to :math:`e^{iHt} O e^{-iHt}`, for a Hamiltonian
+        :math:`H=\\sum_k h_k P_k` whose strings all commute, so that :math:`e^{-iHt}=\\prod_k e^{-ih_k t P_k}`. Under
+        each rotation, strings :math:`Q` commuting with :math:`P_k` are unchanged, and anticommuting strings map to
+        :math:`\\cos(2h_k t) Q \\pm \\sin(2h_k t) R`, with :math:`R` proportional to :math:`QP_k`.
+
+        :param hamiltonian: The Hamiltonian :math:`H`. Its strings must mutually commute.
+        :type hamiltonian: PauliSum
+        :param time: Evolution time :math:`t`.
+        :type time: float
+        :param max_weight: Truncation applied while propagating, see :py:meth:`simplify`.
+        :type max_weight: int, optional
+        :param min_coefficient: Truncation applied while propagating, see :py:meth:`simplify`.
+        :type min_coefficient: float
+        :return: The conjugated observable.
+        :rtype: PauliSum
+        """
+        size = len(self)
+        # Strings are appended in place to buffers which double in size when full. The buffers are stored word-major,
+        # so that the few words each rotation acts on are contiguous
+        x = np.zeros((self.words, max(16, 2 * size)), dtype=np.uint64)
+        z = np.zeros_like(x)
+        coefficients = np.zeros(x.shape[1])
+        x[:, :size], z[:, :size], coefficients[:size] = self.x.T, self.z.T, self.coefficients
+        simplified = size
+        for k in range(len(hamiltonian)):
+            # Only the words on which P_k acts are needed to find the anticommuting strings and the phase of QP_k
+            support = np.flatnonzero(hamiltonian.x[k] | hamiltonian.z[k])
+            angle = 2 * hamiltonian.coefficients[k] * time
+            if len(support) == 0 or np.sin(angle) == 0:
+                # The identity only contributes a global phase
+                continue
+            px, pz = hamiltonian.x[k, support, np.newaxis], hamiltonian.z[k, support, np.newaxis]
+            qx, qz = x[support, :size], z[support, :size]
+            anti = np.flatnonzero(_parity(((qx & pz) ^ (qz & px)).T))
+            if len(anti) == 0:
+                continue
+            qx, qz = qx[:, anti], qz[:, anti]
+            # Exponent g of QP = i^g R, summed over qubits: X.Y = iZ, X.Z = -iY, Y.Z = iX, Y.X = -iZ, Z.X = iY,
+            # Z.Y = -iX
+            qx_only, qy, qz_only = qx & ~qz, qx & qz, qz & ~qx
+            plus = _popcount(((qx_only & pz & px) | (qy & pz & ~px) | (qz_only & px & ~pz)).T)
+            minus = _popcount(((qx_only & pz & ~px) | (qy & px & ~pz) | (qz_only & px & pz)).T)
+            # g is odd for anticommuting strings, and -i i^g is 1 for g = 1 and -1 for g = 3 mod 4
+            sign = np.where((plus - minus) % 4 == 1, 1., -1.)
+            if size + len(anti) > x.shape[1]:
+                grow = max(x.shape[1], len(anti))
+                x = np.concatenate([x, np.zeros((self.words, grow), dtype=np.uint64)], axis=1)
+                z = np.concatenate([z, np.zeros((self.words, grow), dtype=np.uint64)], axis=1)
+                coefficients = np.concatenate([coefficients, np.zeros(grow)])
+            x[:, size:size + len(anti)] = x[:, anti] ^ hamiltonian.x[k, :, np.newaxis]
+            z[:, size:size + len(anti)] = z[:, anti] ^ hamiltonian.z[k, :, np.newaxis]
+            coefficients[size:size + len(anti)] = sign * np.sin(angle) * coefficients[anti]
+            coefficients[anti] *= np.cos(angle)
+            size += len(anti)
+            # Merge repeated strings whenever the sum has doubled in size, so that merging costs amortized linear time
+            if size > 2 * simplified:
+                out = PauliSum(self.n, x[:, :size].T, z[:, :size].T, coefficients[:size]).simplify(
+                    max_weight=max_weight, min_coefficient=min_coefficient)
+                size = simplified = len(out)
+                x[:, :size], z[:, :size], coefficients[:size] = out.x.T, out.z.T, out.coefficients
+        return PauliSum(self.n, x[:, :size].T, z[:, :size].T, coefficients[:size]).simplify(
+            max_weight=max_weight, min_coefficient=min_coefficient)
+
+    def expectation(self, initial_state='plus'):
+        """
+        Expectation value in a product state.
+
+        :param initial_state: Either ``'plus'``, for :math:`|+\\rangle^{\\otimes n}`, or the bits of a computational
+            basis state, with qubit 0 first.
+        :type initial_state: str or np.ndarray
+        :return: The expectation value.
+        :rtype: float
+        """
+        if isinstance(initial_state, str):
+            if initial_state != 'plus':
+                raise ValueError("initial_state must be 'plus' or a computational basis state.")
+            # Only strings of X and I have nonzero expectation, each equal to one
+            return float(np.sum(self.coefficients[~self.z.any(axis=1)]))
+        bits = np.zeros(self.words, dtype=np.uint64)
+        for i in np.flatnonzero(initial_state):
+            bits[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        # Only strings of Z and I have nonzero expectation, with sign given by the parity on the excited qubits
+        diagonal = ~self.x.any(axis=1)
+        signs = np.where(_parity(self.z[diagonal] & bits), -1., 1.)
+        return float(np.sum(signs * self.coefficients[diagonal]))
+
+
+def maxcut_pauli_sum(graph: Graph, energies=(1,), cost_function=True):
+    """
+    :return: The MaxCut Hamiltonian of :py:class:`HamiltonianMaxCut`, as a Pauli sum.
+    :rtype: PauliSum
+    """
+    out = PauliSum(graph.n)
+    for a, b in graph.graph.edges:
+        weight = energies[0] * graph.graph.edges[a, b]['weight']
+        if cost_function:
+            out.add_term(weight / 2, {})
+            out.add_term(-weight / 2, {a: 'Z', b: 'Z'})
+        else:
+            out.add_term(weight, {a: 'Z', b: 'Z'})
+    return out.simplify()
+
+
+def mis_pauli_sum(graph: Graph, energies=(1, 1)):
+    """
+    :return: The MIS Hamiltonian of :py:class:`HamiltonianMIS`, with node terms :math:`(1+Z_i)/2`, as a Pauli sum.
+    :rtype: PauliSum
+    """
+    out = PauliSum(graph.n)
+    for i in graph.graph.nodes:
+        weight = energies[0] * graph.graph.nodes[i]['weight'] / 2
+        out.add_term(weight, {})
+        out.add_term(weight, {i: 'Z'})
+    for a, b in graph.graph.edges:
+        weight = -energies[1] * graph.graph.edges[a, b]['weight'] / 4
+        out.add_term(weight, {})
+        out.add_term(weight, {a: 'Z'})
+        out.add_term(weight, {b: 'Z'})
+        out.add_term(weight, {a: 'Z', b: 'Z'})
+    return out.simplify()
+
+
+def driver_pauli_sum(n: int, pauli='X', energies=(1,), transition=(0, 1)):
+    """
+    :return: The single qubit driver of :py:class:`HamiltonianDriver`, as a Pauli sum.
+    :rtype: PauliSum
+    """
+    # Reversing the transition flips the sign of the Y and Z drivers
+    sign = -1 if pauli != 'X' and tuple(transition) == (1, 0) else 1
+    out = PauliSum(n)
+    for i in range(n):
+        out.add_term(sign * energies[0], {i: pauli})
+    return out
+
+
+def from_hamiltonian(hamiltonian, n=None):
+    """
+    Convert a qubit :py:class:`HamiltonianMaxCut`, :py:class:`HamiltonianMIS` or :py:class:`HamiltonianDriver`, not
+    restricted to the independent set subspace, to a Pauli sum. Only the graph and parameters of the Hamiltonian are
+    used. Like its :py:meth:`evolve` and :py:meth:`cost_function`, the Pauli sum of a MaxCut Hamiltonian on a code with
+    diagonal :math:`Z` does not include its energy.
+
+    :param n: Number of qubits, needed for drivers constructed without a graph.
+    :type n: int, optional
+    :return: The Hamiltonian as a Pauli sum.
+    :rtype: PauliSum
+    """
+    if hamiltonian.code is not qubit or getattr(hamiltonian, 'IS_subspace', False) or \
+            getattr(hamiltonian, 'use_Z2_symmetry', False):
+        raise NotImplementedError('Pauli propagation is only implemented for qubit Hamiltonians on the full Hilbert '
+                                  'space.')
+    if isinstance(hamiltonian, HamiltonianMaxCut):
+        # The diagonal MaxCut Hamiltonian is evolved and measured without its energy, so the Pauli sum must be too
+        return maxcut_pauli_sum(hamiltonian.graph, energies=(1,) if hamiltonian._is_diagonal else hamiltonian.energies,
+                                cost_function=hamiltonian.use_cost_function)
+    elif isinstance(hamiltonian, HamiltonianMIS):
+        return mis_pauli_sum(hamiltonian.graph, energies=hamiltonian.energies)
+    elif isinstance(hamiltonian, HamiltonianDriver):
+        if hamiltonian.graph is not None:
+            n = hamiltonian.graph.n
+        return driver_pauli_sum(n, pauli=hamiltonian.pauli, energies=hamiltonian.energies,
+                                transition=hamiltonian.transition)
+    raise NotImplementedError('Pauli propagation is only implemented for MaxCut, MIS, and driver Hamiltonians.')
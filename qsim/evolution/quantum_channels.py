@@ -3,10 +3,148 @@ import numpy as np
 from qsim.codes.quantum_state import State
 from qsim.codes import qubit
 from typing import Union
+from functools import lru_cache
 from scipy import sparse
 from qsim.graph_algorithms.graph import Graph
 
 
+def single_qudit_superoperator(povm, weights=None):
+    """
+    Fuse the Kraus operators :math:`K_k` of a single-qudit channel into the superoperator
+    :math:`\\sum_k w_k K_k \\otimes K_k^*`.
+
+    :param povm: Kraus operators, each of shape :math:`(d, d)`.
+    :type povm: np.ndarray
+    :param weights: Weights :math:`w_k` of each Kraus operator, defaults to one.
+    :type weights: np.ndarray, optional
+    :return: Superoperator :math:`S` of shape :math:`(d, d, d, d)`, such that the channel maps :math:`\\rho` to
+        :math:`\\rho'_{xw} = \\sum_{yz} S_{xwyz}\\rho_{yz}`.
+    :rtype: np.ndarray
+    """
+    povm = np.asarray(povm, dtype=np.complex128)
+    if weights is None:
+        return np.einsum('kxy,kwz->xwyz', povm, povm.conj())
+    return np.einsum('k,kxy,kwz->xwyz', np.asarray(weights), povm, povm.conj())
+
+
+def apply_single_qudit_superoperator(state, superoperator, i: int, d: int):
+    """
+    Apply :math:`\\sum_k K_k \\rho K_k^\\dagger` to qudit ``i`` of a density matrix in a single tensor contraction.
+
+    :param state: Density matrix to act on.
+    :type state: np.ndarray
+    :param superoperator: Output of :py:func:`single_qudit_superoperator`.
+    :type superoperator: np.ndarray
+    :param i: Zero-based index of the qudit to act on.
+    :type i: int
+    :param d: Dimension of the qudit.
+    :type d: int
+    :return: The output density matrix as a plain numpy array.
+    :rtype: np.ndarray
+    """
+    state = np.asarray(state)
+    before = d ** i
+    after = state.shape[0] // (before * d)
+    out = np.tensordot(superoperator, state.reshape((before, d, after, before, d, after)), axes=([2, 3], [1, 4]))
+    return out.transpose((2, 0, 3, 4, 1, 5)).reshape(state.shape)
+
+
+def compose_pauli_weights(weights, n: int):
+    """
+    Weights of the :math:`n`-fold composition of a Pauli-diagonal channel
+    :math:`\\rho\\to w_I\\rho + w_X X\\rho X + w_Y Y\\rho Y + w_Z Z\\rho Z`. The Pauli transfer matrix of such a
+    channel is diagonal, so its eigenvalues are raised to the :math:`n` th power and transformed back.
+
+    :param weights: The weights :math:`(w_I, w_X, w_Y, w_Z)`.
+    :type weights: np.ndarray
+    :param n: Number of times to compose the channel with itself.
+    :type n: int
+    :return: The weights of the composite channel.
+    :rtype: np.ndarray
+    """
+    signs = np.array([[1, 1, 1, 1], [1, 1, -1, -1], [1, -1, 1, -1], [1, -1, -1, 1]])
+    return signs @ ((signs @ np.asarray(weights, dtype=np.float64)) ** n) / 4
+
+
+@lru_cache(maxsize=8)
+def _parity_counts(number_qubits: int, apply_to: tuple):
+    # Number of qubits in apply_to whose row and column bits differ, for every density matrix entry
+    indices = np.arange(2 ** number_qubits)
+    counts = np.zeros((2 ** number_qubits, 2 ** number_qubits), dtype=np.int8)
+    for i in apply_to:
+        bits = ((indices >> (number_qubits - 1 - i)) & 1).astype(np.int8)
+        counts += bits[:, np.newaxis] ^ bits[np.newaxis, :]
+    return counts
+
+
+def apply_pauli_channel(state, weights, apply_to: list):
+    """
+    Apply the Pauli-diagonal channel :math:`\\rho\\to w_I\\rho + w_X X\\rho X + w_Y Y\\rho Y + w_Z Z\\rho Z` to each
+    qubit in ``apply_to`` of a density matrix, without any matrix multiplication. In the computational basis,
+    :math:`Z\\rho Z` multiplies each entry by the parity :math:`\\pm 1` of the qubit's row and column bits, and
+    :math:`X\\rho X` flips the qubit's bit in both indices.
+
+    :param state: Density matrix of qubits to act on.
+    :type state: np.ndarray
+    :param weights: The weights :math:`(w_I, w_X, w_Y, w_Z)`.
+    :type weights: np.ndarray
+    :param apply_to: Zero-based indices of the qubits to act on.
+    :type apply_to: list of int
+    :return: The output density matrix as a plain numpy array.
+    :rtype: np.ndarray
+    """
+    state = np.asarray(state)
+    w_i, w_x, w_y, w_z = weights
+    number_qubits = int(np.log2(state.shape[0]))
+    if w_x == 0 and w_y == 0:
+        # Pure dephasing: a single elementwise multiplication by a damping mask
+        mask = (w_i + w_z) ** np.arange(len(apply_to), -1, -1) * (w_i - w_z) ** np.arange(len(apply_to) + 1)
+        return state * mask[_parity_counts(number_qubits, tuple(apply_to))]
+    # Entries with equal (differing) row and column bits pick up the +1 (-1) parity
+    keep = {0: w_i + w_z, 1: w_i - w_z}
+    flip = {0: w_x + w_y, 1: w_x - w_y}
+    out = state
+    for i in apply_to:
+        before = 2 ** i
+        after = state.shape[0] // (before * 2)
+        out = out.reshape((before, 2, after, before, 2, after))
+        temp = np.empty(out.shape, dtype=np.result_type(out, w_i))
+        for r in range(2):
+            for c in range(2):
+                np.multiply(out[:, r, :, :, c, :], keep[r ^ c], out=temp[:, r, :, :, c, :])
+                temp[:, r, :, :, c, :] += flip[r ^ c] * out[:, 1 - r, :, :, 1 - c, :]
+        out = temp
+    return out.reshape(state.shape)
+
+
+def apply_pauli_errors(state, paulis, apply_to: list):
+    """
+    Apply a different Pauli string to each column of a batch of qubit kets.
+
+    :param state: Kets of qubits to act on, stacked as the columns of an array of shape :math:`(2^n, B)`.
+    :type state: np.ndarray
+    :param paulis: Integer array of shape ``(len(apply_to), B)``, where 0, 1, 2, 3 denote :math:`I, X, Y, Z` on the
+        corresponding qubit of the corresponding ket.
+    :type paulis: np.ndarray
+    :param apply_to: Zero-based indices of the qubits to act on.
+    :type apply_to: list of int
+    :return: The output kets as a plain numpy array.
+    :rtype: np.ndarray
+    """
+    out = np.array(state, dtype=np.complex128)
+    batch = out.shape[1]
+    for (j, i) in enumerate(apply_to):
+        view = out.reshape((2 ** i, 2, -1, batch))
+        # Y = iXZ, so apply the phase, then the sign flip, then the bit flip
+        y = paulis[j] == 2
+        z = (paulis[j] == 3) | y
+        x = (paulis[j] == 1) | y
+        view[..., y] *= 1j
+        view[:, 1, :, z] *= -1
+        view[..., x] = view[:, ::-1, :, x]
+    return out
+
+
 class QuantumChannel(object):
     def __init__(self, povm=lambda p: np.array([]), code=qubit, rates=(1,), IS_subspace=False, graph=None):
         """
@@ -48,6 +186,22 @@ class QuantumChannel(object):
                         return False
         return True
 
+    def pauli_weights(self, p):
+        """
+        :return: The weights :math:`(w_I, w_X, w_Y, w_Z)` if the channel with parameter ``p`` is Pauli-diagonal on
+            qubits, otherwise ``None``.
+        """
+        return None
+
+    def _use_pauli_transfer(self, state: State, code, p):
+        return not self.IS_subspace and code is qubit and self.code is qubit and self.pauli_weights(p) is not None
+
+    def superoperator(self, p):
+        """
+        :return: The single-qudit superoperator :math:`\\sum_{\\mu}M_{\\mu}\\otimes M_{\\mu}^*` of ``povm(p)``.
+        """
+        return single_qudit_superoperator(self.povm(p))
+
     def channel(self, state: State, p: float, apply_to: Union[int, list] = None):
         """
         Applies ``povm`` homogeneously to the qudits identified in apply_to.
@@ -86,27 +240,71 @@ class QuantumChannel(object):
                     out = out + povm[i][j] @ temp @ povm[i][j].conj().T
                 temp = out
             return out
-        # Handle apply_to recursively
-        # Only apply to one qudit
+        elif self._use_pauli_transfer(state, code, p):
+            out = apply_pauli_channel(state, self.pauli_weights(p), apply_to)
+            return State(out, is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace, graph=state.graph)
         else:
-            # Empty s to store the output
-            out = State(np.zeros_like(state), is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace,
-                        graph=state.graph)
-
-            if len(apply_to) == 1:
-                povm = self.povm(p)
-                for j in range(len(povm)):
-                    out = out + code.multiply(state, apply_to, povm[j])
-                return out
-            else:
-                last_element = apply_to.pop()
-                recursive_solution = self.channel(state, p, apply_to=apply_to)
-                povm = self.povm(p)
-                for j in range(len(povm)):
-                    out = out + code.multiply(recursive_solution, [last_element], povm[j])
-                return out
+            return self._apply_superoperator(state, self.superoperator(p), apply_to, code)
+
+    def _apply_superoperator(self, state: State, superoperator, apply_to: list, code):
+        # Apply the fused Kraus sandwich one qudit at a time
+        out = np.asarray(state)
+        for i in apply_to:
+            out = apply_single_qudit_superoperator(out, superoperator, i, code.d ** code.n)
+        return State(out, is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace, graph=state.graph)
+
+    def composite_superoperator(self, p, n: int):
+        """
+        Single-qudit superoperator of ``n`` consecutive applications of the channel with parameter ``p``. By default,
+        this is computed by repeated squaring of :py:meth:`superoperator`; subclasses with a closed form for the
+        composite channel override this method.
+
+        :param p: Channel parameter of a single application.
+        :param n: Number of applications.
+        :type n: int
+        :return: Superoperator of shape :math:`(d, d, d, d)`.
+        :rtype: np.ndarray
+        """
+        superoperator = self.superoperator(p)
+        shape = superoperator.shape
+        dimension = shape[0] * shape[1]
+        superoperator = np.linalg.matrix_power(superoperator.reshape((dimension, dimension)), n)
+        return superoperator.reshape(shape)
+
+    def _evolve_parameters(self, time, threshold):
+        if len(self.rates) == 1:
+            rate = self.rates[0]
+            p = rate * time
+        else:
+            # Channels parametrized by several probabilities
+            rate = np.sum(self.rates)
+            p = np.asarray(self.rates) * time
+        # Find a number of repetitions n small enough so that channel evolution is well approximated
+        n = max(int(np.ceil((rate * time) ** 2 / threshold)), 1)
+        while (rate * time) ** 2 / n > threshold:
+            n += 1
+        while n > 1 and (rate * time) ** 2 / (n - 1) <= threshold:
+            n -= 1
+        return p / n, n
 
     def evolve(self, state: State, time, threshold=.05, apply_to: Union[int, list] = None):
+        """
+        Evolve ``state`` under the channel for a time ``time``. The evolution is defined as ``n`` applications of the
+        channel with parameter ``rates * time / n``, where ``n`` is the smallest integer such that
+        :math:`(\\text{rate}\\cdot t)^2/n` is at most ``threshold``. The ``n`` applications are composed exactly and
+        applied to each qudit once.
+
+        :param state: State to operate on.
+        :type state: State
+        :param time: Evolution time.
+        :type time: float
+        :param threshold: Bound on :math:`(\\text{rate}\\cdot t)^2/n` setting the number of channel applications.
+        :type threshold: float
+        :param apply_to: Zero-based indices of qudits to apply the channel to, defaults to all of them.
+        :type apply_to: list of int
+        :return: The evolved density matrix.
+        :rtype: State
+        """
         if state.is_ket:
             print('Converting ket to density matrix.')
             state = State(tools.outer_product(state, state))
@@ -115,66 +313,138 @@ class QuantumChannel(object):
         # Assume that apply_to is a list of integers
         if isinstance(apply_to, int):
             apply_to = [apply_to]
-        n = 1
-        # Find a number of repetitions n small enough so that channel evolution is well approximated
-        while (self.rates[0] * time) ** 2 / n > threshold:
-            n += 1
-        p = self.rates[0] * time / n
-        s = state.copy()
-        # Apply channel n times
-        for i in range(n):
-            s = self.channel(s, p, apply_to=apply_to)
-        return s
+        p, n = self._evolve_parameters(time, threshold)
+        if self.IS_subspace:
+            s = state.copy()
+            # Apply channel n times
+            for i in range(n):
+                s = self.channel(s, p, apply_to=apply_to)
+            return s
+        if state.code.logical_code:
+            code = self.code
+        else:
+            code = state.code
+        if self._use_pauli_transfer(state, code, p):
+            out = apply_pauli_channel(state, compose_pauli_weights(self.pauli_weights(p), n), apply_to)
+            return State(out, is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace, graph=state.graph)
+        return self._apply_superoperator(state, self.composite_superoperator(p, n), apply_to, code)
+
+    def evolve_adjoint(self, observable: State, time, threshold=.05, apply_to: Union[int, list] = None):
+        """
+        Apply the adjoint :math:`O\\to\\sum_{\\mu}M_{\\mu}^{\\dagger}OM_{\\mu}` of :py:meth:`evolve` to an observable,
+        such that :math:`\\text{tr}(O\\,\\text{evolve}(\\rho)) = \\text{tr}(\\text{evolve\\_adjoint}(O)\\rho)`.
+
+        :param observable: Observable to operate on.
+        :type observable: State
+        :param time: Evolution time.
+        :type time: float
+        :param threshold: Bound on :math:`(\\text{rate}\\cdot t)^2/n` setting the number of channel applications.
+        :type threshold: float
+        :param apply_to: Zero-based indices of qudits to apply the channel to, defaults to all of them.
+        :type apply_to: list of int
+        :return: The evolved observable.
+        :rtype: State
+        """
+        if apply_to is None:
+            apply_to = list(range(observable.number_physical_qudits))
+        if isinstance(apply_to, int):
+            apply_to = [apply_to]
+        p, n = self._evolve_parameters(time, threshold)
+        if self.IS_subspace:
+            povm = self.povm(p)
+            out = observable.copy()
+            for _ in range(n):
+                for i in apply_to:
+                    out = State(sum(povm[i][j].conj().T @ out @ povm[i][j] for j in range(len(povm[i]))),
+                                is_ket=observable.is_ket, code=observable.code, IS_subspace=observable.IS_subspace,
+                                graph=observable.graph)
+            return out
+        if observable.code.logical_code:
+            code = self.code
+        else:
+            code = observable.code
+        if self._use_pauli_transfer(observable, code, p):
+            # Pauli-diagonal channels are self-adjoint
+            out = apply_pauli_channel(observable, compose_pauli_weights(self.pauli_weights(p), n), apply_to)
+            return State(out, is_ket=observable.is_ket, code=observable.code, IS_subspace=observable.IS_subspace,
+                         graph=observable.graph)
+        # The adjoint acts on the transpose with the superoperator's input and output indices exchanged
+        superoperator = self.composite_superoperator(p, n).transpose((2, 3, 0, 1))
+        out = np.asarray(observable).T
+        for i in apply_to:
+            out = apply_single_qudit_superoperator(out, superoperator, i, code.d ** code.n)
+        return State(out.T, is_ket=observable.is_ket, code=observable.code, IS_subspace=observable.IS_subspace,
+                     graph=observable.graph)
+
+    def sample_evolve(self, state: State, time, threshold=.05, apply_to: Union[int, list] = None, rng=None):
+        """
+        Stochastic unraveling of :py:meth:`evolve` for Pauli-diagonal channels on qubits. Each column of ``state`` is
+        an independent trajectory, to which a random Pauli string is applied with the probabilities of the composite
+        channel. Averaging :math:`|\\psi\\rangle\\langle\\psi|` over trajectories reproduces :py:meth:`evolve`;
+        channels which are not trace preserving rescale every trajectory by the square root of the trace.
+
+        :param state: Kets to operate on, stacked as columns.
+        :type state: State
+        :param time: Evolution time.
+        :type time: float
+        :param threshold: Bound on :math:`(\\text{rate}\\cdot t)^2/n` setting the number of channel applications.
+        :type threshold: float
+        :param apply_to: Zero-based indices of qubits to apply the channel to, defaults to all of them.
+        :type apply_to: list of int
+        :param rng: Random number generator to sample the Pauli errors with.
+        :type rng: np.random.Generator, optional
+        :raises NotImplementedError: If the channel is not Pauli-diagonal on qubits.
+        :raises ValueError: If the composite channel does not define a probability distribution over Pauli errors.
+        :return: The sampled trajectories.
+        :rtype: State
+        """
+        if not state.is_ket:
+            raise ValueError('Only kets can be unraveled.')
+        if apply_to is None:
+            apply_to = list(range(state.number_physical_qudits))
+        if isinstance(apply_to, int):
+            apply_to = [apply_to]
+        if rng is None:
+            rng = np.random.default_rng()
+        p, n = self._evolve_parameters(time, threshold)
+        if not self._use_pauli_transfer(state, state.code, p):
+            raise NotImplementedError('Only Pauli-diagonal channels on qubits can be unraveled.')
+        weights = compose_pauli_weights(self.pauli_weights(p), n)
+        if np.any(weights < -1e-12):
+            raise ValueError('Pauli error probabilities must be nonnegative.')
+        weights = np.clip(weights, 0, None)
+        trace = np.sum(weights)
+        paulis = rng.choice(4, size=(len(apply_to), state.shape[1]), p=weights / trace)
+        out = apply_pauli_errors(state, paulis, apply_to) * np.sqrt(trace) ** len(apply_to)
+        return State(out, is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace, graph=state.graph)
 
 
 class DepolarizingChannel(QuantumChannel):
     def __init__(self, code=qubit, rates=(1,), IS_subspace=False, graph=None):
         def povm(p):
-            return np.asarray([np.sqrt(1 - p) * np.identity(code.d), np.sqrt(p / 3) * code.X, np.sqrt(p / 3) * code.Y,
-                               np.sqrt(p / 3) * code.Z])
+            return np.asarray([np.sqrt(1 - p) * np.identity(code.d ** code.n), np.sqrt(p / 3) * code.X,
+                               np.sqrt(p / 3) * code.Y, np.sqrt(p / 3) * code.Z])
 
         super().__init__(povm=povm, code=code, rates=rates, IS_subspace=IS_subspace, graph=graph)
 
-    def channel(self, state: State, p: float, apply_to: Union[int, list] = None):
-        """ Perform depolarizing channel on the i-th qubit of an input density matrix
+    def pauli_weights(self, p):
+        return np.array([1 - p, p / 3, p / 3, p / 3])
 
-                    Input:
-                        rho = input density matrix (as numpy.ndarray)
-                        i = zero-based index of qubit location to apply pauli
-                        p = probability of depolarization, between 0 and 1
-                """
-        # If the input s is a ket, convert it to a density matrix
-        if state.is_ket:
-            print('Converting ket to density matrix.')
-            state = State(tools.outer_product(state, state))
-        if apply_to is None:
-            apply_to = list(range(state.number_physical_qudits))
-        # Assume that apply_to is a list of integers
-        if isinstance(apply_to, int):
-            apply_to = [apply_to]
+    def superoperator(self, p):
+        # Weight the Pauli operators directly rather than taking square roots, so the map stays linear in p
+        return single_qudit_superoperator(
+            [np.identity(self.code.d ** self.code.n), self.code.X, self.code.Y, self.code.Z],
+            weights=[1 - p, p / 3, p / 3, p / 3])
 
-        if state.code.logical_code:
-            # Assume that logical codes are composed of qubits
-            code = self.code
-        else:
-            code = state.code
-        # Handle apply_to recursively
-        # Only apply to one qudit
-        if len(apply_to) == 1:
-            return state * (1 - p) + p / 3 * (code.multiply(state, apply_to, ['X']) +
-                                              code.multiply(state, apply_to, ['Y']) +
-                                              code.multiply(state, apply_to, ['Z']))
-        else:
-            last_element = apply_to.pop()
-            recursive_solution = self.channel(state, p, apply_to=apply_to)
-            return recursive_solution * (1 - p) + p / 3 * (
-                    code.multiply(recursive_solution, [last_element], ['X']) +
-                    code.multiply(recursive_solution, [last_element], ['Y']) +
-                    code.multiply(recursive_solution, [last_element], ['Z']))
+    def composite_superoperator(self, p, n: int):
+        # Depolarizing channels compose into a depolarizing channel with 1 - 4p'/3 = (1 - 4p/3)^n
+        return self.superoperator(3 / 4 * (1 - (1 - 4 * p / 3) ** n))
 
 
 class PauliChannel(QuantumChannel):
     def __init__(self, code=qubit, rates=(1,), IS_subspace=False, graph=None):
+        """General Pauli channel. The channel parameter is a 3-tuple :math:`(p_x, p_y, p_z)` indicating the probability
+        of applying each Pauli operator."""
 
         def povm(p):
             povm_p = []
@@ -188,57 +458,22 @@ class PauliChannel(QuantumChannel):
                     elif i == 2:
                         povm_p.append(np.sqrt(p[i]) * code.Z)
             if sum(p) < 1:
-                povm_p.append(np.sqrt(1 - sum(p)) * np.identity(code.d))
+                povm_p.append(np.sqrt(1 - sum(p)) * np.identity(code.d ** code.n))
             return np.asarray(povm_p)
 
         super().__init__(povm=povm, code=code, rates=rates, IS_subspace=IS_subspace, graph=graph)
 
-    def channel(self, state: State, p: tuple, apply_to: Union[int, list] = None):
-        """ Perform general Pauli channel on the i-th qubit of an input density matrix
+    def pauli_weights(self, p):
+        return np.array([1 - sum(p), p[0], p[1], p[2]])
 
-        Input:
-            rho = input density matrix (as numpy.ndarray)
-            i = zero-based index of qubit location to apply pauli
-            ps = a 3-tuple (px, py, pz) indicating the probability
-                 of applying each Pauli operator
+    def superoperator(self, p):
+        return single_qudit_superoperator(
+            [self.code.X, self.code.Y, self.code.Z, np.identity(self.code.d ** self.code.n)],
+            weights=[p[0], p[1], p[2], 1 - sum(p)])
 
-        Returns:
-            (1-px-py-pz) * rho + px * Xi * rho * Xi
-                               + py * Yi * rho * Yi
-                               + pz * Zi * rho * Zi
-        """
-        try:
-            assert len(p) == 3
-        except AssertionError:
-            print('Length of tuple must be 3.')
-        # If the input s is a ket, convert it to a density matrix
-        if state.is_ket:
-            print('Converting ket to density matrix.')
-            state = State(tools.outer_product(state, state))
-        if apply_to is None:
-            apply_to = list(range(state.number_physical_qudits))
-
-        # Assume that apply_to is a list of integers
-        if isinstance(apply_to, int):
-            apply_to = [apply_to]
-
-        if state.code.logical_code:
-            # Assume that logical codes are composed of qubits
-            code = self.code
-        else:
-            code = state.code
-        # Handle apply_to recursively
-        # Only apply to one qudit
-        if len(apply_to) == 1:
-            return state * (1 - sum(p)) + (p[0] * code.multiply(state, apply_to, ['X']) +
-                                           p[1] * code.multiply(state, apply_to, ['Y']) +
-                                           p[2] * code.multiply(state, apply_to, ['Z']))
-        else:
-            last_element = apply_to.pop()
-            recursive_solution = self.channel(state, p, apply_to=apply_to)
-            return recursive_solution * (1 - sum(p)) + p[0] * code.multiply(recursive_solution, [last_element], ['X']) \
-                   + p[1] * code.multiply(recursive_solution, [last_element], ['Y']) + p[2] * \
-                   code.multiply(recursive_solution, [last_element], ['Z'])
+    def composite_superoperator(self, p, n: int):
+        weights = compose_pauli_weights(self.pauli_weights(p), n)
+        return self.superoperator(weights[1:])
 
 
 class AmplitudeDampingChannel(QuantumChannel):
@@ -340,6 +575,10 @@ class AmplitudeDampingChannel(QuantumChannel):
         # Update povm attribute
         self.povm = povm
 
+    def composite_superoperator(self, p, n: int):
+        # Amplitude damping channels compose into an amplitude damping channel with 1 - p' = (1 - p)^n
+        return self.superoperator(1 - (1 - p) ** n)
+
 
 class ZenoChannel(QuantumChannel):
     def __init__(self, code=qubit, rates=(1, 1, 1), IS_subspace=False, graph=None):
@@ -365,3 +604,19 @@ class ZenoChannel(QuantumChannel):
             return np.asarray(povm_p)
 
         super().__init__(povm=povm, code=code, rates=rates, IS_subspace=IS_subspace, graph=graph)
+
+    def superoperator(self, p):
+        operators = [np.array([[0, 1], [0, 0]]), np.array([[0, 0], [1, 0]]), np.array([[1, 0], [0, 0]]),
+                     np.array([[0, 0], [0, -1]]), np.array([[0, -1j], [0, 0]]), np.array([[0, 0], [1j, 0]]),
+                     np.identity(2)]
+        weights = [p[0] / 2, p[0] / 2, p[1] / 2, p[1] / 2, p[2] / 2, p[2] / 2, 1 - sum(p)]
+        return single_qudit_superoperator(operators, weights=weights)
+
+    def pauli_weights(self, p):
+        # The Zeno channel is the Pauli-diagonal map with weights ((p_0 + p_2) / 4, (p_0 + p_2) / 4, p_1 / 4) on
+        # (X, Y, Z), which is not trace preserving
+        return np.array([1 - sum(p) + p[1] / 4, (p[0] + p[2]) / 4, (p[0] + p[2]) / 4, p[1] / 4])
+
+    def composite_superoperator(self, p, n: int):
+        weights = compose_pauli_weights(self.pauli_weights(p), n)
+        return single_qudit_superoperator([np.identity(2), tools.X(), tools.Y(), tools.Z()], weights=weights)
@@ -0,0 +1,140 @@
+"""Schedules compiled into coefficients of fixed operators. A schedule written as a function which sets the energies of
+each Hamiltonian has to run, and each Hamiltonian has to rescale its matrix, every time a solver evaluates the
+Hamiltonian. Since the Hamiltonians are linear in their energies, the schedule is equivalently the time dependence of
+the coefficients c_j(t) of the fixed operators H_j in H(t) = sum_j c_j(t) H_j, which is evaluated with a few vector
+operations."""
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+from scipy.sparse import csr_matrix, issparse
+
+__all__ = ['CompiledSchedule', 'compile_schedule']
+
+
+class CompiledSchedule(object):
+    def __init__(self, operators, coefficients, times=None):
+        """
+        :param operators: The fixed operators :math:`H_j`, each a square sparse matrix or array of the same shape.
+            Diagonal operators are stored as vectors and combined before they are applied.
+        :type operators: list
+        :param coefficients: Either a function of time returning the array of coefficients :math:`c_j(t)`, or an array
+            of shape ``(len(times), len(operators))`` of coefficients sampled at ``times``, which are interpolated by
+            a cubic spline.
+        :type coefficients: callable or np.ndarray
+        :param times: Sorted times at which the coefficients are sampled, if they are given as an array.
+        :type times: np.ndarray, optional
+        """
+        self.shape = operators[0].shape
+        if callable(coefficients):
+            self._function = coefficients
+            self.times = None
+            self.table = None
+        else:
+            self._function = None
+            self.times = np.asarray(times, dtype=np.float64)
+            self.table = np.asarray(coefficients, dtype=np.float64).reshape(len(self.times), len(operators))
+            self._spline = CubicSpline(self.times, self.table, axis=0)
+        diagonals = []
+        self._diagonal_index = []
+        self._operators = []
+        self._operator_index = []
+        for j, operator in enumerate(operators):
+            operator = csr_matrix(operator)
+            rows = np.repeat(np.arange(self.shape[0]), np.diff(operator.indptr))
+            if np.all(operator.indices == rows):
+                diagonals.append(operator.diagonal())
+                self._diagonal_index.append(j)
+            else:
+                self._operators.append(operator)
+                self._operator_index.append(j)
+        self._diagonals = np.array(diagonals) if diagonals else None
+
+    def coefficients(self, t):
+        """
+        :param t: Time.
+        :type t: float
+        :return: The coefficient of each operator at time ``t``.
+        :rtype: np.ndarray
+        """
+        if self._function is not None:
+            return np.asarray(self._function(t))
+        return self._spline(np.clip(t, self.times[0], self.times[-1]))
+
+    def hamiltonian(self, t):
+        """
+        :param t: Time.
+        :type t: float
+        :return: The Hamiltonian :math:`H(t)` as a sparse matrix.
+        :rtype: csr_matrix
+        """
+        c = self.coefficients(t)
+        ham = csr_matrix(self.shape, dtype=np.result_type(c, *[operator.dtype for operator in self._operators]))
+        if self._diagonals is not None:
+            ham = ham + csr_matrix((c[self._diagonal_index] @ self._diagonals, (np.arange(self.shape[0]),
+                                                                                 np.arange(self.shape[0]))),
+                                   shape=self.shape)
+        for j, operator in zip(self._operator_index, self._operators):
+            ham = ham + c[j] * operator
+        return ham
+
+    def left_multiply(self, t, state):
+        """
+        :param t: Time.
+        :type t: float
+        :param state: Array of shape ``(dim, ...)``.
+        :type state: np.ndarray
+        :return: :math:`H(t)` times ``state``.
+        :rtype: np.ndarray
+        """
+        c = self.coefficients(t)
+        state = np.asarray(state)
+        if self._diagonals is not None:
+            diagonal = c[self._diagonal_index] @ self._diagonals
+            out = diagonal.reshape((-1,) + (1,) * (state.ndim - 1)) * state
+        else:
+            out = np.zeros(state.shape, dtype=np.result_type(state, c))
+        for j, operator in zip(self._operator_index, self._operators):
+            out = out + c[j] * (operator @ state)
+        return out
+
+
+def compile_schedule(hamiltonians, schedule, times):
+    """
+    Compile a schedule which sets the energies of Hamiltonians into a :py:class:`CompiledSchedule`, by sampling the
+    energies it sets at ``times``. Each Hamiltonian must be linear in its energies, as are
+    :py:class:`HamiltonianDriver`, :py:class:`HamiltonianMaxCut` and :py:class:`HamiltonianMIS`. The energies of the
+    Hamiltonians are left as set by the schedule at the last time.
+
+    :param hamiltonians: Hamiltonians whose energies the schedule sets.
+    :type hamiltonians: list
+    :param schedule: Function of time which sets the energies of the Hamiltonians.
+    :type schedule: callable
+    :param times: At least two sorted times at which to sample the schedule. The coefficients are interpolated
+        between them by a cubic spline, which is exact for schedules which are polynomials of degree at most three in
+        time, and has an error of order the fourth power of the sample spacing otherwise.
+    :type times: np.ndarray
+    :return: The compiled schedule.
+    :rtype: CompiledSchedule
+    """
+    times = np.asarray(times, dtype=np.float64)
+    table = []
+    for t in times:
+        schedule(t)
+        table.append(np.concatenate([np.atleast_1d(np.asarray(h.energies, dtype=np.float64)) for h in hamiltonians]))
+        if len(table[-1]) != len(table[0]):
+            raise ValueError('The schedule must set the same number of energies on each Hamiltonian at every time.')
+    operators = [operator for h in hamiltonians for operator in _energy_operators(h)]
+    return CompiledSchedule(operators, np.array(table), times=times)
+
+
+def _energy_operators(hamiltonian):
+    # The operator multiplying each energy of a Hamiltonian linear in its energies is the Hamiltonian with that energy
+    # one and all others zero
+    energies = hamiltonian.energies
+    operators = []
+    for i in range(len(np.atleast_1d(energies))):
+        hamiltonian.energies = tuple(float(i == j) for j in range(len(np.atleast_1d(energies))))
+        operator = hamiltonian.hamiltonian
+        operators.append(operator if issparse(operator) else np.asarray(operator))
+    hamiltonian.energies = energies
+    return operators
@@ -9,6 +9,8 @@ from qsim.graph_algorithms.graph import Graph
 from qsim.codes.quantum_state import State
 from qsim.schrodinger_equation import SchrodingerEquation
 from qsim.lindblad_master_equation import LindbladMasterEquation
+from qsim.tools.parallel import parallel_map
+from qsim.evolution.schedule import compile_schedule
 
 
 class SimulateAdiabatic(object):
@@ -86,7 +88,21 @@ class SimulateAdiabatic(object):
         return True
 
     def run(self, time, schedule, num=None, initial_state=None, full_output=True, method='RK45', verbose=False,
-            iterations=None):
+            iterations=None, compiled=False, samples=1001, interaction_picture=None, slices=None, workers=None):
+        """If ``compiled`` is True, the schedule is sampled at ``samples`` evenly spaced times and compiled into
+        coefficients of fixed operators, see :py:func:`qsim.evolution.schedule.compile_schedule`, which the solver
+        evaluates in place of calling the schedule. This is only implemented for noiseless and continuous noise
+        integration with the ODE solvers.
+
+        If ``interaction_picture`` is one of the (diagonal) Hamiltonians, such as a large detuning, the ODE solvers
+        integrate in the frame rotating with it, see
+        :py:class:`qsim.evolution.interaction_picture.InteractionPicture`. This is only implemented for integration
+        with the ODE solvers of schedules which are not compiled.
+
+        If ``slices`` is given, the anneal is integrated by Parareal over that many time slices, with ``method`` as
+        the fine solver run in parallel over ``workers`` processes, see
+        :py:func:`qsim.evolution.parareal.parareal`. The output states are at the slice boundaries. This is only
+        implemented for noiseless and continuous noise integration with the ODE solvers."""
         if method == 'odeint' or method == 'trotterize' and num is None:
             num = self._num_from_time(time, method=method)
 
@@ -100,30 +116,65 @@ class SimulateAdiabatic(object):
             initial_state = State(outer_product(initial_state, initial_state), IS_subspace=self.IS_subspace,
                                   code=self.code, graph=self.graph)
 
+        if compiled and (self.noise_model == 'monte_carlo' or method == 'trotterize'):
+            raise NotImplementedError('Compiled schedules are only implemented for integration with the ODE solvers.')
+        if interaction_picture is not None and (compiled or method == 'trotterize' or
+                                                self.noise_model == 'monte_carlo'):
+            raise NotImplementedError('The interaction picture is only implemented for integration with the ODE '
+                                      'solvers.')
+        if slices is not None and (compiled or method == 'trotterize' or interaction_picture is not None or
+                                   self.noise_model == 'monte_carlo'):
+            raise NotImplementedError('Parareal is only implemented for integration with the ODE solvers.')
         if self.noise_model == 'continuous':
             # Initialize master equation
-            if method == 'trotterize':
+            if slices is not None:
+                master_equation = LindbladMasterEquation(hamiltonians=self.hamiltonian, jump_operators=self.noise)
+                results, info = master_equation.run_parareal_solver(initial_state, 0, time, slices=slices,
+                                                                    schedule=lambda t: schedule(t, time),
+                                                                    method=method, workers=workers,
+                                                                    full_output=full_output, verbose=verbose)
+            elif method == 'trotterize':
                 master_equation = LindbladMasterEquation(hamiltonians=self.hamiltonian, jump_operators=self.noise)
                 results, info = master_equation.run_trotterized_solver(initial_state, 0, time, num=num,
                                                                        schedule=lambda t: schedule(t, time),
                                                                        full_output=full_output, verbose=verbose)
+            elif compiled:
+                master_equation = LindbladMasterEquation(hamiltonians=self.hamiltonian, jump_operators=self.noise)
+                compiled_schedule = compile_schedule(self.hamiltonian, lambda t: schedule(t, time),
+                                                     np.linspace(0, time, num=samples))
+                results, info = master_equation.run_ode_solver(initial_state, 0, time, num=num,
+                                                               schedule=compiled_schedule, method=method,
+                                                               full_output=full_output, verbose=verbose)
             else:
                 master_equation = LindbladMasterEquation(hamiltonians=self.hamiltonian, jump_operators=self.noise)
                 results, info = master_equation.run_ode_solver(initial_state, 0, time, num=num,
                                                                schedule=lambda t: schedule(t, time), method=method,
-                                                               full_output=full_output, verbose=verbose)
+                                                               full_output=full_output, verbose=verbose,
+                                                               interaction_picture=interaction_picture)
         elif self.noise_model is None:
             # Noise model is None
             # Initialize Schrodinger equation
             schrodinger_equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
-            if method == 'trotterize':
+            if compiled:
+                compiled_schedule = compile_schedule(self.hamiltonian, lambda t: schedule(t, time),
+                                                     np.linspace(0, time, num=samples))
+                results, info = schrodinger_equation.run_ode_solver(initial_state, 0, time, num=num, verbose=verbose,
+                                                                    schedule=compiled_schedule, method=method,
+                                                                    full_output=full_output)
+            elif slices is not None:
+                results, info = schrodinger_equation.run_parareal_solver(initial_state, 0, time, slices=slices,
+                                                                         schedule=lambda t: schedule(t, time),
+                                                                         method=method, workers=workers,
+                                                                         full_output=full_output, verbose=verbose)
+            elif method == 'trotterize':
                 results, info = schrodinger_equation.run_trotterized_solver(initial_state, 0, time, num=num,
                                                                             verbose=verbose, full_output=full_output,
                                                                             schedule=lambda t: schedule(t, time))
             else:
                 results, info = schrodinger_equation.run_ode_solver(initial_state, 0, time, num=num, verbose=verbose,
                                                                     schedule=lambda t: schedule(t, time), method=method,
-                                                                    full_output=full_output)
+                                                                    full_output=full_output,
+                                                                    interaction_picture=interaction_picture)
 
         else:
             assert self.noise_model == 'monte_carlo'
@@ -135,6 +186,60 @@ class SimulateAdiabatic(object):
                                                                                method=method, verbose=verbose,
                                                                                iterations=iterations)
 
+        return self._states(results), info
+
+    def gradient(self, time, schedule, params, metric='approximation_ratio', initial_state=None, method='RK45',
+                 rtol=1e-8, atol=1e-10):
+        """
+        Compute a metric of the outcome of the algorithm and its gradient with respect to the parameters of the
+        schedule, by the adjoint method, see :py:func:`qsim.evolution.adjoint.adjoint_gradient`. This costs about two
+        simulations, for any number of parameters. It is implemented for noiseless and continuous noise integration.
+
+        :param time: Total time.
+        :type time: float
+        :param schedule: Function ``schedule(t, tf, params)`` which sets the energies of the Hamiltonians.
+        :type schedule: callable
+        :param params: Parameters of the schedule.
+        :type params: np.ndarray
+        :param metric: Either ``cost_function`` or ``approximation_ratio``.
+        :type metric: str
+        :param initial_state: Initial state. Defaults to all qudits in the ground state.
+        :type initial_state: State, optional
+        :param method: Method of :py:func:`scipy.integrate.solve_ivp`.
+        :type method: str
+        :param rtol: Relative tolerance of the forward and adjoint solves.
+        :type rtol: float
+        :param atol: Absolute tolerance of the forward and adjoint solves.
+        :type atol: float
+        :return: The metric, and its gradient with respect to ``params``.
+        :rtype: tuple
+        """
+        if metric != 'approximation_ratio' and metric != 'cost_function':
+            raise NotImplementedError('Metric must be approximation_ratio or cost_function.')
+        if initial_state is None:
+            # Begin with all qudits in the ground s
+            initial_state = State(np.zeros((self.cost_hamiltonian.hamiltonian.shape[0], 1)), code=self.code,
+                                  IS_subspace=self.IS_subspace, graph=self.graph)
+            initial_state[-1, -1] = 1
+        if self.noise_model is None:
+            equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
+        elif self.noise_model == 'continuous':
+            initial_state = State(outer_product(initial_state, initial_state), IS_subspace=self.IS_subspace,
+                                  code=self.code, graph=self.graph)
+            equation = LindbladMasterEquation(hamiltonians=self.hamiltonian, jump_operators=self.noise)
+        else:
+            raise NotImplementedError('Gradients are only implemented for noiseless and continuous noise '
+                                      'integration.')
+        value, gradient, _ = equation.run_adjoint_solver(initial_state, 0, time, self.cost_hamiltonian.hamiltonian,
+                                                         lambda t, p: schedule(t, time, p), params, method=method,
+                                                         rtol=rtol, atol=atol)
+        if metric == 'approximation_ratio':
+            value = value / self.cost_hamiltonian.optimum
+            gradient = gradient / self.cost_hamiltonian.optimum
+        return value, gradient
+
+    def _states(self, results):
+        """Wrap the raw output of a solver into :py:class:`State` objects."""
         if len(results.shape) == 2:
             # The algorithm has output a single state
             out = [State(results, IS_subspace=self.IS_subspace, code=self.code, graph=self.graph)]
@@ -154,7 +259,22 @@ class SimulateAdiabatic(object):
                     res.append(
                         State(results[i, j, ...], IS_subspace=self.IS_subspace, code=self.code, graph=self.graph))
                 out.append(res)
-        return out, info
+        return out
+
+    def _run_total_times(self, time, schedule, method, workers=None, verbose=False, **kwargs):
+        """Run the algorithm for every method and total time, in parallel over ``workers`` processes. Worker processes
+        are forked, so the Hamiltonians built by this process are shared with every worker rather than rebuilt. Returns
+        the ``(results, info)`` pair of each run, in order of method and then of total time."""
+        def solve(task):
+            m, t = task
+            if verbose:
+                print('Solving time: ' + str(t))
+            results, info = self.run(t, schedule, method=m, verbose=verbose, **kwargs)
+            # States hold their code module, which cannot be sent between processes
+            return np.asarray(results), info
+
+        runs = parallel_map(solve, [(m, t) for m in method for t in time], workers=workers)
+        return [(self._states(results), info) for results, info in runs]
 
     def performance_vs_time(self, time, schedule, num=None, metric='approximation_ratio', initial_state=None,
                             plot=False, verbose=False, method='RK45', iterations=None):
@@ -251,7 +371,10 @@ class SimulateAdiabatic(object):
         return total_performance, all_info
 
     def performance_vs_total_time(self, time, schedule, num=None, metric='approximation_ratio', initial_state=None,
-                                  plot=False, verbose=False, method='RK45', iterations=None, errorbar=False):
+                                  plot=False, verbose=False, method='RK45', iterations=None, errorbar=False,
+                                  workers=None):
+        """The runs for each total time and method are independent, and are distributed over ``workers`` processes
+        as described in :py:func:`qsim.tools.parallel.parallel_map`."""
         # Convert metric and method to lists
         if isinstance(metric, str):
             metric = [metric]
@@ -269,12 +392,11 @@ class SimulateAdiabatic(object):
             stdev = np.zeros((len(method), len(metric), len(time)))
         colors = ['teal', 'purple', 'm', 'deepskyblue', 'deeppink', 'salmon', 'orange', 'r']
         scatter_label = None
+        runs = self._run_total_times(time, schedule, method, workers=workers, verbose=verbose, num=num,
+                                     initial_state=initial_state, full_output=False, iterations=iterations)
         for l in range(len(method)):
             for t in range(len(time)):
-                if verbose:
-                    print('Solving time: ' + str(time[t]))
-                results, info = self.run(time[t], schedule, num=num, initial_state=initial_state, full_output=False,
-                                         method=method[l], iterations=iterations, verbose=verbose)
+                results, info = runs[l * len(time) + t]
                 # print(np.around(results[-1], decimals=3), is_valid_state(results[-1], is_ket=False))
                 for m in range(len(metric)):
                     if t == 0:
@@ -305,22 +427,16 @@ class SimulateAdiabatic(object):
 
                         else:
                             if errorbar:
-                                if results[-1].is_ket:
-                                    probabilities = (np.abs(results[-1]) ** 2).flatten().real
-                                else:
-                                    probabilities = np.diag(results[-1]).real
-                                res = np.zeros(int(np.max(self.cost_hamiltonian.hamiltonian.real)) -
-                                               int(np.min(self.cost_hamiltonian.hamiltonian.real)) + 1)
-                                for i in range(results[-1].shape[0]):
-                                    # For now, assume that the cost hamiltonian is diagonal
-                                    # NOTE: non-integer valued hamiltonians will be binned as the integer floor of the float value
-                                    if metric == 'cost_function':
-                                        res[int(self.cost_hamiltonian.hamiltonian[i, i])] = res[int(
-                                            self.cost_hamiltonian.hamiltonian[i, i])] + probabilities[i] * int(
-                                            self.cost_hamiltonian.hamiltonian[i, i])
-                                    else:
-                                        res[int(self.cost_hamiltonian.hamiltonian[i, i])] = res[int(
-                                            self.cost_hamiltonian.hamiltonian[i, i])] + probabilities[i]
+                                probabilities = _probabilities(results[-1])
+                                bins = int(np.max(self.cost_hamiltonian.hamiltonian.real)) - \
+                                    int(np.min(self.cost_hamiltonian.hamiltonian.real)) + 1
+                                # For now, assume that the cost hamiltonian is diagonal
+                                # NOTE: non-integer valued hamiltonians will be binned as the integer part of the float
+                                # value
+                                labels = self.cost_hamiltonian.cost_labels
+                                if metric == 'cost_function':
+                                    probabilities = probabilities * labels
+                                res = _histogram(labels % bins, probabilities, bins)
                                 vals = np.arange(len(res)) / (len(res) - 1)
                                 x0 = np.sum(res * vals)
                                 stdev[l, m, t] = np.sum(res * (vals - x0) ** 2) ** .5
@@ -381,8 +497,11 @@ class SimulateAdiabatic(object):
             plt.show()
         return total_performance, all_info
 
-    def spectrum_vs_time(self, time, schedule, k=2, num=None, plot=False, which='S', hamiltonian=True):
-        """Solves for the small (S) or large (L) energy sector."""
+    def spectrum_vs_time(self, time, schedule, k=2, num=None, plot=False, which='S', hamiltonian=True,
+                         continuation=False, track=False):
+        """Solves for the small (S) or large (L) energy sector. If ``continuation`` is True, the eigenvectors at each
+        time seed the eigensolver at the next, see :py:meth:`SchrodingerEquation.spectrum`. With ``track``, each
+        column of the result then follows one eigenstate by overlap instead of being sorted by energy."""
         if num is None:
             num = self._num_from_time(time)
         times = np.linspace(0, time, num=num)
@@ -392,14 +511,18 @@ class SimulateAdiabatic(object):
         if self.noise_model is None or self.noise_model is 'monte_carlo' or hamiltonian:
             # Initialize Schrodinger equation
             schrodinger_equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
-            eigvals = np.zeros((len(times), k), dtype=np.float64)
-            for i in range(len(times)):
-                schedule(times[i], time)
-                eigval, eigvec = schrodinger_equation.eig(which=which, k=k)
-                if which == 'S':
-                    eigvals[i] = eigval[0:k]
-                elif which == 'L':
-                    eigvals[i] = eigval[len(eigval) - k - 1:-1]
+            if continuation:
+                eigvals = schrodinger_equation.spectrum(times, schedule=lambda t: schedule(t, time), k=k, which=which,
+                                                        track=track)
+            else:
+                eigvals = np.zeros((len(times), k), dtype=np.float64)
+                for i in range(len(times)):
+                    schedule(times[i], time)
+                    eigval, eigvec = schrodinger_equation.eig(which=which, k=k)
+                    if which == 'S':
+                        eigvals[i] = eigval[0:k]
+                    elif which == 'L':
+                        eigvals[i] = eigval[len(eigval) - k - 1:-1]
             if plot:
                 plotted_eigvals = np.swapaxes(eigvals, 0, 1)
                 for i in range(k):
@@ -414,49 +537,44 @@ class SimulateAdiabatic(object):
 
         return eigvals
 
+    def minimum_gap(self, time, schedule, num=20, degeneracy=None, rtol=1e-6, full_output=False):
+        """Find the minimum spectral gap of the Hamiltonian along the schedule by refining a coarse scan, see
+        :py:meth:`SchrodingerEquation.minimum_gap`. If ``degeneracy`` is not given, the degeneracy of the maximum
+        independent set of the graph is used, if it is known."""
+        if degeneracy is None:
+            degeneracy = self.graph.degeneracy if self.graph.degeneracy is not None else 1
+        schrodinger_equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
+        return schrodinger_equation.minimum_gap(0, time, schedule=lambda t: schedule(t, time), degeneracy=degeneracy,
+                                                num=num, rtol=rtol, full_output=full_output)
+
     def distribution_vs_total_time(self, time, schedule, num=None, metric='approximation_ratio', initial_state=None,
-                                   plot=False, verbose=False, method='RK45', iterations=None):
+                                   plot=False, verbose=False, method='RK45', iterations=None, workers=None):
+        """The runs for each total time are independent, and are distributed over ``workers`` processes as described
+        in :py:func:`qsim.tools.parallel.parallel_map`."""
         if metric != 'approximation_ratio' and metric != 'optimum_overlap' and metric != 'cost_function':
             raise NotImplementedError('Metric must be approximation_ratio, cost_function or optimum_overlap.')
-        performance = np.zeros((len(time), int(np.max(self.cost_hamiltonian.hamiltonian.real) + 1)))
-        j = 0
-        for t in time:
-            if verbose:
-                print('Solving time: ' + str(t))
-            results, info = self.run(t, schedule, num=num, initial_state=initial_state, full_output=False,
-                                     method=method, verbose=verbose, iterations=iterations)
-            if not self.noise_model == 'monte_carlo':
-                res = np.zeros(int(np.max(self.cost_hamiltonian.hamiltonian.real)) -
-                               int(np.min(self.cost_hamiltonian.hamiltonian.real)) + 1)
-                if results[-1].is_ket:
-                    probabilities = (np.abs(results[-1]) ** 2).flatten().real
-                else:
-                    probabilities = np.diag(results[-1]).real
-                for i in range(results[-1].shape[0]):
-                    # For now, assume that the cost hamiltonian is diagonal
-                    # TODO: make this work for non-integer valued Hamiltonians
-                    res[int(self.cost_hamiltonian.hamiltonian[i, i])] = res[int(
-                        self.cost_hamiltonian.hamiltonian[i, i])] + probabilities[i]
-            else:
-                if iterations is None:
-                    iterations = 1
-                res = np.zeros(int(np.max(self.cost_hamiltonian.hamiltonian.real) - np.min(
-                    self.cost_hamiltonian.hamiltonian.real) + 1))
-                for k in range(iterations):
-                    if results[k].is_ket:
-                        probabilities = (np.abs(results[k]) ** 2).flatten().real
-                    else:
-                        probabilities = np.diag(results[k]).real
-                    for i in range(len(probabilities)):
-                        if self.cost_hamiltonian._is_diagonal:
-                            res[int(self.cost_hamiltonian.hamiltonian[i, i])] = res[int(
-                                self.cost_hamiltonian.hamiltonian[i, i])] + probabilities[i]
-                res = res / iterations
-            if verbose:
+        runs = self._run_total_times(time, schedule, [method], workers=workers, verbose=verbose, num=num,
+                                     initial_state=initial_state, full_output=False, iterations=iterations)
+        # For now, assume that the cost hamiltonian is diagonal
+        # TODO: make this work for non-integer valued Hamiltonians
+        bins = int(np.max(self.cost_hamiltonian.hamiltonian.real)) - \
+            int(np.min(self.cost_hamiltonian.hamiltonian.real)) + 1
+        # Negative costs are counted from the end of the distribution
+        labels = self.cost_hamiltonian.cost_labels % bins
+        if not self.noise_model == 'monte_carlo':
+            probabilities = np.array([_probabilities(results[-1]) for results, info in runs])
+        else:
+            if iterations is None:
+                iterations = 1
+            # Average the probabilities over trajectories before they are histogrammed
+            probabilities = np.array([np.mean([_probabilities(results[k]) for k in range(iterations)], axis=0)
+                                      for results, info in runs])
+            if not self.cost_hamiltonian._is_diagonal:
+                probabilities = np.zeros_like(probabilities)
+        performance = _histogram(labels, probabilities, bins)
+        if verbose:
+            for res in performance:
                 print('Distribution', res)
-            performance[j, ...] = res
-
-            j += 1
         if verbose:
             print('Performance', performance.T)
         if plot:
@@ -473,230 +591,47 @@ class SimulateAdiabatic(object):
         """In a typical adiabatic algorithm, the ground state will not have a level crossing. However, in graphs
         with degenerate ground states, it is possible that energy levels that adiabatically lead into the ground
         state have level crossings. Given a list of times, returns the eigenstates that will adiabatically lead
-        into the ground state and their eigenenergies at each time."""
-        # Start at later times
-        eigvals = np.zeros((len(time), self.graph.degeneracy))
-        eigvecs = np.zeros((len(time), self.graph.degeneracy, self.cost_hamiltonian.hamiltonian.shape[0]),
-                           dtype=np.complex128)
-        indices = np.arange(self.graph.degeneracy)
-        full_indices = np.zeros((len(time), self.graph.degeneracy))
+        into the ground state and their indices in the spectrum at each time. The eigenstates are followed backward
+        from the final time by :py:meth:`SchrodingerEquation.track_eigenstates`."""
         schrodinger_equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
-        threshold = .01
-
-        def normalize_phase(eig):
-            """Take in an array of eigenvectors, and normalize the phase such that the first element is positive
-            and real"""
-            where_nonzero = np.argwhere(np.absolute(eig) > 1e-9)[0, 0]
-            eig = np.e ** (-1j * np.angle(eig[where_nonzero])) * eig
-            # We can take the eigenvalues to be real for this Hamiltonian
-            return eig / np.linalg.norm(eig)
-
-        i = 0
-        for t in np.flip(time):
-            schedule(t, 1)
-            if i == 0:
-                eigval, eigvec = schrodinger_equation.eig(which=which, k=np.max(indices) + 1)
-                # print(eigval, eigvec)
-                for j in range(eigvec.shape[0]):
-                    eigvec[j] = normalize_phase(eigvec[j])
-                old_eigvec = eigvec
-                eigvals[i, :] = eigval
-                eigvecs[i, :] = eigvec
-            else:
-                eigval, eigvec = schrodinger_equation.eig(which=which, k=np.max(indices) + 1)
-                # Now, check that the eigenvectors are macroscopically similar
-                # First, you need to normalize the phase on the eigenvectors
-                for j in range(eigvec.shape[0]):
-                    eigvec[j] = normalize_phase(eigvec[j])
-                # Now compute deviations in the dot product
-                deviation = []
-                for e in range(len(eigval)):
-                    deviation.append(np.abs(np.dot(eigvec[e], old_eigvec[e])))
-                deviation = 1 - np.array(deviation)
-                where_different = np.argwhere(deviation > threshold).flatten()
-                original_different = where_different.copy()
-                if len(where_different) > 0:
-                    if verbose:
-                        print(where_different, indices, t)
-                for j in range(len(where_different)):
-                    # We need to check in nearby locations
-                    # For now, assume that we have only jumped one location
-                    if j != len(where_different) - 1 and where_different[j] != 0:
-                        adjacent = True
-                        # Check everything after it
-                        check = where_different[j + 1:]
-                        last = where_different[j]
-                        for c in check:
-                            if c != last + 1:
-                                adjacent = False
-                            last = c
-                            dev = 1 - np.abs(np.dot(eigvec[where_different[j]], old_eigvec[c]))
-                            if deviation[where_different[j]] - dev > .1 or dev < threshold:
-                                if verbose:
-                                    print('swapping', where_different[j], c, dev, deviation[where_different[j]])
-                                # We now know that c should replace where_different[j]
-                                temp = where_different.copy()
-                                temp[j] = c
-                                for k in np.argwhere(where_different == c):
-                                    temp[k] = where_different[j]
-                                where_different = temp.copy()
-                                if verbose:
-                                    print(indices, where_different)
-
-                                break
-                            else:
-                                if verbose:
-                                    print('decided against swapping', dev, deviation[where_different[j]],
-                                          where_different[j], c)
-                                    if adjacent and c == np.max(indices):
-                                        print('all eigenstates are adjacent, consider looking at more spectrum',
-                                              where_different[j], c)
-
-                    else:
-                        # Check if the last index is good or not, now that previous indices have been resolved
-                        dev_new = 1 - np.abs(np.dot(old_eigvec[np.max(where_different)], eigvec[where_different[j]]))
-                        if dev_new > threshold:
-                            if verbose:
-                                print('problems, need to look at more spectrum', where_different[j], dev_new,
-                                      np.max(where_different))
-                            if where_different[j] != 0:
-                                for k in np.argwhere(indices == where_different[j]):
-                                    if where_different[j] == np.max(
-                                            indices):  # np.allclose(np.argwhere(indices == where_different[j]), np.array([[len(indices)-1]])):
-                                        for l in [1, 2, 3]:
-                                            new_eigval, new_eigvec = schrodinger_equation.eig(which=which,
-                                                                                              k=np.max(indices) + 1 + l)
-                                            dev = 1 - np.abs(np.dot(new_eigvec[where_different[j] + l],
-                                                                    old_eigvec[where_different[j]]))
-                                            if verbose:
-                                                print('should we swap higher?', where_different[j], l, dev,
-                                                      deviation[where_different[j]])
-                                            if deviation[where_different[j]] - dev > .1:
-                                                indices[k] = where_different[j] + l
-                                                eigvec = new_eigvec
-                                                break
-                        else:
-                            if verbose:
-                                print('happy times', dev_new)
-                temp = indices.copy()
-                for j in range(len(where_different)):
-                    for k in np.argwhere(where_different[j] == indices):
-                        # Swap that shit
-                        temp[k] = original_different[j]
-                indices = temp
-                old_eigvec = eigvec
-                # If they are not, solve for one more eigenvector
-                # If the eigenvector is still not macroscopically similar to any eigenvector, lower the threshold for
-                # comparison
-                # Now populate eigvecs
-            full_indices[i, :] = indices
-            eigvecs[i, :] = eigvec[indices, :]
-            i += 1
-        return np.flip(eigvecs, axis=0), np.flip(full_indices, axis=0)
-
-    def eigenstate_ordering_vs_time(self, time, schedule, verbose=False, return_eigvecs = False):
-        """In a typical adiabatic algorithm, the ground state will not have a level crossing. However, in graphs
-        with degenerate ground states, it is possible that energy levels that adiabatically lead into the ground
-        state have level crossings. Given a list of times, returns the eigenstates that will adiabatically lead
-        into the ground state and their eigenenergies at each time."""
-        # Start at earlier times
+        # Start at later times
+        _, eigvecs, indices, info = schrodinger_equation.track_eigenstates(np.flip(time), lambda t: schedule(t, 1),
+                                                                           k=self.graph.degeneracy, which=which)
+        if verbose:
+            print('Crossings out of the eigenstates solved for:', info['crossings'])
+        return np.flip(eigvecs, axis=0), np.flip(indices, axis=0)
+
+    def eigenstate_ordering_vs_time(self, time, schedule, verbose=False, return_eigvecs=False):
+        """Follow every eigenstate of the Hamiltonian along the schedule, see
+        :py:meth:`SchrodingerEquation.track_eigenstates`. Returns the index in the spectrum of each eigenstate at each
+        time, labelled by its index at the first time, and if ``return_eigvecs``, the eigenvectors at each time in
+        order of energy."""
         shape = self.hamiltonian[0].hamiltonian.shape[0]
-        eigvals = np.zeros((len(time), shape))
-        if return_eigvecs:
-            eigvecs = np.zeros((len(time), shape, shape), dtype=np.complex128)
-        indices = np.arange(shape)
-        full_indices = np.zeros((len(time), shape))
         schrodinger_equation = SchrodingerEquation(hamiltonians=self.hamiltonian)
-        threshold = .01
-
-        def normalize_phase(eig):
-            """Take in an array of eigenvectors, and normalize the phase such that the first element is positive
-            and real"""
-            where_nonzero = np.argwhere(np.absolute(eig) > 1e-9)[0, 0]
-            eig = np.e ** (-1j * np.angle(eig[where_nonzero])) * eig
-            # We can take the eigenvalues to be real for this Hamiltonian
-            return eig / np.linalg.norm(eig)
-
-        i = 0
-        for t in time:
-            print(t)
-            schedule(t, 1)
-            if i == 0:
-                eigval, eigvec = schrodinger_equation.eig(k='all')
-                for j in range(shape):
-                    eigvec[j] = normalize_phase(eigvec[j])
-                old_eigvec = eigvec
-                if return_eigvecs:
-                    eigvals[i, :] = eigval
-            else:
-                eigval, eigvec = schrodinger_equation.eig(k='all')
-                # Now, check that the eigenvectors are macroscopically similar
-                # First, you need to normalize the phase on the eigenvectors
-                for j in range(shape):
-                    eigvec[j] = normalize_phase(eigvec[j])
-                # Now compute deviations in the dot product
-                deviation = np.zeros(shape)
-                for e in range(len(eigval)):
-                    deviation[e] = 1-np.abs(np.dot(eigvec[e], old_eigvec[e]))
-                where_different = np.argwhere(deviation > threshold).flatten()
-                original_different = where_different.copy()
-                if len(where_different) > 0:
-                    if verbose:
-                        print(where_different, indices, t)
-                for j in range(0, len(where_different)):
-                    # We need to check in nearby locations
-                    # For now, assume that we have only jumped one location
-                    if j != len(where_different) - 1 and where_different[j] != 0:
-                        # Don't worry about changes to the ground state
-                        adjacent = True
-                        # Check everything after it
-                        # Only checking a few eigenvalues
-                        check = where_different[j + 1:j+6]
-                        last = where_different[j]
-                        for c in check:
-                            if c != last + 1:
-                                adjacent = False
-                            last = c
-                            dev = 1 - np.abs(np.dot(eigvec[where_different[j]], old_eigvec[c]))
-                            if deviation[where_different[j]] - dev > .1 or dev < threshold:
-                                if verbose:
-                                    print('swapping', t, where_different[j], c, dev, deviation[where_different[j]])
-                                # We now know that c should replace where_different[j]
-                                temp = where_different.copy()
-                                temp[j] = c
-                                # Now that the replacement is made, replace c with where_different[j]
-                                for k in np.argwhere(where_different == c):
-                                    temp[k] = where_different[j]
-                                # Replace where_different
-                                # Try and do a handshake? Not implemented yet...
-                                where_different = temp
-                                if verbose:
-                                    print(indices, where_different)
-
-                                break
-                            else:
-                                if verbose:
-                                    print('decided against swapping', dev, deviation[where_different[j]],
-                                          where_different[j], c)
-                                    if adjacent and c == np.max(indices):
-                                        print('all eigenstates are adjacent and the end of the spectrum was reached',
-                                              where_different[j], c)
-                temp = indices.copy()
-                for j in range(len(where_different)):
-                    for k in np.argwhere(where_different[j] == indices):
-                        # Swap that shit
-                        temp[k] = original_different[j]
-                indices = temp
-                old_eigvec = eigvec
-                # If they are not, solve for one more eigenvector
-                # If the eigenvector is still not macroscopically similar to any eigenvector, lower the threshold for
-                # comparison
-                # Now populate eigvecs, if desired
-            full_indices[i, :] = indices
-            if return_eigvecs:
-                eigvecs[i, :] = eigvec
-            i += 1
+        _, eigvecs, indices, info = schrodinger_equation.track_eigenstates(time, lambda t: schedule(t, 1), k=shape,
+                                                                           guard=0)
+        if verbose:
+            print('Crossings out of the eigenstates solved for:', info['crossings'])
         if return_eigvecs:
-            return eigvecs, full_indices
+            ordered = np.zeros_like(eigvecs)
+            for i in range(len(time)):
+                ordered[i, indices[i]] = eigvecs[i]
+            return ordered, indices
         else:
-            return full_indices
+            return indices
+
+def _probabilities(state):
+    # Probability of each basis state in a ket or density matrix
+    if state.is_ket:
+        return (np.abs(state) ** 2).flatten().real
+    return np.diag(state).real
+
+
+def _histogram(labels, probabilities, bins):
+    # Sum the probabilities of each label, for probabilities of shape (..., len(labels)), with a single bincount over
+    # all leading dimensions
+    probabilities = np.asarray(probabilities)
+    batch = int(np.prod(probabilities.shape[:-1]))
+    index = (labels + bins * np.arange(batch)[:, np.newaxis]).flatten()
+    return np.bincount(index, weights=probabilities.reshape(-1), minlength=bins * batch).reshape(
+        probabilities.shape[:-1] + (bins,))
@@ -0,0 +1,156 @@
+import networkx as nx
+import numpy as np
+
+from qsim.tools.parallel import parallel_map
+from qsim.evolution.hamiltonian import HamiltonianMIS, HamiltonianMaxCut
+from qsim.graph_algorithms.graph import Graph
+from qsim.graph_algorithms.qaoa import SimulateQAOA
+
+"""Light cone evaluation of QAOA on sparse graphs. Each term of the cost function is a function of the nodes within
+graph distance p of the term, where p is the number of cost layers, so the expectation value of each term can be
+computed exactly by simulating QAOA on that neighborhood only. Terms with isomorphic neighborhoods have the same
+expectation value and are simulated once."""
+
+__all__ = ['LightConeQAOA']
+
+
+class LightConeQAOA(object):
+    def __init__(self, graph: Graph, hamiltonian, cost_hamiltonian):
+        """
+        Since the Hamiltonians of the full graph are never built, the layers are given as factories which build each
+        Hamiltonian for a given subgraph.
+
+        :param graph: Graph to run QAOA on.
+        :type graph: Graph
+        :param hamiltonian: One factory per layer, each taking a :py:class:`Graph` and returning the Hamiltonian of that
+            layer on the graph, e.g. ``lambda g: HamiltonianDriver(graph=g)``. Layers which return a
+            :py:class:`HamiltonianMaxCut` or :py:class:`HamiltonianMIS` couple neighboring nodes and grow the light cone;
+            all other layers must act on each qudit separately.
+        :type hamiltonian: list of callable
+        :param cost_hamiltonian: Factory taking a :py:class:`Graph` and returning the :py:class:`HamiltonianMaxCut` or
+            :py:class:`HamiltonianMIS` whose expectation value is computed. Node and edge weights are used to select
+            individual terms, so the factory should build the Hamiltonian from the weights of the graph it is given.
+        :type cost_hamiltonian: callable
+        """
+        self.graph = graph
+        self.hamiltonian = hamiltonian
+        self.cost_hamiltonian = cost_hamiltonian
+        # Build each factory on a single edge to determine which layers couple neighboring nodes
+        probe = nx.Graph()
+        probe.add_edge(0, 1)
+        probe = Graph(probe, IS=False)
+        self.radius = 0
+        for factory in self.hamiltonian:
+            layer = factory(probe)
+            if isinstance(layer, (HamiltonianMaxCut, HamiltonianMIS)):
+                self.radius += 1
+            if getattr(layer, 'IS_subspace', False) or getattr(layer, 'use_Z2_symmetry', False):
+                raise NotImplementedError('Light cone evaluation is not implemented for Hamiltonians restricted to the '
+                                          'independent set subspace or using Z2 symmetry.')
+        cost = self.cost_hamiltonian(probe)
+        if not isinstance(cost, (HamiltonianMaxCut, HamiltonianMIS)):
+            raise NotImplementedError('Light cone evaluation is only implemented for MaxCut and MIS cost functions.')
+        if getattr(cost, 'IS_subspace', False) or getattr(cost, 'use_Z2_symmetry', False):
+            raise NotImplementedError('Light cone evaluation is not implemented for Hamiltonians restricted to the '
+                                      'independent set subspace or using Z2 symmetry.')
+        # MaxCut only has edge terms
+        self._node_terms = isinstance(cost, HamiltonianMIS)
+        self._cones = None
+        self._simulations = {}
+
+    @property
+    def cones(self):
+        """
+        The distinct light cones of the cost function terms, found on first access.
+
+        :return: Pairs of a light cone and the number of terms with an isomorphic light cone. Each light cone is a
+            graph whose nodes are labeled from zero, with the nodes of the term first and marked by the ``'root'``
+            attribute.
+        :rtype: list of (nx.Graph, int)
+        """
+        if self._cones is None:
+            terms = [(a, b) for a, b in self.graph.graph.edges]
+            if self._node_terms:
+                terms = [(a,) for a in self.graph.graph.nodes] + terms
+            buckets = {}
+            self._cones = []
+            for term in terms:
+                cone = self.light_cone(term)
+                key = nx.weisfeiler_lehman_graph_hash(cone, node_attr='label', edge_attr='label')
+                for i in buckets.setdefault(key, []):
+                    if nx.is_isomorphic(self._cones[i][0], cone, node_match=_labels_match, edge_match=_labels_match):
+                        self._cones[i][1] += 1
+                        break
+                else:
+                    buckets[key].append(len(self._cones))
+                    self._cones.append([cone, 1])
+            self._cones = [tuple(cone) for cone in self._cones]
+        return self._cones
+
+    def light_cone(self, term):
+        """
+        Extract the reverse causal cone of a cost function term: the subgraph induced by the nodes within distance
+        ``self.radius`` of the nodes of the term.
+
+        :param term: Nodes the term acts on, a single node or the two endpoints of an edge.
+        :type term: tuple of int
+        :return: The light cone, relabeled so that the nodes of the term come first.
+        :rtype: nx.Graph
+        """
+        distance = nx.multi_source_dijkstra_path_length(self.graph.graph, set(term), cutoff=self.radius,
+                                                        weight=lambda u, v, d: 1)
+        nodes = list(term) + sorted(node for node in distance if node not in term)
+        relabel = {node: i for i, node in enumerate(nodes)}
+        cone = nx.Graph()
+        for node in nodes:
+            cone.add_node(relabel[node], weight=self.graph.graph.nodes[node]['weight'], root=node in term)
+        for a, b in self.graph.graph.subgraph(nodes).edges:
+            cone.add_edge(relabel[a], relabel[b], weight=self.graph.graph.edges[a, b]['weight'],
+                          root=a in term and b in term)
+        # Canonical labels used to hash and compare light cones
+        for node in cone.nodes:
+            cone.nodes[node]['label'] = str((cone.nodes[node]['root'], cone.nodes[node]['weight']))
+        for edge in cone.edges:
+            cone.edges[edge]['label'] = str((cone.edges[edge]['root'], cone.edges[edge]['weight']))
+        return cone
+
+    def _simulation(self, i):
+        # Build the Hamiltonians of a light cone once, and reuse them for every set of parameters
+        if i not in self._simulations:
+            cone = self.cones[i][0]
+            graph = Graph(cone.copy(), IS=False)
+            # The cost function only contains the term at the root of the light cone
+            term = nx.Graph()
+            for node in cone.nodes:
+                term.add_node(node, weight=cone.nodes[node]['weight'] if cone.nodes[node]['root'] else 0)
+            for a, b in cone.edges:
+                if cone.edges[a, b]['root']:
+                    term.add_edge(a, b, weight=cone.edges[a, b]['weight'])
+            if self._node_terms and term.number_of_edges() > 0:
+                for node in term.nodes:
+                    term.nodes[node]['weight'] = 0
+            self._simulations[i] = SimulateQAOA(graph, hamiltonian=[factory(graph) for factory in self.hamiltonian],
+                                                cost_hamiltonian=self.cost_hamiltonian(Graph(term, IS=False)))
+        return self._simulations[i]
+
+    def run(self, param, workers=None):
+        """
+        Compute the expectation value of the cost function by summing the contribution of each distinct light cone.
+
+        :param param: QAOA parameters, one per layer.
+        :type param: np.ndarray
+        :param workers: Number of processes to simulate light cones over. See
+            :py:func:`qsim.tools.parallel.parallel_map`.
+        :type workers: int, optional
+        :return: The expectation value of the cost function.
+        :rtype: float
+        """
+        def run_cone(i):
+            return self._simulation(i).run(param)
+
+        values = parallel_map(run_cone, range(len(self.cones)), workers=workers)
+        return float(np.sum([value * count for value, (cone, count) in zip(values, self.cones)]))
+
+
+def _labels_match(a, b):
+    return a['label'] == b['label']
@@ -1,18 +1,48 @@
-from scipy.optimize import minimize, OptimizeResult, brute, basinhopping
+from scipy.optimize import minimize, OptimizeResult, basinhopping, fmin
+from scipy.stats import norm
 import numpy as np
+import copy
+from collections import OrderedDict, namedtuple
 from timeit import default_timer as timer
 
 from qsim.tools.tools import tensor_product, outer_product
+from qsim.tools.parallel import parallel_map
 from qsim.codes import qubit
-from qsim.evolution.hamiltonian import HamiltonianMIS
+from qsim.evolution import pauli_propagation
+from qsim.evolution.hamiltonian import HamiltonianMIS, HamiltonianMaxCut, HamiltonianDriver, HamiltonianEnergyShift, \
+    HamiltonianRydberg
 from qsim.graph_algorithms.graph import Graph
 from qsim.codes.quantum_state import State
 
 
 class SimulateQAOA(object):
-    def __init__(self, graph: Graph, hamiltonian=None, noise_model=None, noise=None, code=None, cost_hamiltonian=None):
-        """Noise_model is one of channel, continuous, monte_carlo, or None."""
+    def __init__(self, graph: Graph, hamiltonian=None, noise_model=None, noise=None, code=None, cost_hamiltonian=None,
+                 num_samples=100, workers=None, objective='expectation', shots=None, alpha=.1, eta=1., seed=None,
+                 cache_size=None, cache_resolution=1e-12):
+        """Noise_model is one of channel, continuous, monte_carlo, or None. With monte_carlo, Pauli-type noise
+        channels are unraveled into random Pauli errors on kets, and expectation values are averaged over
+        ``num_samples`` trajectories, simulated over ``workers`` processes with random seed ``seed``.
+
+        Objective is one of expectation, cvar, or gibbs, and is the quantity returned by :py:meth:`run`: the
+        expectation value of the cost function, the mean of its largest ``alpha`` fraction of values (CVaR), or
+        :math:`\\log\\langle e^{\\eta C}\\rangle/\\eta`. If ``shots`` is not ``None``, the objective is estimated
+        from ``shots`` bitstrings sampled from the final state with random seed ``seed``, as on hardware.
+
+        If ``cache_size`` is not ``None``, the results of up to ``cache_size`` calls to :py:meth:`run` and
+        :py:meth:`variational_grad` are memoized, keyed by the parameters rounded to multiples of ``cache_resolution``
+        and by the Hamiltonians, noise, and objective. Random results, such as Monte Carlo estimates without a seed, are
+        then reused rather than redrawn."""
+        self.cache_size = cache_size
+        self.cache_resolution = cache_resolution
+        self._caches = {'run': _EvaluationCache(cache_size), 'variational_grad': _EvaluationCache(cache_size)}
         self.graph = graph
+        self.objective = objective
+        self.shots = shots
+        self.alpha = alpha
+        self.eta = eta
+        self.seed = seed
+        self.num_samples = num_samples
+        self.workers = workers
         self.hamiltonian = hamiltonian
         self.noise_model = noise_model
         self.noise = noise
@@ -46,15 +76,23 @@ class SimulateQAOA(object):
     def depth(self, val):
         self._depth = val
 
-    def variational_grad(self, param, initial_state=None):
+    def variational_grad(self, param, initial_state=None, mode='memo'):
         """Calculate the objective function F and its gradient exactly
             Input:
                 param = parameters of QAOA
+                mode = for kets, 'memo' stores all 2 * depth + 2 intermediate states, 'adjoint' stores O(1) states
+                    and recovers them by inverting each layer, and 'checkpoint' stores O(sqrt(depth)) snapshots and
+                    recomputes the states in between. Density matrices are always differentiated by propagating the
+                    cost observable backwards through the adjoint channels; 'memo' stores the depth intermediate
+                    density matrices, and the other modes store O(sqrt(depth)) snapshots
 
             Output: (F, Fgrad)
                F = <HamC> for minimization
                Fgrad = gradient of F with respect to param
         """
+        return self._memoize('variational_grad', self._variational_grad, param, initial_state, mode)
+
+    def _variational_grad(self, param, initial_state=None, mode='memo'):
         # TODO: make this work for continuous noise models
         if self.noise_model == 'continuous':
             raise NotImplementedError('Variational gradient does not currently support continuous noise model')
@@ -74,84 +112,119 @@ class SimulateQAOA(object):
         if not (self.noise_model is None or self.noise_model == 'monte_carlo'):
             # Initial s should be a density matrix
             initial_state = State(outer_product(initial_state, initial_state), code=self.code)
+        if not initial_state.is_ket:
+            return self._variational_grad_density_matrix(param, initial_state, checkpoint=(mode != 'memo'))
+        if mode != 'memo':
+            return self._variational_grad_adjoint(param, initial_state, checkpoint=(mode == 'checkpoint'))
         psi = initial_state
-        if initial_state.is_ket:
-            memo = np.zeros([psi.shape[0], 2 * self.depth + 2], dtype=np.complex128)
-            memo[:, 0] = np.squeeze(psi.T)
-            tester = psi.copy()
-        else:
-            memo = np.zeros([psi.shape[0], psi.shape[0], self.depth + 1], dtype=np.complex128)
-            memo[..., 0] = np.squeeze(outer_product(psi, psi))
-            tester = State(outer_product(psi, psi), code=self.code)
+        memo = np.zeros([psi.shape[0], 2 * self.depth + 2], dtype=np.complex128)
+        memo[:, 0] = np.squeeze(psi.T)
+        tester = psi.copy()
         # Evolving forward
         for j in range(self.depth):
-            if initial_state.is_ket:
-                tester = self.hamiltonian[j].evolve(tester, param[j])
-                memo[:, j + 1] = np.squeeze(tester.T)
-            else:
-                self.hamiltonian[j].evolve(tester, param[j])
-                # Goes through memo, evolves every density matrix in it, and adds one more in the j*m+i+1 position
-                # corresponding to H_i*p
-                s0_prenoise = memo[..., 0]
-                for k in range(j + 1):
-                    s = State(memo[..., k], code=self.code)
-                    s = self.hamiltonian[j].evolve(s, param[j])
-                    if k == 0:
-                        s0_prenoise = s.copy()
-                    if self.noise_model is not None:
-                        if not (self.noise[j] is None):
-                            s = self.noise[j].evolve(s, param[j])
-                    memo[..., k] = s.copy()
-                s0_prenoise = self.hamiltonian[j].left_multiply(s0_prenoise)
-                if self.noise_model is not None:
-                    if not (self.noise[j] is None):
-                        s0_prenoise = self.noise[j].evolve(s0_prenoise, param[j])
-                memo[..., j + 1] = s0_prenoise.copy()
+            tester = self.hamiltonian[j].evolve(tester, param[j])
+            memo[:, j + 1] = np.squeeze(tester.T)
 
         # Multiply by cost_hamiltonian
-        if initial_state.is_ket:
-            memo[:, self.depth + 1] = self.cost_hamiltonian.hamiltonian @ memo[:, self.depth]
+        memo[:, self.depth + 1] = self.cost_hamiltonian.hamiltonian @ memo[:, self.depth]
+        s = State(np.array([memo[:, self.depth + 1]]).T, code=self.code)
 
-            s = State(np.array([memo[:, self.depth + 1]]).T, code=self.code)
-        else:
-            for k in range(self.depth + 1):
-                s = memo[..., k]
-                s = State(self.cost_hamiltonian.hamiltonian * s, code=self.code)
-                memo[..., k] = s
-
-        # Evolving backwards, if ket:
-        if initial_state.is_ket:
-            for k in range(self.depth):
-                s = self.hamiltonian[self.depth - k - 1].evolve(s, -1 * param[self.depth - k - 1])
-                memo[:, self.depth + k + 2] = np.squeeze(s.T)
+        # Evolving backwards
+        for k in range(self.depth):
+            s = self.hamiltonian[self.depth - k - 1].evolve(s, -1 * param[self.depth - k - 1])
+            memo[:, self.depth + k + 2] = np.squeeze(s.T)
 
         # Evaluating objective function
-        if initial_state.is_ket:
-            F = np.real(np.vdot(memo[:, self.depth], memo[:, self.depth + 1]))
-        else:
-            F = np.real(np.trace(memo[..., 0]))
+        F = np.real(np.vdot(memo[:, self.depth], memo[:, self.depth + 1]))
 
         # Evaluating gradient analytically
         Fgrad = np.zeros(self.depth)
         for r in range(self.depth):
-            if initial_state.is_ket:
-                s = State(np.array([memo[:, 2 * self.depth + 1 - r]]).T, code=self.code)
-                s = self.hamiltonian[r].left_multiply(s)
-                Fgrad[r] = -2 * np.imag(np.vdot(memo[:, r], np.squeeze(s.T)))
-            else:
-                Fgrad[r] = 2 * np.imag(np.trace(memo[..., r + 1]))
+            s = State(np.array([memo[:, 2 * self.depth + 1 - r]]).T, code=self.code)
+            s = self.hamiltonian[r].left_multiply(s)
+            Fgrad[r] = -2 * np.imag(np.vdot(memo[:, r], np.squeeze(s.T)))
         return F, Fgrad
 
-    def run(self, param, initial_state=None):
-        if self.code.logical_code and initial_state is None:
-            initial_state = State(tensor_product([self.code.logical_basis[1]] * self.N), code=self.code)
-        elif initial_state is None:
-            if isinstance(self.cost_hamiltonian, HamiltonianMIS):
-                initial_state = State(np.zeros((self.cost_hamiltonian.hamiltonian.shape[0], 1)), code=self.code)
-                initial_state[-1, -1] = 1
+    def _layer(self, j, state, param):
+        state = self.hamiltonian[j].evolve(state, param[j])
+        if self.noise_model is not None and self.noise[j] is not None:
+            state = self.noise[j].evolve(state, param[j])
+        return state
+
+    def _variational_grad_density_matrix(self, param, rho, checkpoint=False):
+        # Store the state before every layer, or before every stride-th layer when checkpointing. Noise channels
+        # are not invertible, so the states can't be recovered by running the circuit backwards
+        stride = int(np.ceil(np.sqrt(self.depth))) if checkpoint else 1
+        snapshots = {}
+        for j in range(self.depth):
+            if j % stride == 0:
+                snapshots[j] = rho
+            rho = self._layer(j, rho, param)
+        F = np.real(np.trace(self.cost_hamiltonian.hamiltonian @ rho))
+
+        # Propagate the cost observable backwards through the adjoint layers. The derivative with respect to
+        # param[r] is 2 Im tr(N_r^dagger(O) H_r U_r rho U_r^dagger), where O is the observable after layer r
+        observable = State(self.cost_hamiltonian.hamiltonian @ np.identity(rho.shape[0], dtype=np.complex128),
+                           is_ket=False, code=self.code)
+        Fgrad = np.zeros(self.depth)
+        segment = []
+        for r in reversed(range(self.depth)):
+            if len(segment) == 0:
+                start = r - r % stride
+                segment = [snapshots.pop(start)]
+                for j in range(start, r):
+                    segment.append(self._layer(j, segment[-1], param))
+            rho = self.hamiltonian[r].evolve(segment.pop(), param[r])
+            if self.noise_model is not None and self.noise[r] is not None:
+                observable = self.noise[r].evolve_adjoint(observable, param[r])
+            Fgrad[r] = 2 * np.imag(np.sum(observable.T * self.hamiltonian[r].left_multiply(rho)))
+            observable = self.hamiltonian[r].evolve(observable, -1 * param[r])
+        return F, Fgrad
+
+    def _variational_grad_adjoint(self, param, initial_state, checkpoint=False):
+        # Snapshots of the state before every stride-th layer
+        stride = int(np.ceil(np.sqrt(self.depth)))
+        snapshots = {}
+        psi = initial_state
+        for j in range(self.depth):
+            if checkpoint and j % stride == 0:
+                snapshots[j] = psi
+            psi = self.hamiltonian[j].evolve(psi, param[j])
+        # Multiply by cost_hamiltonian
+        adjoint = State(self.cost_hamiltonian.hamiltonian @ psi, code=self.code)
+        F = np.real(np.vdot(psi, adjoint))
+
+        # Walk back through the layers, keeping the state before layer r and the adjoint state after it
+        Fgrad = np.zeros(self.depth)
+        segment = []
+        for r in reversed(range(self.depth)):
+            adjoint = self.hamiltonian[r].evolve(adjoint, -1 * param[r])
+            if checkpoint:
+                if len(segment) == 0:
+                    # Recompute the states between the last snapshot and layer r
+                    start = r - r % stride
+                    segment = [snapshots.pop(start)]
+                    for j in range(start, r):
+                        segment.append(self.hamiltonian[j].evolve(segment[-1], param[j]))
+                psi = segment.pop()
             else:
-                initial_state = State(np.ones((self.cost_hamiltonian.hamiltonian.shape[0], 1)) /
-                                      np.sqrt(self.cost_hamiltonian.hamiltonian.shape[0]), code=self.code)
+                psi = self.hamiltonian[r].evolve(psi, -1 * param[r])
+            s = self.hamiltonian[r].left_multiply(adjoint)
+            Fgrad[r] = -2 * np.imag(np.vdot(psi, s))
+        return F, Fgrad
+
+    def _default_initial_state(self):
+        if self.code.logical_code:
+            return State(tensor_product([self.code.logical_basis[1]] * self.N), code=self.code)
+        elif isinstance(self.cost_hamiltonian, HamiltonianMIS):
+            initial_state = State(np.zeros((self.cost_hamiltonian.hamiltonian.shape[0], 1)), code=self.code)
+            initial_state[-1, -1] = 1
+            return initial_state
+        else:
+            return State(np.ones((self.cost_hamiltonian.hamiltonian.shape[0], 1)) /
+                         np.sqrt(self.cost_hamiltonian.hamiltonian.shape[0]), code=self.code)
+
+    def _final_state(self, param, initial_state):
         if not (self.noise_model is None or self.noise_model == 'monte_carlo'):
             # Initial s should be a density matrix
             initial_state = State(outer_product(initial_state, initial_state), code=self.code)
@@ -161,10 +234,267 @@ class SimulateQAOA(object):
             if self.noise_model is not None:
                 if self.noise[j] is not None:
                     s = self.noise[j].evolve(s, param[j])
+        return s
+
+    def run(self, param, initial_state=None):
+        """Return the objective, by default the expectation value of the cost function, at the end of the circuit."""
+        return self._memoize('run', self._run, param, initial_state)
+
+    def _memoize(self, name, function, param, initial_state, *args):
+        cache = self._caches[name]
+        if cache.maxsize is None:
+            return function(param, initial_state, *args)
+        # Hamiltonians and noise are compared by identity, along with the attributes which are commonly changed
+        def attribute(obj, name):
+            value = getattr(obj, name, None)
+            return None if value is None else tuple(np.ravel(value))
+
+        configuration = (self.depth, tuple((h, attribute(h, 'energies')) for h in self.hamiltonian), self.noise_model,
+                         None if self.noise is None else tuple((n, attribute(n, 'rates')) for n in self.noise),
+                         self.cost_hamiltonian, attribute(self.cost_hamiltonian, 'energies'), self.objective,
+                         self.shots, self.alpha, self.eta, self.seed, self.num_samples)
+        state = None
+        if initial_state is not None:
+            state = (initial_state.shape, hash(np.ascontiguousarray(initial_state).tobytes()))
+        key = (tuple(np.round(np.asarray(param, dtype=np.float64) / self.cache_resolution).astype(np.int64)),
+               configuration, state) + args
+        value = cache.get(key)
+        if value is None:
+            value = function(param, initial_state, *args)
+            cache.put(key, value)
+        return copy.deepcopy(value)
+
+    def cache_info(self):
+        """Return the hit/miss statistics of the memoized :py:meth:`run` and :py:meth:`variational_grad`."""
+        return {name: cache.info() for name, cache in self._caches.items()}
+
+    def cache_clear(self):
+        """Empty the caches of :py:meth:`run` and :py:meth:`variational_grad`."""
+        for cache in self._caches.values():
+            cache.clear()
+
+    def _run(self, param, initial_state=None):
+        if initial_state is None:
+            initial_state = self._default_initial_state()
+        if self.objective != 'expectation' or self.shots is not None:
+            return self.run_sampled(param, initial_state=initial_state)
+        if self.noise_model == 'monte_carlo':
+            return self.run_monte_carlo(param, initial_state=initial_state)['f_val']
+        s = self._final_state(param, initial_state)
         # Return the expected value of the cost function
         # Note that the codes's defined expectation function won't work here due to the shape of C
         return self.cost_hamiltonian.cost_function(s)
 
+    def _distribution(self, param, initial_state):
+        # Probabilities of measuring each basis state at the end of the circuit, and the cost of each basis state
+        if self.code.logical_code or not self.cost_hamiltonian._is_diagonal:
+            raise NotImplementedError('Sampling is only implemented for diagonal cost functions of physical qubits.')
+        if self.noise_model == 'monte_carlo':
+            raise NotImplementedError('Sampling is not implemented for the monte_carlo noise model.')
+        s = self._final_state(param, initial_state)
+        if s.is_ket:
+            probabilities = np.abs(np.asarray(s)[:, 0]) ** 2
+        else:
+            probabilities = np.real(np.diagonal(s))
+        return probabilities, np.real(np.asarray(self.cost_hamiltonian._diagonal_hamiltonian).reshape(-1))
+
+    def sample(self, param, shots, initial_state=None, batch_size=2 ** 16, seed=None):
+        """
+        Sample bitstrings from the final state, as measured on hardware. Shots are drawn in batches by binary search
+        of uniform random numbers in the cumulative distribution.
+
+        :param param: QAOA parameters, one per layer.
+        :type param: np.ndarray
+        :param shots: Number of bitstrings to sample.
+        :type shots: int
+        :param initial_state: Initial state, defaults to the initial state of :py:meth:`run`.
+        :type initial_state: State
+        :param batch_size: Number of shots drawn at once.
+        :type batch_size: int
+        :param seed: Seed of the random number generator, so that samples are reproducible.
+        :type seed: int or np.random.Generator, optional
+        :return: The index of each sampled basis state, and its cost.
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        if initial_state is None:
+            initial_state = self._default_initial_state()
+        probabilities, costs = self._distribution(param, initial_state)
+        return _sample(probabilities, costs, shots, batch_size, np.random.default_rng(seed))
+
+    def run_sampled(self, param, initial_state=None, objective=None, shots=None, alpha=None, eta=None, seed=None):
+        """
+        Evaluate an objective of the distribution of the cost function at the end of the circuit, exactly or from
+        sampled bitstrings. Arguments default to the attributes set in the constructor.
+
+        :param param: QAOA parameters, one per layer.
+        :type param: np.ndarray
+        :param initial_state: Initial state, defaults to the initial state of :py:meth:`run`.
+        :type initial_state: State
+        :param objective: One of ``'expectation'``, ``'cvar'``, or ``'gibbs'``.
+        :type objective: str
+        :param shots: Number of bitstrings to sample, or ``None`` to use the exact distribution.
+        :type shots: int, optional
+        :param alpha: Fraction of the best costs averaged by the CVaR objective.
+        :type alpha: float
+        :param eta: Inverse temperature of the Gibbs objective.
+        :type eta: float
+        :param seed: Seed of the random number generator.
+        :type seed: int, optional
+        :return: The objective.
+        :rtype: float
+        """
+        objective = self.objective if objective is None else objective
+        shots = self.shots if shots is None else shots
+        alpha = self.alpha if alpha is None else alpha
+        eta = self.eta if eta is None else eta
+        seed = self.seed if seed is None else seed
+        if initial_state is None:
+            initial_state = self._default_initial_state()
+        probabilities, costs = self._distribution(param, initial_state)
+        if shots is not None:
+            _, costs = _sample(probabilities, costs, shots, 2 ** 16, np.random.default_rng(seed))
+            probabilities = np.full(shots, 1 / shots)
+        # The best costs are the largest for maximization problems
+        sign = 1 if self.cost_hamiltonian.optimization == 'max' else -1
+        if objective == 'expectation':
+            return float(np.sum(probabilities * costs))
+        elif objective == 'cvar':
+            order = np.argsort(-sign * costs, kind='stable')
+            # Weight of each outcome within the best alpha fraction of the distribution
+            cumulative = np.cumsum(probabilities[order])
+            weights = np.clip(alpha - (cumulative - probabilities[order]), 0, probabilities[order])
+            return float(np.sum(weights * costs[order]) / alpha)
+        elif objective == 'gibbs':
+            # Shift by the best cost before exponentiating to avoid overflow
+            best = np.max(sign * costs)
+            return float(sign * (best + np.log(np.sum(probabilities * np.exp(eta * (sign * costs - best)))) / eta))
+        raise ValueError("objective must be one of 'expectation', 'cvar', or 'gibbs'.")
+
+    def run_batch(self, params, initial_state=None, batch_size=None):
+        """
+        Evaluate the cost function for many parameter sets at once. The kets for a batch of parameter sets are stored
+        as the columns of a single :math:`(\\text{dim}, B)` array, so that each layer is applied to all of them with
+        one vectorized operation: per-column phases for diagonal cost Hamiltonians, and per-column single qudit
+        propagators for the driver.
+
+        :param params: QAOA parameters, of shape ``(B, depth)``.
+        :type params: np.ndarray
+        :param initial_state: Initial ket, defaults to the initial state of :py:meth:`run`.
+        :type initial_state: State
+        :param batch_size: Maximum number of kets stored at once, defaults to about :math:`2^{22}` amplitudes.
+        :type batch_size: int
+        :return: The cost function for each parameter set, of shape ``(B,)``.
+        :rtype: np.ndarray
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        if initial_state is None:
+            initial_state = self._default_initial_state()
+        if self.noise_model is not None or not initial_state.is_ket or self.objective != 'expectation' or \
+                self.shots is not None:
+            return np.array([self.run(param, initial_state=initial_state) for param in params])
+        if batch_size is None:
+            batch_size = max(1, 2 ** 22 // initial_state.shape[0])
+        results = np.zeros(params.shape[0])
+        for start in range(0, params.shape[0], batch_size):
+            times = params[start:start + batch_size]
+            s = State(np.repeat(np.asarray(initial_state), times.shape[0], axis=1), is_ket=True, code=self.code)
+            for j in range(self.depth):
+                if isinstance(self.hamiltonian[j], (HamiltonianMIS, HamiltonianMaxCut, HamiltonianDriver,
+                                                    HamiltonianEnergyShift, HamiltonianRydberg)):
+                    s = self.hamiltonian[j].evolve(s, times[:, j])
+                else:
+                    s = State(np.hstack([self.hamiltonian[j].evolve(s[:, [k]], times[k, j])
+                                         for k in range(times.shape[0])]), is_ket=True, code=self.code)
+            results[start:start + times.shape[0]] = [self.cost_hamiltonian.cost_function(s[:, [k]])
+                                                     for k in range(times.shape[0])]
+        return results
+
+    def run_pauli_propagation(self, param, max_weight=None, min_coefficient=0):
+        """
+        Evaluate the cost function in the Heisenberg picture, without a state vector: the cost Hamiltonian is
+        expanded in Pauli strings and conjugated backwards through each layer, then its expectation value is taken in
+        the default initial product state. This is exact without truncation, and becomes a fast approximation for
+        large graphs when strings of high weight or small coefficient are dropped.
+
+        :param param: QAOA parameters, one per layer.
+        :type param: np.ndarray
+        :param max_weight: If not ``None``, drop Pauli strings acting on more than ``max_weight`` qubits.
+        :type max_weight: int, optional
+        :param min_coefficient: Drop Pauli strings whose coefficient has absolute value at most ``min_coefficient``.
+        :type min_coefficient: float
+        :return: The expectation value of the cost function.
+        :rtype: float
+        """
+        if self.noise_model is not None:
+            raise NotImplementedError('Pauli propagation is only implemented for noiseless QAOA.')
+        observable = pauli_propagation.from_hamiltonian(self.cost_hamiltonian, n=self.N)
+        for j in reversed(range(self.depth)):
+            observable = observable.evolve_adjoint(pauli_propagation.from_hamiltonian(self.hamiltonian[j], n=self.N),
+                                                   param[j], max_weight=max_weight, min_coefficient=min_coefficient)
+        if isinstance(self.cost_hamiltonian, HamiltonianMIS):
+            return observable.expectation(np.ones(self.N, dtype=int))
+        return observable.expectation('plus')
+
+    def run_monte_carlo(self, param, initial_state=None, num_samples=None, batch_size=16, workers=None,
+                        confidence=.95, seed=None):
+        """
+        Estimate the cost function of the noisy circuit by unraveling the noise channels into random Pauli errors on
+        kets, so that memory scales as :math:`2^n` rather than :math:`4^n`. Trajectories are simulated in batches,
+        with each batch stored as the columns of a single array, and batches are distributed over ``workers``
+        processes.
+
+        :param param: QAOA parameters.
+        :type param: np.ndarray
+        :param initial_state: Initial ket, defaults to the initial state of :py:meth:`run`.
+        :type initial_state: State
+        :param num_samples: Number of trajectories, defaults to ``self.num_samples``.
+        :type num_samples: int
+        :param batch_size: Number of trajectories simulated together.
+        :type batch_size: int
+        :param workers: Number of processes, defaults to ``self.workers``.
+        :type workers: int
+        :param confidence: Confidence level of the returned confidence interval.
+        :type confidence: float
+        :param seed: Seed of the random number generators, for reproducible estimates, defaults to ``self.seed``.
+        :type seed: int
+        :return: A dictionary with the mean cost function ``f_val``, its standard error ``stderr``, the normal
+            ``confidence_interval`` and the cost function of each trajectory ``samples``.
+        :rtype: dict
+        """
+        if initial_state is None:
+            initial_state = self._default_initial_state()
+        if not initial_state.is_ket:
+            raise ValueError('Monte Carlo trajectories must start from a ket.')
+        if num_samples is None:
+            num_samples = self.num_samples
+        if workers is None:
+            workers = self.workers
+        seed = self.seed if seed is None else seed
+        sizes = [batch_size] * (num_samples // batch_size)
+        if num_samples % batch_size != 0:
+            sizes.append(num_samples % batch_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+        def run_batch(arg):
+            size, seed_sequence = arg
+            rng = np.random.default_rng(seed_sequence)
+            s = State(np.repeat(np.asarray(initial_state), size, axis=1), is_ket=True, code=self.code)
+            for j in range(self.depth):
+                s = self.hamiltonian[j].evolve(s, param[j])
+                if self.noise is not None and self.noise[j] is not None:
+                    s = self.noise[j].sample_evolve(s, param[j], rng=rng)
+            return np.array([self.cost_hamiltonian.cost_function(s[:, [k]]) for k in range(size)])
+
+        samples = np.concatenate(parallel_map(run_batch, zip(sizes, seeds), workers=workers))
+        f_val = np.mean(samples)
+        if num_samples > 1:
+            stderr = np.std(samples, ddof=1) / np.sqrt(num_samples)
+        else:
+            stderr = np.inf
+        z = norm.ppf((1 + confidence) / 2)
+        return {'f_val': f_val, 'stderr': stderr, 'confidence_interval': (f_val - z * stderr, f_val + z * stderr),
+                'samples': samples}
+
     def fix_param_gauge(self, param, gamma_period=np.pi, beta_period=np.pi / 2, degree_parity=None):
         EVEN_DEGREE_ONLY, ODD_DEGREE_ONLY = 0, 1
         """ Use symmetries to reduce redundancies in the parameter space
@@ -214,106 +544,149 @@ class SimulateQAOA(object):
 
         return np.concatenate((gammas * gamma_period, -betas * beta_period, param[2 * p:])).tolist()
 
-    def find_initial_parameters(self, init_param_guess=None, verbose=False, initial_state=None):
-        r"""
-        Given a graph, find QAOA parameters that minimizes C=\sum_{<ij>} w_{ij} Z_i Z_j
-
-        Uses the interpolation-based heuristic from arXiv:1812.01041. THIS IS ONLY VALID FOR VANILLA QAOA
-
-        Input:
-            p_max: maximum p you want to optimize to (optional, default p_max=10)
-
-        Output: is given in dictionary format {p: (F_p, param_p)}
-            p = depth/level of QAOA, goes from 1 to p_max
-            F_p = <C> achieved by the optimum found at depth p
-            param_p = 2*p parameters for the QAOA at depth p
-        """
-
-        # Construct function to be passed to scipy.optimize.minimize
-        raise NotImplementedError
-        if self.cost_hamiltonian.optimization == 'min':
-            opt_c = min(self.cost_hamiltonian.hamiltonian)
-            f = lambda param: self.run(param, initial_state=initial_state)
-        if self.cost_hamiltonian.optimization == 'max':
-            opt_c = -1 * max(self.cost_hamiltonian.hamiltonian)
-            f = lambda param: -1 * self.run(param, initial_state=initial_state)
-
-        # check if the node degrees are always odd or even
-        degree_list = np.array([(self.graph.graph.degree[i], i) for i in range(self.N)]) % 2
+    def _interleave(self, gammas, betas):
+        # Parameters are ordered by layer, alternating between the cost Hamiltonian and the driver
+        param = np.zeros(2 * len(gammas))
+        param[0::2], param[1::2] = gammas, betas
+        return param
+
+    def _fix_gauge(self, param):
+        # Gauge fixing is only valid for MaxCut with integer weights, whose cost function has integer eigenvalues and
+        # is symmetric under flipping every spin
+        if not isinstance(self.cost_hamiltonian, HamiltonianMaxCut) or self.code.logical_code:
+            return np.asarray(param)
+        weights = np.array([self.graph.graph.edges[e]['weight'] for e in self.graph.graph.edges])
+        if not np.allclose(weights, np.round(weights)):
+            return np.asarray(param)
+        degrees = np.array([self.graph.graph.degree(i, weight='weight') for i in self.graph.graph.nodes]) % 2
         parity = None
-        if np.all(degree_list % 2 == 0):
+        if np.all(degrees == 0):
             parity = 0
-        elif np.all(degree_list % 2 == 1):
+        elif np.all(degrees == 1):
             parity = 1
-        else:
-            raise NotImplementedError
+        # fix_param_gauge expects the cost function sum_ij Z_i Z_j, which has half the period of sum_ij (1-Z_iZ_j)/2
+        gamma_period = 2 * np.pi if self.cost_hamiltonian.use_cost_function else np.pi
+        fixed = self.fix_param_gauge(np.concatenate([param[0::2], param[1::2]]), gamma_period=gamma_period,
+                                     degree_parity=parity)
+        p = len(param) // 2
+        return self._interleave(fixed[:p], fixed[p:])
 
-        # Start the optimization process incrementally from p = 1 to p_max
-        beta_first = self.depth % 2
-        if not beta_first:
-            Fvals = self.depth // 2 * [0]
+    def find_initial_parameters(self, init_param_guess=None, verbose=False, initial_state=None, strategy='interp',
+                                cache=None, analytic_gradient=True):
+        r"""
+        Find QAOA parameters depth by depth, optimizing depth :math:`p+1` from the optimum at depth :math:`p`, using
+        the heuristics of arXiv:1812.01041. This is only valid for vanilla QAOA, where ``self.hamiltonian`` alternates
+        between the cost Hamiltonian and the driver.
+
+        With the INTERP strategy, the optimal :math:`\\gamma` and :math:`\\beta` at depth :math:`p` are linearly
+        interpolated to :math:`p+1` points. With the FOURIER strategy, :math:`\\gamma_i=\\sum_k u_k
+        \\sin((k-1/2)(i-1/2)\\pi/p)` and :math:`\\beta_i=\\sum_k v_k\\cos((k-1/2)(i-1/2)\\pi/p)` are optimized over
+        the amplitudes :math:`u, v`, and depth :math:`p+1` starts from the amplitudes at depth :math:`p` padded with
+        zeros. Optima of MaxCut are reduced with :py:meth:`fix_param_gauge` so that they vary smoothly with depth.
+
+        :param init_param_guess: Initial parameters at depth one. By default, the best point of a grid search.
+        :type init_param_guess: np.ndarray, optional
+        :param verbose: Whether to print the result at each depth.
+        :type verbose: bool
+        :param initial_state: Initial state of the QAOA circuit.
+        :type initial_state: State
+        :param strategy: One of ``'interp'`` or ``'fourier'``.
+        :type strategy: str
+        :param cache: Optimal parameters of smaller or similar graphs. The search starts from the deepest parameters
+            cached for a similar graph, and the optimum at each depth is added to the cache.
+        :type cache: ParameterCache, optional
+        :param analytic_gradient: Whether to optimize with the gradient of :py:meth:`variational_grad`.
+        :type analytic_gradient: bool
+        :return: The result at each depth, in the format of :py:meth:`find_parameters_minimize`, with the number of
+            function evaluations ``nfev``.
+        :rtype: list of dict
+        """
+        if strategy not in ('interp', 'fourier'):
+            raise ValueError("strategy must be one of 'interp' or 'fourier'.")
+        if self.depth % 2 != 0:
+            raise ValueError('find_initial_parameters requires alternating cost and driver layers.')
+        if self.cost_hamiltonian.optimization == 'max':
+            sign = -1
         else:
-            Fvals = (self.depth // 2 + 1) * [0]
-        params = self.depth * [None]
-
-        for p in range(self.depth // 2):  # Note here, p goes from 0 to p_max - 1
-            # Use heuristic to produce good initial guess of parameters
-            if p == 0:
-                param0 = init_param_guess
-            elif p == 1:
-                param0 = np.repeat(params[0:2], 2)
-            else:
-                # Interpolate to find the next parameter
-                xp = np.linspace(0, 1, p)
-                xp1 = np.linspace(0, 1, p + 1)
-                # param0 has 2p+1 entries
-                param0 = np.concatenate([np.interp(xp1, xp, params[p - 1][n * p:(n + 1) * p]) for n in range(self.m)])
-
-            start = timer()
-            if param0 is not None:
-                results = minimize(f, param0, jac=None, method='BFGS',
-                                   tol=.01)
-            else:  # Run with 10 random guesses of parameters and keep best one
-                # Will only apply to the lowest depth (p=0 here)
-                # First run with a guess known to work most of the time
-                if not beta_first:
-                    param0 = np.ones((p + 1) * self.m) * np.pi / 8
-                    param0[p:2 * p] = param0[p:2 * p] * -1
-                    results = self.find_parameters_minimize(param0, initial_state=initial_state)
+            sign = 1
+        opt = self.cost_hamiltonian.optimum
+        hamiltonian = self.hamiltonian
+        p_max = self.depth // 2
+
+        param0 = None if init_param_guess is None else np.asarray(init_param_guess, dtype=np.float64)
+        p_start = 1
+        if cache is not None:
+            cached = cache.lookup(self.graph, p_max)
+            if cached is not None:
+                param0 = np.asarray(cached, dtype=np.float64)
+                p_start = len(param0) // 2
+        results = []
+        amplitudes = None
+        try:
+            for p in range(p_start, p_max + 1):
+                self.hamiltonian = hamiltonian[:2 * p]
+                start = timer()
+                if param0 is None:
+                    # Only depth one is searched without a warm start
+                    param0 = self.find_parameters_brute(n=20, verbose=False, initial_state=initial_state)['params']
+                if strategy == 'interp':
+                    basis = np.identity(p)
                 else:
-                    param0 = np.ones((p + 1) * self.m + 1) * np.pi / 8
-                    param0[p + 1:2 * p + 2] = param0[p + 1:2 * p + 2] * -1
-                    results = self.find_parameters_minimize(param0, initial_state=initial_state)
-
-                for _ in range(1, 10):
-                    # Some reasonable random guess
-                    param0 = np.ones((p + 1) * self.m) * np.random.rand((p + 1) * self.m) * np.pi / 2
-                    param0[p:2 * p] = param0[0:p] * -1 / 4
-                    test_results = minimize(f, param0, jac=None,
-                                            method='BFGS', tol=.01)
-                if test_results.fun < results.fun:  # found a better minimum
-                    results = test_results
-
-            if verbose:
-                end = timer()
-                print(
-                    f'-- p={p + 1}, F = {results.fun:0.3f} / {opt_c}, nfev={results.nfev}, time={end - start:0.2f} s')
-
-            Fvals[p] = np.real(results.fun)
-            params[p] = self.fix_param_gauge(results.x, degree_parity=parity)
-
-        if verbose:
-            for p, f_val, param in zip(np.arange(1, self.p + 1), Fvals, params):
-                print('p:', p)
-                print('f_val:', f_val)
-                print('params:', np.array(param).reshape(self.m, -1))
-                print('approximation_ratio:', f_val / opt_c[0])
-
-        return [OptimizeResult(p=p,
-                               f_val=f_val,
-                               params=np.array(param).reshape(self.m, -1),
-                               approximation_ratio=f_val / opt_c)
-                for p, f_val, param in zip(np.arange(1, self.p + 1), Fvals, params)]
+                    # Rows are layers, columns are amplitudes
+                    layers, modes = np.meshgrid(np.arange(p) + 1 / 2, np.arange(p) + 1 / 2, indexing='ij')
+                    basis = np.concatenate([np.sin(layers * modes * np.pi / p), np.cos(layers * modes * np.pi / p)])
+                    basis = basis.reshape((2, p, p))
+
+                def to_param(x):
+                    if strategy == 'interp':
+                        return x
+                    return self._interleave(basis[0] @ x[:p], basis[1] @ x[p:])
+
+                def f(x):
+                    param = to_param(x)
+                    if not analytic_gradient:
+                        return sign * self.run(param, initial_state=initial_state)
+                    value, grad = self.variational_grad(param, initial_state=initial_state)
+                    if strategy == 'fourier':
+                        grad = np.concatenate([basis[0].T @ grad[0::2], basis[1].T @ grad[1::2]])
+                    return sign * value, sign * np.asarray(grad)
+
+                if strategy == 'interp':
+                    x0 = param0
+                elif amplitudes is not None:
+                    # Amplitudes of depth p-1 padded with zeros
+                    x0 = np.concatenate([amplitudes[:p - 1], [0], amplitudes[p - 1:], [0]])
+                else:
+                    # Amplitudes of the initial parameters
+                    x0 = np.concatenate([np.linalg.solve(basis[0], param0[0::2]),
+                                         np.linalg.solve(basis[1], param0[1::2])])
+                result = minimize(f, x0, jac=analytic_gradient, method='BFGS')
+                param = self._fix_gauge(to_param(result.x))
+                f_val = sign * np.real(result.fun)
+                results.append({'depth': 2 * p, 'f_val': f_val, 'params': param,
+                                'approximation_ratio': f_val / opt, 'opt': opt, 'nfev': result.nfev})
+                if cache is not None:
+                    cache.add(self.graph, param)
+                if verbose:
+                    print(f'-- p={p}, F = {f_val:0.3f} / {opt}, nfev={result.nfev}, time={timer() - start:0.2f} s')
+                # Warm start for the next depth
+                if strategy == 'interp':
+                    # gamma'_i = (i-1)/p gamma_{i-1} + (p-i+1)/p gamma_i for i = 1, ..., p+1, with gamma_0 =
+                    # gamma_{p+1} = 0
+                    weights = np.arange(p + 1) / p
+                    gammas = weights * np.append(0, param[0::2]) + weights[::-1] * np.append(param[0::2], 0)
+                    betas = weights * np.append(0, param[1::2]) + weights[::-1] * np.append(param[1::2], 0)
+                    param0 = self._interleave(gammas, betas)
+                elif amplitudes is None:
+                    # Start from the amplitudes of the gauge fixed parameters, which are small
+                    amplitudes = np.concatenate([np.linalg.solve(basis[0], param[0::2]),
+                                                 np.linalg.solve(basis[1], param[1::2])])
+                else:
+                    # Later amplitudes are kept as optimized, since gauge fixing would make them jump between depths
+                    amplitudes = result.x
+        finally:
+            self.hamiltonian = hamiltonian
+        return results
 
     def find_parameters_brute(self, n=20, verbose=True, initial_state=None, ranges=None):
         r"""
@@ -328,11 +701,16 @@ class SimulateQAOA(object):
         # We can't use analytic gradient here
         if self.cost_hamiltonian.optimization == 'max':
             opt_c = -1 * self.cost_hamiltonian.optimum
-            f = lambda param: -1 * self.run(param, initial_state=initial_state)
+            sign = -1
         else:
             opt_c = self.cost_hamiltonian.optimum
-            f = lambda param: self.run(param)
-        results = brute(f, ranges, Ns=n, full_output=True)
+            sign = 1
+        # Evaluate the whole grid in batches, then polish the best grid point as scipy.optimize.brute does
+        grid = np.meshgrid(*[np.linspace(r[0], r[1], n) for r in ranges], indexing='ij')
+        grid = np.stack(grid, axis=-1).reshape((-1, len(ranges)))
+        values = sign * self.run_batch(grid, initial_state=initial_state)
+        results = fmin(lambda param: sign * self.run(param, initial_state=initial_state), grid[np.argmin(values)],
+                       full_output=True, disp=False)
 
         if self.cost_hamiltonian.optimization == 'max':
             f_val = -1 * np.real(results[1])
@@ -418,6 +796,65 @@ class SimulateQAOA(object):
         return {'depth': self.depth, 'f_val': f_val, 'params': params, 'approximation_ratio': approximation_ratio,
                 'opt': opt}
 
+    def find_parameters_multistart(self, n_starts=20, workers=None, verbose=True, initial_state=None, ranges=None,
+                                   tol=1e-6, seed=None):
+        r"""
+        Find QAOA parameters by running L-BFGS-B with the analytic gradient from ``n_starts`` random initial
+        parameters, distributed over ``workers`` processes. Worker processes are forked, so the cost Hamiltonian is
+        shared rather than copied. No further starts are run once the optimum of the cost Hamiltonian is reached.
+
+        :param n_starts: Number of random initial parameters.
+        :type n_starts: int
+        :param workers: Number of processes.
+        :type workers: int
+        :param verbose: Whether to print the best result.
+        :type verbose: bool
+        :param initial_state: Initial state of the QAOA circuit.
+        :type initial_state: State
+        :param ranges: Bounds of each parameter, defaults to :math:`(0, 2\\pi)`.
+        :type ranges: list of tuple
+        :param tol: Stop once the approximation ratio is within ``tol`` of one.
+        :type tol: float
+        :param seed: Seed used to draw the initial parameters.
+        :type seed: int
+        :return: The results of each start which was run, ranked from best to worst, in the format of
+            :py:meth:`find_parameters_minimize`.
+        :rtype: list of dict
+        """
+        if ranges is None:
+            ranges = [(0, 2 * np.pi)] * self.depth
+        rng = np.random.default_rng(seed)
+        init_param_guesses = [np.array([rng.uniform(r[0], r[1]) for r in ranges]) for _ in range(n_starts)]
+        if self.cost_hamiltonian.optimization == 'max':
+            opt_c = -1 * self.cost_hamiltonian.optimum
+            sign = -1
+        else:
+            opt_c = self.cost_hamiltonian.optimum
+            sign = 1
+
+        def f(param):
+            res = self.variational_grad(param, initial_state=initial_state)
+            return sign * res[0], sign * res[1]
+
+        def optimize(init_param_guess):
+            res = minimize(f, init_param_guess, jac=True, method='L-BFGS-B', bounds=ranges)
+            return np.asarray(res.x), np.real(res.fun)
+
+        runs = parallel_map(optimize, init_param_guesses, workers=workers,
+                            stop=lambda res: res[1] / opt_c >= 1 - tol)
+        results = []
+        for (params, fun) in sorted(runs, key=lambda res: res[1]):
+            results.append({'depth': self.depth, 'f_val': sign * fun, 'params': params,
+                            'approximation_ratio': fun / opt_c, 'opt': sign * opt_c})
+        if verbose:
+            print('depth:', self.depth)
+            print('starts:', len(results))
+            print('f_val:', results[0]['f_val'])
+            print('params:', results[0]['params'])
+            print('approximation_ratio:', results[0]['approximation_ratio'])
+            print('opt:', results[0]['opt'])
+        return results
+
     def find_parameters_basinhopping(self, n=20, verbose=True, initial_state=None, init_param_guess=None,
                                      analytic_gradient=False, ranges=None):
         r"""
@@ -474,3 +911,98 @@ class SimulateQAOA(object):
             print('opt:', opt)
         return {'depth': self.depth, 'f_val': f_val, 'params': params, 'approximation_ratio': approximation_ratio,
                 'opt': opt}
+
+
+
+
+class _EvaluationCache(object):
+    # Bounded least recently used cache, with the statistics of functools.lru_cache
+    CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def get(self, key):
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._values[key] = value
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def info(self):
+        return self.CacheInfo(self.hits, self.misses, self.maxsize, len(self._values))
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self._values.clear()
+
+class ParameterCache(object):
+    def __init__(self, max_distance=.25):
+        """
+        Optimal QAOA parameters of previously solved graphs, to transfer to similar graphs. Optimal parameters
+        concentrate for graphs with the same local structure, so graphs are compared by the distribution of their
+        weighted node degrees, regardless of their size.
+
+        :param max_distance: Largest total variation distance between degree distributions, plus the difference of mean
+            edge weights, for graphs to be considered similar.
+        :type max_distance: float
+        """
+        self.max_distance = max_distance
+        # List of (degree distribution, mean edge weight, parameters)
+        self.entries = []
+
+    @staticmethod
+    def _features(graph: Graph):
+        degrees = [graph.graph.degree(i, weight='weight') for i in graph.graph.nodes]
+        values, counts = np.unique(np.round(degrees, 6), return_counts=True)
+        weights = [graph.graph.edges[e]['weight'] for e in graph.graph.edges]
+        return dict(zip(values, counts / len(degrees))), np.mean(weights) if len(weights) > 0 else 0
+
+    def _distance(self, features, entry):
+        distribution, weight = features
+        keys = set(distribution) | set(entry[0])
+        return sum(abs(distribution.get(k, 0) - entry[0].get(k, 0)) for k in keys) / 2 + abs(weight - entry[1])
+
+    def add(self, graph: Graph, params):
+        """
+        Cache optimal parameters of a graph, replacing parameters of the same depth for an identical degree
+        distribution.
+        """
+        features = self._features(graph)
+        self.entries = [entry for entry in self.entries if not
+                        (len(entry[2]) == len(params) and self._distance(features, entry) == 0)]
+        self.entries.append((features[0], features[1], np.array(params, dtype=np.float64)))
+
+    def lookup(self, graph: Graph, depth):
+        """
+        :return: The deepest cached parameters, of depth at most ``depth`` layers pairs, of the most similar graph
+            within ``max_distance``, or ``None``.
+        :rtype: np.ndarray
+        """
+        features = self._features(graph)
+        candidates = [(len(entry[2]), -self._distance(features, entry), i) for i, entry in enumerate(self.entries)
+                      if len(entry[2]) <= 2 * depth and self._distance(features, entry) <= self.max_distance]
+        if len(candidates) == 0:
+            return None
+        return self.entries[max(candidates)[2]][2].copy()
+
+def _sample(probabilities, costs, shots, batch_size, rng):
+    # Draw basis states by binary search in the cumulative distribution, in batches of shots
+    cumulative = np.cumsum(probabilities)
+    indices = np.empty(shots, dtype=np.int64)
+    for start in range(0, shots, batch_size):
+        stop = min(shots, start + batch_size)
+        indices[start:stop] = np.searchsorted(cumulative, rng.random(stop - start) * cumulative[-1], side='right')
+    # Guard against rounding in the last element of the cumulative sum
+    indices = np.minimum(indices, len(probabilities) - 1)
+    return indices, costs[indices]
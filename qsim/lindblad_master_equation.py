@@ -1,13 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.integrate
 from odeintw import odeintw
-from scipy.sparse.linalg import LinearOperator, eigs, ArpackNoConvergence
+from scipy.sparse import coo_matrix, csr_matrix, diags, identity, kron
+from scipy.sparse.linalg import LinearOperator, eigs, ArpackNoConvergence, expm_multiply
 
 from qsim.codes.quantum_state import State
 from qsim.evolution.lindblad_operators import LindbladJumpOperator
 from qsim.evolution.quantum_channels import QuantumChannel
-from qsim.schrodinger_equation import SchrodingerEquation
+from qsim.evolution.interaction_picture import InteractionPicture
+from qsim.evolution.parareal import parareal
+from qsim.evolution.schedule import CompiledSchedule, _energy_operators
+from qsim.evolution.adjoint import adjoint_gradient, _parameterized_energies
+from qsim.schrodinger_equation import SchrodingerEquation, _solve_ivp, _IMPLICIT_METHODS
 from qsim.tools import tools
 
 __all__ = ['LindbladMasterEquation']
@@ -31,18 +35,29 @@ class LindbladMasterEquation(object):
             ham = ham + self.hamiltonians[i].hamiltonian
         return ham
 
-    def evolution_generator(self, s: State):
+    def evolution_generator(self, s: State, hamiltonians=None):
+        # Optionally, only evolve under some of the Hamiltonians
+        if hamiltonians is None:
+            hamiltonians = self.hamiltonians
         res = State(np.zeros(s.shape), is_ket=s.is_ket, code=s.code, IS_subspace=s.IS_subspace, graph=s.graph)
-        for i in range(len(self.hamiltonians)):
-            res = res - 1j * (self.hamiltonians[i].left_multiply(s) - self.hamiltonians[i].right_multiply(s))
+        for i in range(len(hamiltonians)):
+            res = res - 1j * (hamiltonians[i].left_multiply(s) - hamiltonians[i].right_multiply(s))
         for i in range(len(self.jump_operators)):
             res = res + self.jump_operators[i].liouvillian(s)
         return res
 
     def run_ode_solver(self, state: State, t0, tf, num=50, schedule=lambda t: None, times=None, method='RK45',
-                       full_output=True, verbose=False, make_valid_state=False):
-        """
+                       full_output=True, verbose=False, make_valid_state=False, interaction_picture=None):
+        """Numerically integrates the master equation. If ``schedule`` is a
+        :py:class:`qsim.evolution.schedule.CompiledSchedule`, the Hamiltonian is evaluated from it directly, and the
+        Hamiltonians of this equation are not used.
+
+        Implicit methods of :py:func:`scipy.integrate.solve_ivp` (BDF, Radau and LSODA) are given the exact
+        Liouvillian as the Jacobian.
 
+        :param interaction_picture: One of the Hamiltonians, which must be diagonal. If given, the state is integrated
+            in the frame rotating with it, see :py:class:`qsim.evolution.interaction_picture.InteractionPicture`, and
+            transformed back to the lab frame at the output times. This is not implemented for compiled schedules.
         :param verbose:
         :param method:
         :param times:
@@ -60,16 +75,53 @@ class LindbladMasterEquation(object):
         code = state.code
         IS_subspace = state.IS_subspace
         graph = state.graph
+        compiled = isinstance(schedule, CompiledSchedule)
+        hamiltonians = self.hamiltonians
+        frame = None
+        if interaction_picture is not None:
+            if compiled:
+                raise NotImplementedError('The interaction picture is not implemented for compiled schedules.')
+            frame = InteractionPicture(interaction_picture, schedule=schedule, t0=t0, tf=tf)
+            hamiltonians = [h for h in self.hamiltonians if h is not interaction_picture]
 
         def f(t, s):
             if method == 'odeint':
                 t, s = s, t
             if method != 'odeint':
                 s = np.reshape(np.expand_dims(s, axis=0), state_shape)
+            if compiled:
+                # The Hamiltonian is Hermitian, so the state times the Hamiltonian is (H s^dagger)^dagger
+                res = -1j * (schedule.left_multiply(t, s) - schedule.left_multiply(t, s.conj().T).conj().T)
+                s = State(s, is_ket=is_ket, code=code, IS_subspace=IS_subspace, graph=graph)
+                for jump_operator in self.jump_operators:
+                    res = res + jump_operator.liouvillian(s)
+                return np.asarray(res).flatten()
             schedule(t)
+            if frame is not None:
+                s = frame.to_lab(t, s, is_ket=False)
             s = State(s, is_ket=is_ket, code=code, IS_subspace=IS_subspace, graph=graph)
+            if frame is not None:
+                return frame.to_interaction(t, self.evolution_generator(s, hamiltonians=hamiltonians),
+                                            is_ket=False).flatten()
             return np.asarray(self.evolution_generator(s)).flatten()
 
+        if method in _IMPLICIT_METHODS:
+            # The jump operators do not depend on time, so their part of the Liouvillian is computed once
+            dissipator = self._dissipator(state)
+
+        def jac(t, s):
+            # The right hand side is linear, so its Jacobian is the Liouvillian acting on the row-major vectorized
+            # density matrix, conjugated into the rotating frame if needed
+            if compiled:
+                return self._liouvillian(dissipator, hamiltonian=schedule.hamiltonian(t)).tocsr()
+            schedule(t)
+            liouvillian = self._liouvillian(dissipator, hamiltonians=hamiltonians)
+            if frame is None:
+                return liouvillian.tocsr()
+            phases = frame.phases(t)
+            phases = diags(np.kron(phases.conj(), phases))
+            return (phases @ liouvillian @ phases.conj()).tocsr()
+
         # s is a ket or density matrix
         # tf is the total simulation time
         state_asarray = np.asarray(state)
@@ -80,6 +132,8 @@ class LindbladMasterEquation(object):
                     times = np.linspace(0, 1, num=int(num)) * (tf - t0) + t0
                 z, infodict = odeintw(f, state_asarray, times, full_output=True)
                 infodict['t'] = times
+                if frame is not None:
+                    z = np.array([frame.to_lab(t, zi, is_ket=False) for (t, zi) in zip(times, z)])
                 norms = np.trace(z, axis1=-2, axis2=-1)
                 if verbose:
                     print('Fraction of integrator results normalized:',
@@ -100,6 +154,8 @@ class LindbladMasterEquation(object):
                         s = odeintw(f, s, [times[i - 1], times[i]], full_output=False)[-1]
                         # Normalize output?
                         norms[i] = np.trace(s).real
+                if frame is not None:
+                    s = frame.to_lab(times[-1], s, is_ket=False)
                 infodict = {'t': times}
                 if verbose:
                     print('Fraction of integrator results normalized:',
@@ -111,12 +167,13 @@ class LindbladMasterEquation(object):
             state_shape = state_asarray.shape
             state_asarray = state_asarray.flatten()
             if full_output:
-                res = scipy.integrate.solve_ivp(f, (t0, tf), state_asarray, t_eval=times, method=method,
-                                                vectorized=True)
+                res = _solve_ivp(f, jac, (t0, tf), state_asarray, t_eval=times, method=method, vectorized=True)
             else:
-                res = scipy.integrate.solve_ivp(f, (t0, tf), state_asarray, t_eval=[tf], method=method, vectorized=True)
+                res = _solve_ivp(f, jac, (t0, tf), state_asarray, t_eval=[tf], method=method, vectorized=True)
             res.y = np.swapaxes(res.y, 0, 1)
             res.y = np.reshape(res.y, (-1, state_shape[0], state_shape[1]))
+            if frame is not None:
+                res.y = np.array([frame.to_lab(t, y, is_ket=False) for (t, y) in zip(res.t, res.y)])
             norms = np.trace(res.y, axis1=-2, axis2=-1)
             if verbose:
                 print('Fraction of integrator results normalized:',
@@ -127,6 +184,112 @@ class LindbladMasterEquation(object):
                     res.y[i, ...] = tools.make_valid_state(res.y[i, ...], is_ket=False)
             return res.y, res
 
+    def _liouvillian(self, dissipator, hamiltonians=None, hamiltonian=None):
+        """The Liouvillian as a sparse matrix acting on row-major vectorized density matrices, given the part due to
+        the jump operators from :py:meth:`_dissipator`. If ``hamiltonian`` is given, it is used in place of the sum of
+        ``hamiltonians``."""
+        if hamiltonians is None:
+            hamiltonians = self.hamiltonians
+        dim = int(np.sqrt(dissipator.shape[0]))
+        if hamiltonian is None:
+            hamiltonian = csr_matrix((dim, dim))
+            for h in hamiltonians:
+                hamiltonian = hamiltonian + h.hamiltonian
+        ham = csr_matrix(hamiltonian)
+        return -1j * (kron(ham, identity(dim)) - kron(identity(dim), ham.T)) + dissipator
+
+    def _dissipator(self, state: State):
+        """The part of the Liouvillian due to the jump operators, as a sparse matrix acting on row-major vectorized
+        density matrices of the same shape as ``state``. It is found by applying the jump operators to each matrix
+        unit, so it applies to any :py:class:`LindbladJumpOperator`."""
+        dim = state.shape[0]
+        rows = []
+        columns = []
+        entries = []
+        for k in range(dim ** 2):
+            unit = np.zeros(dim ** 2)
+            unit[k] = 1
+            unit = State(unit.reshape((dim, dim)), is_ket=False, code=state.code, IS_subspace=state.IS_subspace,
+                         graph=state.graph)
+            out = np.zeros(dim ** 2, dtype=np.complex128)
+            for jump_operator in self.jump_operators:
+                out = out + np.asarray(jump_operator.liouvillian(unit)).flatten()
+            nonzero = np.flatnonzero(out)
+            rows.append(nonzero)
+            columns.append(np.full(len(nonzero), k))
+            entries.append(out[nonzero])
+        return coo_matrix((np.concatenate(entries), (np.concatenate(rows), np.concatenate(columns))),
+                          shape=(dim ** 2, dim ** 2)).tocsr()
+
+    def run_adjoint_solver(self, state: State, t0, tf, observable, schedule, params, method='RK45', rtol=1e-8,
+                           atol=1e-10, eps=1e-6):
+        """Computes the expectation value of ``observable`` in the state evolved to ``tf``, and its gradient with
+        respect to the parameters ``params`` of a schedule ``schedule(t, params)``, by the adjoint method, see
+        :py:func:`qsim.evolution.adjoint.adjoint_gradient`. The Hamiltonians must be linear in the energies the
+        schedule sets, and the jump operators may not depend on the parameters. The derivatives of the energies are
+        central differences of the schedule alone, with step ``eps``.
+
+        :return: The expectation value, its gradient, and a dictionary with the final state ``y`` and the number of
+            evaluations of the forward and backward solves, ``nfev``.
+        :rtype: tuple
+        """
+        assert not state.is_ket
+        dim = state.shape[0]
+        operators = []
+        for h in self.hamiltonians:
+            for operator in _energy_operators(h):
+                operator = csr_matrix(operator)
+                operators.append(-1j * (kron(operator, identity(dim)) - kron(identity(dim), operator.T)))
+        coefficients, derivatives = _parameterized_energies(self.hamiltonians, schedule, params, eps=eps)
+        # tr(C y) is the product of the row-major vectorizations of C^T and y
+        weights = np.asarray(csr_matrix(observable).T.toarray()).flatten()
+
+        def seed(y):
+            return np.real(np.sum(weights * y)), weights.conj()
+
+        value, gradient, info = adjoint_gradient(operators, coefficients, derivatives, np.asarray(state), t0, tf, seed,
+                                                 constant=self._dissipator(state), method=method, rtol=rtol,
+                                                 atol=atol)
+        info['y'] = info['y'].reshape(state.shape)
+        return value, gradient, info
+
+    def run_parareal_solver(self, state: State, t0, tf, slices=8, schedule=lambda t: None, method='RK45',
+                            coarse_steps=1, workers=None, tol=1e-4, max_iterations=None, full_output=True,
+                            verbose=False):
+        """Integrates the master equation by Parareal, see :py:func:`qsim.evolution.parareal.parareal`. The fine
+        propagator is :py:meth:`run_ode_solver` with ``method`` on each of ``slices`` equal time slices, run in
+        parallel over ``workers`` processes. The coarse propagator takes ``coarse_steps`` steps per slice, each the
+        exponential of the Liouvillian at the midpoint of the step. Returns the states at the slice boundaries if
+        ``full_output``, and otherwise the final state."""
+        assert not state.is_ket
+        code = state.code
+        IS_subspace = state.IS_subspace
+        graph = state.graph
+        dissipator = self._dissipator(state)
+
+        def fine(s, ta, tb):
+            return self.run_ode_solver(State(s, is_ket=False, code=code, IS_subspace=IS_subspace, graph=graph), ta,
+                                       tb, schedule=schedule, times=[ta, tb], method=method)[0][-1]
+
+        def coarse(s, ta, tb):
+            shape = s.shape
+            s = s.flatten()
+            dt = (tb - ta) / coarse_steps
+            for i in range(coarse_steps):
+                schedule(ta + (i + 1 / 2) * dt)
+                s = expm_multiply(dt * self._liouvillian(dissipator), s)
+            return s.reshape(shape)
+
+        z, infodict = parareal(fine, coarse, np.asarray(state, dtype=np.complex128),
+                               np.linspace(t0, tf, num=slices + 1), workers=workers, tol=tol,
+                               max_iterations=max_iterations)
+        if verbose:
+            print('Parareal iterations:', infodict['iterations'])
+            print('Final state trace - 1:', np.trace(z[-1]).real - 1)
+        if not full_output:
+            z = z[-1:]
+        return z, infodict
+
     def run_trotterized_solver(self, state: State, t0, tf, num=50, schedule=lambda t: None, times=None,
                                full_output=True, verbose=False):
         """Trotterized approximation of the Schrodinger equation"""
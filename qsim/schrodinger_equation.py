@@ -1,8 +1,13 @@
 from qsim.codes.quantum_state import State
+from qsim.evolution.schedule import CompiledSchedule, _energy_operators
+from qsim.evolution.adjoint import adjoint_gradient, _parameterized_energies
+from qsim.evolution.interaction_picture import InteractionPicture
+from qsim.evolution.parareal import parareal
 from odeintw import odeintw
 import numpy as np
 import scipy.integrate
-from scipy.sparse import csr_matrix
+from scipy.optimize import linear_sum_assignment, minimize_scalar
+from scipy.sparse import bmat, csr_matrix, diags, issparse
 from scipy.sparse.linalg import expm_multiply, eigsh
 
 __all__ = ['SchrodingerEquation']
@@ -14,6 +19,8 @@ class SchrodingerEquation(object):
         if hamiltonians is None:
             hamiltonians = []
         self.hamiltonians = hamiltonians
+        # Sparsity pattern of the summed Hamiltonian, see _composite_hamiltonian
+        self._pattern = None
 
     @property
     def hamiltonian(self):
@@ -22,11 +29,14 @@ class SchrodingerEquation(object):
             ham = ham + self.hamiltonians[i].hamiltonian
         return ham
 
-    def evolution_generator(self, state: State):
+    def evolution_generator(self, state: State, hamiltonians=None):
+        # Optionally, only evolve under some of the Hamiltonians
+        if hamiltonians is None:
+            hamiltonians = self.hamiltonians
         res = State(np.zeros(state.shape), is_ket=state.is_ket, code=state.code, IS_subspace=state.IS_subspace,
                     graph=state.graph)
-        for i in range(len(self.hamiltonians)):
-            res = res - 1j * self.hamiltonians[i].left_multiply(state)
+        for i in range(len(hamiltonians)):
+            res = res - 1j * hamiltonians[i].left_multiply(state)
         return res
 
     def evolve(self, state: State, time):
@@ -37,14 +47,32 @@ class SchrodingerEquation(object):
         return expm_multiply(-1j * time * sparse_hamiltonian, state)
 
     def run_ode_solver(self, state: State, t0, tf, num=50, schedule=lambda t: None, times=None, method='RK45',
-                       full_output=True, verbose=False):
-        """Numerically integrates the Schrodinger equation"""
+                       full_output=True, verbose=False, interaction_picture=None):
+        """Numerically integrates the Schrodinger equation. If ``schedule`` is a
+        :py:class:`qsim.evolution.schedule.CompiledSchedule`, the Hamiltonian is evaluated from it directly, and the
+        Hamiltonians of this equation are not used.
+
+        If ``interaction_picture`` is one of the Hamiltonians, which must be diagonal, the state is integrated in the
+        frame rotating with it, see :py:class:`qsim.evolution.interaction_picture.InteractionPicture`, and transformed
+        back to the lab frame at the output times. This allows much larger steps when that Hamiltonian is a large
+        detuning.
+
+        Implicit methods of :py:func:`scipy.integrate.solve_ivp` (BDF, Radau and LSODA) are given the exact sparse
+        Jacobian :math:`-iH(t)`."""
         assert state.is_ket
         # Save s properties
         is_ket = state.is_ket
         code = state.code
         IS_subspace = state.IS_subspace
         graph = state.graph
+        compiled = isinstance(schedule, CompiledSchedule)
+        hamiltonians = self.hamiltonians
+        frame = None
+        if interaction_picture is not None:
+            if compiled:
+                raise NotImplementedError('The interaction picture is not implemented for compiled schedules.')
+            frame = InteractionPicture(interaction_picture, schedule=schedule, t0=t0, tf=tf)
+            hamiltonians = [h for h in self.hamiltonians if h is not interaction_picture]
 
         def f(t, s):
             global state
@@ -52,10 +80,29 @@ class SchrodingerEquation(object):
                 t, s = s, t
             if method != 'odeint':
                 s = np.reshape(np.expand_dims(s, axis=0), state_shape)
+            if compiled:
+                return (-1j * schedule.left_multiply(t, s)).flatten()
             schedule(t)
+            if frame is not None:
+                s = frame.to_lab(t, s)
             s = State(s, is_ket=is_ket, code=code, IS_subspace=IS_subspace, graph=graph)
+            if frame is not None:
+                return frame.to_interaction(t, self.evolution_generator(s, hamiltonians=hamiltonians)).flatten()
             return np.asarray(self.evolution_generator(s)).flatten()
 
+        def jac(t, s):
+            # The right hand side is linear, so its Jacobian is -iH(t), conjugated into the rotating frame if needed
+            if compiled:
+                return -1j * schedule.hamiltonian(t)
+            schedule(t)
+            if frame is None:
+                return -1j * csr_matrix(self._composite_hamiltonian())
+            ham = csr_matrix((state_shape[0], state_shape[0]))
+            for h in hamiltonians:
+                ham = ham + h.hamiltonian
+            phases = diags(frame.phases(t))
+            return -1j * (phases.conj() @ csr_matrix(ham) @ phases).tocsr()
+
         # s is a ket specifying the initial codes
         # tf is the total simulation time
         state_asarray = np.asarray(state)
@@ -65,6 +112,8 @@ class SchrodingerEquation(object):
                     times = np.linspace(t0, tf, num=num)
                 z, infodict = odeintw(f, state_asarray, times, full_output=True)
                 infodict['t'] = times
+                if frame is not None:
+                    z = np.array([frame.to_lab(t, zi) for (t, zi) in zip(times, z)])
                 norms = np.linalg.norm(z, axis=(-2, -1))
                 if verbose:
                     print('Fraction of integrator results normalized:',
@@ -85,6 +134,8 @@ class SchrodingerEquation(object):
                         s = odeintw(f, s, [times[i - 1], times[i]], full_output=False)[-1]
                         # Normalize output?
                         norms[i] = np.linalg.norm(s)
+                if frame is not None:
+                    s = frame.to_lab(times[-1], s)
                 infodict = {'t': times}
                 if verbose:
                     print('Fraction of integrator results normalized:',
@@ -97,11 +148,13 @@ class SchrodingerEquation(object):
             state_shape = state.shape
             state_asarray = state_asarray.flatten()
             if full_output:
-                res = scipy.integrate.solve_ivp(f, (t0, tf), state_asarray, t_eval=times, method=method)
+                res = _solve_ivp(f, jac, (t0, tf), state_asarray, t_eval=times, method=method)
             else:
-                res = scipy.integrate.solve_ivp(f, (t0, tf), state_asarray, t_eval=[tf], method=method)
+                res = _solve_ivp(f, jac, (t0, tf), state_asarray, t_eval=[tf], method=method)
             res.y = np.swapaxes(res.y, 0, 1)
             res.y = np.reshape(res.y, (-1, state_shape[0], state_shape[1]))
+            if frame is not None:
+                res.y = np.array([frame.to_lab(t, y) for (t, y) in zip(res.t, res.y)])
             norms = np.linalg.norm(res.y, axis=(-2, -1))
             if verbose:
                 print('Fraction of integrator results normalized:',
@@ -112,6 +165,147 @@ class SchrodingerEquation(object):
             res.y = res.y / norms
             return res.y, res
 
+    def track_eigenstates(self, times, schedule=lambda t: None, k=2, which='S', guard=2, threshold=0.5, tol=1e-10,
+                          retries=3):
+        """
+        Follow eigenstates of the Hamiltonian along a schedule by continuation. At each time, the eigenvectors at the
+        previous time seed the eigensolver, as in :py:meth:`spectrum`, and the new eigenvectors are assigned to the
+        states being followed by the Hungarian algorithm on their overlaps. Within degenerate eigenspaces the
+        eigenvectors are first rotated onto the previous ones, and each is given the phase which makes its overlap with
+        its predecessor real and positive. If some state overlaps too little with its assigned eigenvector, it has
+        crossed out of the eigenpairs solved for, and the eigenpairs are solved for again from scratch with a wider
+        window.
+
+        :param times: Times at which to find the eigenstates, in order along the schedule.
+        :type times: np.ndarray
+        :param schedule: Function of time which updates the Hamiltonians.
+        :type schedule: callable
+        :param k: Number of eigenstates to follow, which are the lowest (``which='S'``) or highest (``which='L'``) at the
+            first time.
+        :type k: int
+        :param which: Whether to follow the smallest (``'S'``) or largest (``'L'``) eigenvalues.
+        :type which: str
+        :param guard: Number of additional eigenpairs solved for, which the followed states may cross into.
+        :type guard: int
+        :param threshold: A crossing out of the window is detected if a followed state has squared overlap less than
+            ``threshold`` with its assigned eigenvector.
+        :type threshold: float
+        :param tol: Relative accuracy of the eigenvalues, passed to ``eigsh``.
+        :type tol: float
+        :param retries: Maximum number of times the window is widened by ``guard`` eigenpairs at each time.
+        :type retries: int
+        :return: Eigenvalues with shape ``(len(times), k)`` and eigenvectors with shape ``(len(times), k, dim)`` of the
+            followed states, the rank of each in the spectrum at each time with shape ``(len(times), k)``, counted from
+            the lowest (``which='S'``) or highest (``which='L'``) eigenvalue, and a dictionary with the number of
+            ``crossings`` detected.
+        :rtype: tuple
+        """
+        eigvals = np.zeros((len(times), k))
+        eigvecs = None
+        ranks = np.zeros((len(times), k), dtype=int)
+        crossings = 0
+        block = None
+        previous = None
+        for i in range(len(times)):
+            schedule(times[i])
+            ham = self._composite_hamiltonian()
+            width = guard
+            for attempt in range(retries + 1):
+                values, vectors = self._eig_seeded(ham, k, which=which, block=block if attempt == 0 else None,
+                                                   guard=width, tol=tol)
+                if which == 'L':
+                    values, vectors = values[::-1], vectors[:, ::-1]
+                if previous is None:
+                    order = np.arange(k)
+                    break
+                vectors = _align_degenerate(values, vectors, previous)
+                order = _match_by_overlap(previous, vectors)
+                overlaps = np.abs(np.sum(previous.conj() * vectors[:, order], axis=0)) ** 2
+                if np.all(overlaps >= threshold) or vectors.shape[1] == ham.shape[0]:
+                    break
+                if attempt == 0:
+                    crossings += 1
+                width = width + guard
+            block = vectors
+            current = vectors[:, order]
+            if previous is not None:
+                # Continuous phases
+                phases = np.sum(previous.conj() * current, axis=0)
+                current = current * np.where(np.abs(phases) > 0, phases.conj() / np.where(np.abs(phases) > 0,
+                                                                                          np.abs(phases), 1), 1)
+            if eigvecs is None:
+                eigvecs = np.zeros((len(times), k, ham.shape[0]), dtype=np.result_type(current, np.complex128))
+            eigvals[i] = values[order]
+            eigvecs[i] = current.T
+            ranks[i] = order
+            previous = current
+        return eigvals, eigvecs, ranks, {'crossings': crossings}
+
+    def run_adjoint_solver(self, state: State, t0, tf, observable, schedule, params, method='RK45', rtol=1e-8,
+                           atol=1e-10, eps=1e-6):
+        """Computes the expectation value of a Hermitian ``observable`` in the state evolved to ``tf``, and its
+        gradient with respect to the parameters ``params`` of a schedule ``schedule(t, params)``, by the adjoint
+        method, see :py:func:`qsim.evolution.adjoint.adjoint_gradient`. The Hamiltonians must be linear in the
+        energies the schedule sets. The derivatives of the energies are central differences of the schedule alone,
+        with step ``eps``.
+
+        :return: The expectation value, its gradient, and a dictionary with the final state ``y`` and the number of
+            evaluations of the forward and backward solves, ``nfev``.
+        :rtype: tuple
+        """
+        assert state.is_ket
+        operators = [-1j * csr_matrix(operator) for h in self.hamiltonians for operator in _energy_operators(h)]
+        coefficients, derivatives = _parameterized_energies(self.hamiltonians, schedule, params, eps=eps)
+        observable = csr_matrix(observable)
+
+        def seed(y):
+            # dJ = Re((2 C y)^dagger dy) for J = <y|C|y>
+            observable_y = observable @ y
+            return np.real(np.vdot(y, observable_y)), 2 * observable_y
+
+        value, gradient, info = adjoint_gradient(operators, coefficients, derivatives, np.asarray(state), t0, tf, seed,
+                                                 method=method, rtol=rtol, atol=atol)
+        info['y'] = info['y'].reshape(state.shape)
+        return value, gradient, info
+
+    def run_parareal_solver(self, state: State, t0, tf, slices=8, schedule=lambda t: None, method='RK45',
+                            coarse_steps=1, workers=None, tol=1e-4, max_iterations=None, full_output=True,
+                            verbose=False):
+        """Integrates the Schrodinger equation by Parareal, see :py:func:`qsim.evolution.parareal.parareal`. The
+        fine propagator is :py:meth:`run_ode_solver` with ``method`` on each of ``slices`` equal time slices, run in
+        parallel over ``workers`` processes. The coarse propagator takes ``coarse_steps`` steps per slice, each the
+        exponential of the Hamiltonian at the midpoint of the step. Parareal converges in few iterations only if the
+        coarse propagator tracks the phases of the fine one, so coherent dynamics need more coarse steps than
+        dissipative dynamics. Returns the states at the slice boundaries if ``full_output``, and otherwise the final
+        state."""
+        assert state.is_ket
+        code = state.code
+        IS_subspace = state.IS_subspace
+        graph = state.graph
+
+        def fine(s, ta, tb):
+            return self.run_ode_solver(State(s, code=code, IS_subspace=IS_subspace, graph=graph), ta, tb,
+                                       schedule=schedule, times=[ta, tb], method=method)[0][-1]
+
+        def coarse(s, ta, tb):
+            dt = (tb - ta) / coarse_steps
+            for i in range(coarse_steps):
+                schedule(ta + (i + 1 / 2) * dt)
+                s = expm_multiply(-1j * dt * self._composite_hamiltonian(), s)
+            return s
+
+        z, infodict = parareal(fine, coarse, np.asarray(state, dtype=np.complex128),
+                               np.linspace(t0, tf, num=slices + 1), workers=workers, tol=tol,
+                               max_iterations=max_iterations)
+        norms = np.linalg.norm(z, axis=(-2, -1))
+        if verbose:
+            print('Parareal iterations:', infodict['iterations'])
+            print('Final state norm - 1:', norms[-1] - 1)
+        z = z / norms[:, np.newaxis, np.newaxis]
+        if not full_output:
+            z = z[-1:]
+        return z, infodict
+
     def run_trotterized_solver(self, state: State, t0, tf, num=50, schedule=lambda t: None, times=None,
                                full_output=True, verbose=False):
         """Trotterized approximation of the Schrodinger equation"""
@@ -253,3 +447,233 @@ class SchrodingerEquation(object):
             return eigvals[0], State(eigvecs[0, np.newaxis].T, is_ket=True)
         elif which == 'L':
             return eigvals[-1], State(eigvecs[-1, np.newaxis].T, is_ket=True)
+
+    def _composite_hamiltonian(self):
+        """Sum the Hamiltonians into a sparse matrix with a fixed sparsity pattern. The pattern and the position of
+        each Hamiltonian's entries in it are computed once, so that when a schedule only rescales the Hamiltonians,
+        the sum is a single scatter of their entries rather than a sequence of sparse matrix additions."""
+        matrices = [h.hamiltonian for h in self.hamiltonians]
+        if not all(issparse(m) for m in matrices):
+            ham = matrices[0]
+            for m in matrices[1:]:
+                ham = ham + m
+            return ham
+        matrices = [m.tocsr() for m in matrices]
+        for m in matrices:
+            if not m.has_canonical_format:
+                m.sum_duplicates()
+        if self._pattern is not None and not all(np.array_equal(m.indptr, indptr) and np.array_equal(m.indices, indices)
+                                                 for m, (indptr, indices) in zip(matrices, self._pattern[3])):
+            self._pattern = None
+        if self._pattern is None:
+            dim = matrices[0].shape[0]
+            # Flat (row, column) index of each stored entry
+            flat = [np.repeat(np.arange(dim, dtype=np.int64), np.diff(m.indptr)) * dim + m.indices for m in matrices]
+            pattern = np.unique(np.concatenate(flat))
+            indptr = np.searchsorted(pattern, np.arange(dim + 1, dtype=np.int64) * dim)
+            # Position in the pattern of each stored entry, and the structure of each matrix it was computed for
+            self._pattern = (indptr, pattern % dim, np.searchsorted(pattern, np.concatenate(flat)),
+                             [(m.indptr.copy(), m.indices.copy()) for m in matrices])
+        indptr, indices, index, _ = self._pattern
+        data = np.concatenate([m.data for m in matrices])
+        summed = np.bincount(index, weights=data.real, minlength=len(indices))
+        if np.iscomplexobj(data):
+            summed = summed + 1j * np.bincount(index, weights=data.imag, minlength=len(indices))
+        return csr_matrix((summed, indices, indptr), shape=matrices[0].shape)
+
+    def _eig_seeded(self, ham, k, which='S', block=None, guard=2, tol=1e-10):
+        """Returns the ``k + guard`` lowest (``which='S'``) or highest (``which='L'``) eigenpairs of ``ham``, sorted by
+        eigenvalue. If approximate eigenvectors are given, Lanczos is started from their sum rather than from a random
+        vector, so that the starting vector already lies close to the invariant subspace being solved for."""
+        dim = ham.shape[0]
+        m = min(k + guard, dim)
+        if issparse(ham) and m < dim - 1:
+            v0 = None if block is None else np.sum(block, axis=1)
+            eigvals, eigvecs = eigsh(ham, k=m, which='SA' if which == 'S' else 'LA', v0=v0, tol=tol)
+        else:
+            if issparse(ham):
+                ham = ham.toarray()
+            eigvals, eigvecs = np.linalg.eigh(np.asarray(ham))
+            if which == 'S':
+                eigvals, eigvecs = eigvals[:m], eigvecs[:, :m]
+            else:
+                eigvals, eigvecs = eigvals[-m:], eigvecs[:, -m:]
+        order = np.argsort(eigvals)
+        return eigvals[order], eigvecs[:, order]
+
+    def spectrum(self, times, schedule=lambda t: None, k=2, which='S', track=False, return_eigenvectors=False,
+                 guard=2, tol=1e-10):
+        """
+        Find the lowest or highest eigenpairs of the Hamiltonian along a schedule by continuation: the eigenvectors
+        at each time seed the eigensolver at the next, which typically halves the number of Lanczos iterations
+        compared to solving from a random vector at each time.
+
+        :param times: Times at which to find the spectrum, in order along the schedule.
+        :type times: np.ndarray
+        :param schedule: Function of time which updates the Hamiltonians.
+        :type schedule: callable
+        :param k: Number of eigenpairs to find.
+        :type k: int
+        :param which: Whether to find the smallest (``'S'``) or largest (``'L'``) eigenvalues.
+        :type which: str
+        :param track: If True, order the eigenpairs at each time by their overlap with the eigenvectors at the previous
+            time rather than by eigenvalue, so that each column follows one eigenstate through level crossings.
+        :type track: bool
+        :param return_eigenvectors: If True, also return the eigenvectors.
+        :type return_eigenvectors: bool
+        :param guard: Number of additional eigenpairs solved for and carried to the next time, so that states entering
+            the ``k`` requested from above are already in the starting vector.
+        :type guard: int
+        :param tol: Relative accuracy of the eigenvalues, passed to ``eigsh``.
+        :type tol: float
+        :return: Eigenvalues with shape ``(len(times), k)``, sorted in ascending order unless ``track`` is True, and if
+            ``return_eigenvectors`` is True, eigenvectors with shape ``(len(times), k, dim)``.
+        """
+        eigvals = np.zeros((len(times), k))
+        eigvecs = None
+        block = None
+        for i in range(len(times)):
+            schedule(times[i])
+            ham = self._composite_hamiltonian()
+            values, vectors = self._eig_seeded(ham, k, which=which, block=block, guard=guard, tol=tol)
+            block = vectors
+            if which == 'L':
+                values, vectors = values[-k:], vectors[:, -k:]
+            else:
+                values, vectors = values[:k], vectors[:, :k]
+            if track and i > 0:
+                order = _match_by_overlap(previous, vectors)
+                values, vectors = values[order], vectors[:, order]
+            if return_eigenvectors:
+                if eigvecs is None:
+                    eigvecs = np.zeros((len(times), k, vectors.shape[0]), dtype=np.result_type(vectors, np.complex128))
+                eigvecs[i] = vectors.T
+            eigvals[i] = values
+            previous = vectors
+        if return_eigenvectors:
+            return eigvals, eigvecs
+        return eigvals
+
+
+    def minimum_gap(self, t0, tf, schedule=lambda t: None, degeneracy=1, num=20, rtol=1e-6, guard=2,
+                    full_output=False):
+        """
+        Find the minimum spectral gap along a schedule. The gap is first found on a coarse grid of times, then each
+        local minimum of the coarse gaps is refined by a bounded Brent search between its neighboring grid points.
+        Every eigensolve is seeded with the eigenvectors of the previous one.
+
+        :param t0: Start time of the schedule.
+        :type t0: float
+        :param tf: End time of the schedule.
+        :type tf: float
+        :param schedule: Function of time which updates the Hamiltonians.
+        :type schedule: callable
+        :param degeneracy: Degeneracy of the ground state at the end of the schedule. The gap is measured between the
+            lowest eigenvalue and the lowest eigenvalue above the ``degeneracy`` states that become the ground space,
+            so that the closing of the gap within the ground space is not mistaken for the minimum gap.
+        :type degeneracy: int
+        :param num: Number of times in the coarse grid.
+        :type num: int
+        :param rtol: Tolerance on the location of each minimum, relative to the spacing of the coarse grid. The gap
+            is quadratic about a minimum, so its relative error is much smaller.
+        :type rtol: float
+        :param guard: Number of additional eigenpairs carried between eigensolves, see :py:meth:`spectrum`.
+        :type guard: int
+        :param full_output: If True, also return a dictionary with the coarse grid ``'t'``, the gaps on it
+            ``'gaps'``, and the total number of eigensolves ``'nfev'``.
+        :type full_output: bool
+        :return: The minimum gap and the time at which it occurs.
+        """
+        k = degeneracy + 1
+        times = np.linspace(t0, tf, num=num)
+        eigvals, eigvecs = self.spectrum(times, schedule=schedule, k=k, return_eigenvectors=True, guard=guard)
+        gaps = eigvals[:, -1] - eigvals[:, 0]
+        info = {'t': times, 'gaps': gaps, 'nfev': num}
+        block = None
+
+        def gap(t):
+            nonlocal block
+            schedule(t)
+            values, block = self._eig_seeded(self._composite_hamiltonian(), k, block=block, guard=guard)
+            info['nfev'] += 1
+            return values[k - 1] - values[0]
+
+        i = int(np.argmin(gaps))
+        min_gap, min_time = gaps[i], times[i]
+        for i in range(num):
+            # Refine the local minima of the coarse scan
+            if (i > 0 and gaps[i] > gaps[i - 1]) or (i < num - 1 and gaps[i] > gaps[i + 1]):
+                continue
+            lower, upper = times[max(i - 1, 0)], times[min(i + 1, num - 1)]
+            block = eigvecs[i].T
+            res = minimize_scalar(gap, bounds=(lower, upper), method='bounded',
+                                  options={'xatol': rtol * (tf - t0) / max(num - 1, 1)})
+            if res.fun < min_gap:
+                min_gap, min_time = res.fun, res.x
+        if full_output:
+            return min_gap, min_time, info
+        return min_gap, min_time
+
+
+def _match_by_overlap(previous, vectors):
+    """Pair each of the previous eigenvectors with a distinct new eigenvector so that the total squared overlap is
+    largest, by the Hungarian algorithm. Returns the permutation of the new eigenvectors matching the order of the
+    previous ones."""
+    overlaps = np.abs(previous.conj().T @ vectors) ** 2
+    rows, columns = linear_sum_assignment(overlaps, maximize=True)
+    order = np.zeros(overlaps.shape[0], dtype=int)
+    order[rows] = columns
+    return order
+
+
+def _align_degenerate(values, vectors, previous, rtol=1e-8):
+    """Rotate the new eigenvectors within each degenerate eigenspace onto the previous eigenvectors which overlap most
+    with it, so that eigenvectors change continuously even though an eigensolver returns an arbitrary basis of each
+    degenerate eigenspace."""
+    vectors = vectors.astype(np.result_type(vectors, previous), copy=True)
+    scale = max(np.max(np.abs(values)), 1)
+    for cluster in np.split(np.arange(len(values)), np.flatnonzero(np.diff(values) > rtol * scale) + 1):
+        if len(cluster) > 1:
+            overlaps = vectors[:, cluster].conj().T @ previous
+            chosen = np.sort(np.argsort(np.linalg.norm(overlaps, axis=0))[-len(cluster):])
+            # The unitary rotation of the eigenspace which takes its first eigenvectors closest to the chosen previous
+            # eigenvectors, completed by the rest of the eigenspace if there are fewer previous eigenvectors
+            u, _, vh = np.linalg.svd(overlaps[:, chosen])
+            rotation = np.hstack([u[:, :len(chosen)] @ vh, u[:, len(chosen):]])
+            vectors[:, cluster] = vectors[:, cluster] @ rotation
+    return vectors
+
+
+# Methods of solve_ivp which solve linear systems with the Jacobian of the right hand side
+_IMPLICIT_METHODS = ('BDF', 'Radau', 'LSODA')
+
+
+def _solve_ivp(fun, jac, t_span, y0, method='RK45', **kwargs):
+    """Wraps :py:func:`scipy.integrate.solve_ivp`. Implicit methods are given the exact Jacobian ``jac(t, y)`` of
+    ``fun``, rather than approximating it by finite differences over every column. Radau and LSODA only integrate
+    real equations, so for them the complex state is split into its real and imaginary parts, and the Jacobian into
+    the corresponding real block matrix, which is dense for LSODA."""
+    y0 = np.asarray(y0, dtype=np.complex128)
+    if method not in _IMPLICIT_METHODS:
+        return scipy.integrate.solve_ivp(fun, t_span, y0, method=method, **kwargs)
+    if method == 'BDF':
+        return scipy.integrate.solve_ivp(fun, t_span, y0, method=method, jac=jac, **kwargs)
+    n = len(y0)
+
+    def fun_real(t, y):
+        dy = np.asarray(fun(t, y[:n] + 1j * y[n:]))
+        return np.concatenate([dy.real, dy.imag])
+
+    def jac_real(t, y):
+        jacobian = jac(t, y[:n] + 1j * y[n:])
+        if method == 'LSODA':
+            jacobian = jacobian.toarray() if issparse(jacobian) else np.asarray(jacobian)
+            return np.block([[jacobian.real, -jacobian.imag], [jacobian.imag, jacobian.real]])
+        jacobian = csr_matrix(jacobian)
+        return bmat([[jacobian.real, -jacobian.imag], [jacobian.imag, jacobian.real]], format='csc')
+
+    kwargs.pop('vectorized', None)
+    res = scipy.integrate.solve_ivp(fun_real, t_span, np.concatenate([y0.real, y0.imag]), method=method,
+                                    jac=jac_real, **kwargs)
+    res.y = res.y[:n] + 1j * res.y[n:]
+    return res
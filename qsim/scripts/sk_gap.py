@@ -160,19 +160,12 @@ def find_gap(graph, use_Z2_symmetry=True):
     else:
         driver = HamiltonianDriver(graph=Graph(nx.complete_graph(graph.n)))
     n_ground = len(ground_states(cost.hamiltonian))
-    times = np.arange(0, 1, .01)
 
     def schedule(t):
         cost.energies = (t,)
         driver.energies = (t - 1,)
 
-    min_gap = np.inf
-    for i in range(len(times)):
-        schedule(times[i])
-        eigvals = SchrodingerEquation(hamiltonians=[cost, driver]).eig(k=n_ground + 1, return_eigenvectors=False)
-        eigvals = np.flip(eigvals)
-        if eigvals[-1] - eigvals[0] < min_gap:
-            min_gap = eigvals[-1] - eigvals[0]
+    min_gap, _ = SchrodingerEquation(hamiltonians=[cost, driver]).minimum_gap(0, 1, schedule, degeneracy=n_ground)
     return min_gap, n_ground
 
 
@@ -242,20 +235,12 @@ def find_gap_fixed_n(n, use_degenerate=True, use_Z2_symmetry=True, verbose=False
         cost.energies = (np.sqrt(np.math.factorial(p)/(2 * graph.n**(p-1))) * t,)
         driver.energies = (1-t,)
 
-    def gap(t):
-        t = t[0]
-        if verbose:
-            print('time', t)
-        schedule(t)
-        eigvals = SchrodingerEquation(hamiltonians=[cost, driver]).eig(k=n_ground + 1, return_eigenvectors=False)
-        eigvals = np.flip(eigvals)
-        if verbose:
-            print('gap', eigvals[-1]-eigvals[0])
-        return eigvals[-1]-eigvals[0]
-
     # Now minimize the gap
-    min_gap = scipy.optimize.minimize(gap, .85, bounds=[(0, 1)])
-    return min_gap.fun
+    min_gap, time = SchrodingerEquation(hamiltonians=[cost, driver]).minimum_gap(0, 1, schedule, degeneracy=n_ground)
+    if verbose:
+        print('time', time)
+        print('gap', min_gap)
+    return min_gap
 
 
 def gap_over_time(graph, verbose=False, use_Z2_symmetry=True):
@@ -287,14 +272,12 @@ def gap_over_time(graph, verbose=False, use_Z2_symmetry=True):
         cost.energies = (1 / np.sqrt(graph.n) * t,)
         driver.energies = (1 - t,)
 
-    all_eigvals = np.zeros((len(times), n_ground + 1))
-    for i in range(len(times)):
+    def verbose_schedule(t):
         if verbose:
-            print(times[i])
-        schedule(times[i])
-        eigvals = SchrodingerEquation(hamiltonians=[cost, driver]).eig(k=n_ground + 1, return_eigenvectors=False)
-        eigvals = np.flip(eigvals)
-        all_eigvals[i] = eigvals
+            print(t)
+        schedule(t)
+
+    all_eigvals = SchrodingerEquation(hamiltonians=[cost, driver]).spectrum(times, verbose_schedule, k=n_ground + 1)
     for i in range(n_ground + 1):
         plt.scatter(times, all_eigvals[:, i], color='blue', s=2)
     if verbose:
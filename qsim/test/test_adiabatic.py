@@ -86,6 +86,156 @@ class TestAdiabatic(unittest.TestCase):
 
         self.assertTrue(np.allclose(res_trotterize[0]['trotterize']['optimum_overlap'], res_odeint[0]['odeint']['optimum_overlap'], atol=1e-2))
 
+    def test_parallel_total_time(self):
+        simulation = adiabatic_simulation(sample_graph(), IS_subspace=False)
+        schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+        serial, _ = simulation.performance_vs_total_time(np.arange(1, 4), schedule, metric='optimum_overlap',
+                                                         method=['RK45', 'odeint'])
+        parallel, info = simulation.performance_vs_total_time(np.arange(1, 4), schedule, metric='optimum_overlap',
+                                                              method=['RK45', 'odeint'], workers=2)
+        for method in ['RK45', 'odeint']:
+            self.assertTrue(np.allclose(serial[method]['optimum_overlap'], parallel[method]['optimum_overlap']))
+        # Results are gathered in the order of the total times
+        self.assertTrue(np.allclose([t[-1] for t in info['odeint']['optimum_overlap']['t']], np.arange(1, 4)))
+
+    def test_compiled_schedule(self):
+        simulation = adiabatic_simulation(sample_graph(), IS_subspace=False)
+        for schedule in [lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10]),
+                         lambda t, tf: simulation.rydberg_MIS_schedule(t, tf, coefficients=[10, 10])]:
+            for method in ['RK45', 'odeint']:
+                results, _ = simulation.run(3, schedule, method=method, full_output=False)
+                compiled, _ = simulation.run(3, schedule, method=method, full_output=False, compiled=True)
+                self.assertTrue(np.allclose(results[-1], compiled[-1], atol=1e-5))
+        # Continuous noise
+        simulation = adiabatic_simulation(line_graph(2), IS_subspace=False, noisy=True, trotterize=False)
+        schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+        for method in ['RK45', 'BDF']:
+            results, _ = simulation.run(3, schedule, method=method, full_output=False)
+            compiled, _ = simulation.run(3, schedule, method=method, full_output=False, compiled=True)
+            self.assertTrue(np.allclose(results[-1], compiled[-1], atol=1e-5))
+
+    def test_distribution_vs_total_time(self):
+        simulation = adiabatic_simulation(sample_graph(), IS_subspace=False)
+        schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[1, 1])
+        distribution = simulation.distribution_vs_total_time(np.arange(1, 3), schedule)
+        cost = simulation.cost_hamiltonian.hamiltonian
+        for i, t in enumerate(np.arange(1, 3)):
+            results, _ = simulation.run(t, schedule, full_output=False)
+            probabilities = (np.abs(results[-1]) ** 2).flatten()
+            res = np.zeros(distribution.shape[1])
+            for j in range(len(probabilities)):
+                res[int(cost[j, j].real)] += probabilities[j]
+            self.assertTrue(np.allclose(distribution[i], res))
+        # Labels follow the energies of the cost Hamiltonian
+        simulation.cost_hamiltonian.energies = (2, 1)
+        self.assertTrue(np.array_equal(simulation.cost_hamiltonian.cost_labels,
+                                       simulation.cost_hamiltonian.hamiltonian.diagonal().real.astype(int)))
+
+    def test_interaction_picture(self):
+        # Strongly detuned schedule, integrated in the lab frame and in the frame rotating with the detuning
+        for graph, noisy in [(sample_graph(), False), (line_graph(2), True)]:
+            simulation = adiabatic_simulation(graph, noisy=noisy, trotterize=False)
+            laser, detuning = simulation.hamiltonian
+
+            def schedule(t, tf):
+                laser.energies = (1,)
+                detuning.energies = (50 * (1 - 2 * t / tf) + np.sin(t), 1)
+
+            lab, _ = simulation.run(3, schedule, method='odeint', full_output=False)
+            lab_rk45, lab_info = simulation.run(3, schedule, method='RK45', full_output=False)
+            rotating, info = simulation.run(3, schedule, method='RK45', full_output=False,
+                                            interaction_picture=detuning)
+            self.assertTrue(np.allclose(lab[-1], rotating[-1], atol=1e-3))
+            self.assertLess(info.nfev, lab_info.nfev / 2)
+
+    def test_implicit_solvers(self):
+        # Implicit solvers are given the exact Jacobian, and complex states are split for those which are real-only
+        for graph, noisy in [(sample_graph(), False), (line_graph(2), True)]:
+            simulation = adiabatic_simulation(graph, noisy=noisy, trotterize=False)
+            schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+            reference, _ = simulation.run(2, schedule, method='odeint', full_output=False)
+            for method in ['BDF', 'Radau', 'LSODA']:
+                results, _ = simulation.run(2, schedule, method=method, full_output=False)
+                self.assertTrue(np.allclose(reference[-1], results[-1], atol=5e-2))
+        # The interaction picture is also supported
+        laser, detuning = simulation.hamiltonian
+        results, _ = simulation.run(2, schedule, method='Radau', full_output=False, interaction_picture=detuning)
+        self.assertTrue(np.allclose(reference[-1], results[-1], atol=5e-2))
+
+    def test_parareal(self):
+        for graph, noisy in [(sample_graph(), False), (line_graph(2), True)]:
+            simulation = adiabatic_simulation(graph, noisy=noisy, trotterize=False)
+            schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+            serial, _ = simulation.run(2, schedule, method='RK45', full_output=False)
+            parallel, info = simulation.run(2, schedule, method='RK45', full_output=False, slices=4, workers=2)
+            self.assertTrue(np.allclose(serial[-1], parallel[-1], atol=1e-2))
+            self.assertLessEqual(info['iterations'], 4)
+            # The states are output at the slice boundaries
+            results, info = simulation.run(2, schedule, method='RK45', slices=4)
+            self.assertEqual(len(results), 5)
+            self.assertTrue(np.allclose(info['t'], np.linspace(0, 2, 5)))
+
+    def test_gradient(self):
+        # Compare the adjoint gradient to central differences of the metric
+        for graph, noisy in [(sample_graph(), False), (line_graph(2), True)]:
+            simulation = adiabatic_simulation(graph, noisy=noisy, trotterize=False)
+            laser, detuning = simulation.hamiltonian
+
+            def schedule(t, tf, params):
+                laser.energies = (params[0] * np.sin(np.pi * t / tf) ** 2,)
+                detuning.energies = (params[1] * (2 * t / tf - 1), 1)
+
+            params = np.array([3, 4])
+            value, gradient = simulation.gradient(2, schedule, params)
+            results, _ = simulation.run(2, lambda t, tf: schedule(t, tf, params), method='odeint', full_output=False)
+            self.assertTrue(np.isclose(value, simulation.cost_hamiltonian.approximation_ratio(results[-1]), atol=1e-5))
+            for k in range(len(params)):
+                step = np.zeros(len(params))
+                step[k] = 1e-4
+                difference = (simulation.gradient(2, schedule, params + step)[0] -
+                              simulation.gradient(2, schedule, params - step)[0]) / 2e-4
+                self.assertTrue(np.isclose(gradient[k], difference, atol=1e-5))
+
+    def test_spectrum_continuation(self):
+        # Warm-started eigensolves should find the same spectrum as solving from scratch at each time
+        simulation = adiabatic_simulation(sample_graph(), IS_subspace=False)
+        schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+        cold = simulation.spectrum_vs_time(1, schedule, k=3, num=20)
+        warm = simulation.spectrum_vs_time(1, schedule, k=3, num=20, continuation=True)
+        self.assertTrue(np.allclose(cold, warm))
+        # Tracking eigenstates only changes the order of the eigenvalues at each time
+        tracked = simulation.spectrum_vs_time(1, schedule, k=3, num=20, continuation=True, track=True)
+        self.assertTrue(np.allclose(np.sort(tracked, axis=1), cold))
+
+    def test_eigenstate_tracking(self):
+        graph = sample_graph()
+        simulation = adiabatic_simulation(graph, IS_subspace=True)
+        schedule = lambda t, tf: simulation.rydberg_MIS_schedule(t, tf, coefficients=[10, 10])
+        times = np.linspace(.001, .999, 100)
+        eigvecs, indices = simulation.groundstate_ordering_vs_time(times, schedule)
+        self.assertEqual(eigvecs.shape[:2], (len(times), graph.degeneracy))
+        # The states lead into the degenerate ground states, and change continuously through the degeneracies
+        self.assertTrue(np.array_equal(indices[-1], np.arange(graph.degeneracy)))
+        overlaps = np.abs(np.sum(eigvecs[:-1].conj() * eigvecs[1:], axis=-1)) ** 2
+        self.assertGreater(np.min(overlaps), .9)
+        # Every eigenstate is assigned a distinct index at each time
+        eigvecs, indices = simulation.eigenstate_ordering_vs_time(times, schedule, return_eigvecs=True)
+        for i in range(len(times)):
+            self.assertTrue(np.array_equal(np.sort(indices[i]), np.arange(indices.shape[1])))
+            self.assertTrue(np.allclose(eigvecs[i] @ eigvecs[i].conj().T, np.identity(indices.shape[1])))
+
+    def test_minimum_gap(self):
+        simulation = adiabatic_simulation(sample_graph(), IS_subspace=False)
+        schedule = lambda t, tf: simulation.linear_schedule(t, tf, coefficients=[10, 10])
+        gap, time, info = simulation.minimum_gap(1, schedule, full_output=True)
+        self.assertLess(info['nfev'], 50)
+        # Compare to a dense grid of times about the minimum
+        eigvals = simulation.spectrum_vs_time(1, schedule, k=simulation.graph.degeneracy + 1, num=2001,
+                                              continuation=True)
+        gaps = eigvals[:, -1] - eigvals[:, 0]
+        self.assertTrue(np.isclose(time, np.linspace(0, 1, 2001)[np.argmin(gaps)], atol=1e-3))
+        self.assertTrue(gap <= np.min(gaps) and np.isclose(gap, np.min(gaps), rtol=1e-6))
+
 
 if __name__ == '__main__':
     unittest.main()
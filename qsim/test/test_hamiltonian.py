@@ -64,6 +64,23 @@ class TestHamiltonian(unittest.TestCase):
         self.assertTrue(hr.cost_function(psi1) == 0)
         self.assertTrue(hr.cost_function(psi0) == 0)
 
+    def test_phase_lookup(self):
+        rng = np.random.default_rng(0)
+        psi = rng.normal(size=(2 ** g.n, 1)) + 1j * rng.normal(size=(2 ** g.n, 1))
+        psi = State(psi / np.linalg.norm(psi))
+        rho = State(tools.outer_product(psi, psi))
+        for hc in [hamiltonian.HamiltonianMaxCut(g), hamiltonian.HamiltonianMIS(g)]:
+            for energies in [hc.energies, (1.5, .5)[:len(hc.energies)]]:
+                hc.energies = energies
+                diagonal = hc._diagonal_hamiltonian
+                # Energies of the MaxCut Hamiltonian scale hc.hamiltonian but not evolution
+                u = np.exp(-1j * .7 * diagonal)
+                self.assertTrue(np.allclose(hc.evolve(psi, .7), u * psi))
+                self.assertTrue(np.allclose(hc.evolve(rho, .7), u * rho * u.conj().T))
+                self.assertTrue(np.allclose(hc.evolve(State(np.hstack([psi, psi]), is_ket=True), np.array([.7, -.2])),
+                                            np.exp(-1j * np.array([.7, -.2]) * diagonal) * psi))
+            self.assertEqual(hc._phase_table[1].dtype, np.uint8)
+
     def test_hamiltonian_driver(self):
         N = 6
 
@@ -0,0 +1,47 @@
+import numpy as np
+import unittest
+
+import networkx as nx
+from qsim.graph_algorithms.graph import Graph, ring_graph
+from qsim.evolution import hamiltonian
+from qsim.graph_algorithms import qaoa, light_cone
+
+
+class TestLightCone(unittest.TestCase):
+    def test_maxcut(self):
+        g = Graph(nx.random_regular_graph(3, 10, seed=0), IS=False)
+        param = np.array([.3, .7, 1.1, .2])
+        full = qaoa.SimulateQAOA(g, hamiltonian=[hamiltonian.HamiltonianMaxCut(g),
+                                                 hamiltonian.HamiltonianDriver(graph=g)] * 2,
+                                 cost_hamiltonian=hamiltonian.HamiltonianMaxCut(g))
+        sim = light_cone.LightConeQAOA(g, [lambda h: hamiltonian.HamiltonianMaxCut(h),
+                                           lambda h: hamiltonian.HamiltonianDriver(graph=h)] * 2,
+                                       lambda h: hamiltonian.HamiltonianMaxCut(h))
+        self.assertEqual(sim.radius, 2)
+        self.assertAlmostEqual(sim.run(param), full.run(param))
+
+        # Every edge of a ring has the same light cone
+        ring = ring_graph(12)
+        sim = light_cone.LightConeQAOA(ring, [lambda h: hamiltonian.HamiltonianMaxCut(h),
+                                              lambda h: hamiltonian.HamiltonianDriver(graph=h)],
+                                       lambda h: hamiltonian.HamiltonianMaxCut(h))
+        self.assertEqual(len(sim.cones), 1)
+        self.assertEqual(sim.cones[0][1], 12)
+
+    def test_mis(self):
+        g = nx.random_regular_graph(3, 8, seed=1)
+        for node in g.nodes:
+            g.nodes[node]['weight'] = 1 + node / 8
+        g = Graph(g, IS=False)
+        param = np.array([.4, .9])
+        full = qaoa.SimulateQAOA(g, hamiltonian=[hamiltonian.HamiltonianMIS(g, energies=(1, 2)),
+                                                 hamiltonian.HamiltonianDriver(graph=g)],
+                                 cost_hamiltonian=hamiltonian.HamiltonianMIS(g, energies=(1, 2)))
+        sim = light_cone.LightConeQAOA(g, [lambda h: hamiltonian.HamiltonianMIS(h, energies=(1, 2)),
+                                           lambda h: hamiltonian.HamiltonianDriver(graph=h)],
+                                       lambda h: hamiltonian.HamiltonianMIS(h, energies=(1, 2)))
+        self.assertAlmostEqual(sim.run(param), full.run(param))
+
+
+if __name__ == '__main__':
+    unittest.main()
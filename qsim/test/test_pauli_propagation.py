@@ -0,0 +1,54 @@
+import numpy as np
+import unittest
+
+import networkx as nx
+from qsim.graph_algorithms.graph import Graph
+from qsim.evolution import hamiltonian, pauli_propagation
+from qsim.graph_algorithms import qaoa
+from qsim.tools import tools
+
+
+class TestPauliPropagation(unittest.TestCase):
+    def test_evolve_adjoint(self):
+        # Compare with dense matrices on three qubits, for rotations about every Pauli
+        paulis = {'X': tools.X(), 'Y': tools.Y(), 'Z': tools.Z(), 'I': tools.identity()}
+        observable = pauli_propagation.PauliSum(3).add_term(.7, {0: 'Z', 2: 'Y'}).add_term(-.2, {1: 'X'})
+        generator = pauli_propagation.PauliSum(3).add_term(.3, {0: 'X', 1: 'Y'}).add_term(1.1, {0: 'X', 1: 'Y',
+                                                                                               2: 'Z'})
+
+        def dense(pauli_sum):
+            out = np.zeros((8, 8), dtype=np.complex128)
+            for k in range(len(pauli_sum)):
+                x, z = int(pauli_sum.x[k, 0]), int(pauli_sum.z[k, 0])
+                labels = ['IXZY'[(x >> i & 1) + 2 * (z >> i & 1)] for i in range(3)]
+                out += pauli_sum.coefficients[k] * tools.tensor_product([paulis[label] for label in labels])
+            return out
+
+        t = .4
+        h = dense(generator)
+        u = np.linalg.eigh(h)
+        u = u[1] @ np.diag(np.exp(-1j * t * u[0])) @ u[1].conj().T
+        expected = u.conj().T @ dense(observable) @ u
+        self.assertTrue(np.allclose(dense(observable.evolve_adjoint(generator, t)), expected))
+
+    def test_qaoa(self):
+        g = nx.random_regular_graph(3, 8, seed=2)
+        for node in g.nodes:
+            g.nodes[node]['weight'] = 1 + node / 8
+        for edge in g.edges:
+            g.edges[edge]['weight'] = 1 + sum(edge) / 16
+        g = Graph(g, IS=False)
+        param = np.array([.3, -.7, 1.1, .2])
+        for cost in [hamiltonian.HamiltonianMaxCut(g), hamiltonian.HamiltonianMIS(g, energies=(1, 2))]:
+            sim = qaoa.SimulateQAOA(g, hamiltonian=[cost, hamiltonian.HamiltonianDriver()] * 2, cost_hamiltonian=cost)
+            self.assertAlmostEqual(sim.run_pauli_propagation(param), sim.run(param))
+            # Truncating to low weight strings is approximate
+            self.assertNotAlmostEqual(sim.run_pauli_propagation(param, max_weight=2), sim.run(param))
+        # The energy of the MaxCut Hamiltonian is applied the same way by both
+        cost = hamiltonian.HamiltonianMaxCut(g, energies=(2,))
+        sim = qaoa.SimulateQAOA(g, hamiltonian=[cost, hamiltonian.HamiltonianDriver()] * 2, cost_hamiltonian=cost)
+        self.assertAlmostEqual(sim.run_pauli_propagation(param), sim.run(param))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -84,6 +84,26 @@ class TestSimulateQAOA(unittest.TestCase):
         self.assertTrue(np.all(np.abs(Fgrad - np.array([-1.88407679, 5.27624478, 4.59242754, -0.84219134, 2.82847871,
                                                         1.00351662])) <= 1e-5))
 
+    def test_variational_grad_adjoint(self):
+        # Adjoint and checkpointed gradients agree with the memoized gradient
+        sim_deep = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 3)
+        params = np.array([-1, 4, 15, 5, -6, 7])
+        F, Fgrad = sim_deep.variational_grad(params, initial_state=psi0)
+        for mode in ['adjoint', 'checkpoint']:
+            F_mode, Fgrad_mode = sim_deep.variational_grad(params, initial_state=psi0, mode=mode)
+            self.assertTrue(np.isclose(F, F_mode))
+            self.assertTrue(np.allclose(Fgrad, Fgrad_mode))
+
+        # Noisy density matrices, with checkpoints
+        sim_damped = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 3, noise_model='channel')
+        sim_damped.noise = [quantum_channels.AmplitudeDampingChannel(rates=(.01,)), None] * 3
+        params = np.array([1, 4, 15, 5, 6, 7])
+        F, Fgrad = sim_damped.variational_grad(params, initial_state=rho0)
+        F_checkpoint, Fgrad_checkpoint = sim_damped.variational_grad(params, initial_state=rho0, mode='checkpoint')
+        self.assertTrue(np.isclose(F, F_checkpoint))
+        self.assertTrue(np.allclose(Fgrad, Fgrad_checkpoint))
+        self.assertTrue(np.isclose(F, sim_damped.run(params, initial_state=rho0)))
+
     def test_run(self):
         # p = 1 density matrix
         sim_ket.hamiltonian = hamiltonians
@@ -107,6 +127,106 @@ class TestSimulateQAOA(unittest.TestCase):
         self.assertTrue(np.allclose(
             Fgrad, np.array([-1.80872061, 4.86011747, 4.19677292, -0.79050022, 2.55669856, 0.94697709])))
 
+    def test_run_batch(self):
+        # Batched evaluation agrees with evaluating each parameter set separately
+        sim_ket.hamiltonian = hamiltonians * 2
+        params = np.array([[1, .5, 2, .3], [3, 4, 2, 5], [-1, 4, 15, 5]])
+        F = sim_ket.run_batch(params, initial_state=psi0, batch_size=2)
+        self.assertTrue(np.allclose(F, [sim_ket.run(param, initial_state=psi0) for param in params]))
+        # Layers of energy shifts are applied with per-column phases
+        shifted = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=[hc, hamiltonian.HamiltonianEnergyShift(
+            index=1, energies=(.7,), graph=g), hb])
+        params = np.array([[1, .5, 2], [3, 4, -2]])
+        psi = State(np.exp(1j * np.arange(2 ** N))[:, np.newaxis] / 2 ** (N / 2))
+        F = shifted.run_batch(params, initial_state=psi)
+        self.assertTrue(np.allclose(F, [shifted.run(param, initial_state=psi) for param in params]))
+
+    def test_find_parameters_multistart(self):
+        sim_ring.hamiltonian = ring_hamiltonians
+        results = sim_ring.find_parameters_multistart(n_starts=4, workers=2, verbose=False, initial_state=psi0, seed=0)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(np.isclose(results[0]['approximation_ratio'], 3 / 4))
+        self.assertTrue(all(results[i]['f_val'] >= results[i + 1]['f_val'] for i in range(3)))
+        # At p = 3 the optimum is reached, so the remaining starts are skipped
+        sim_ring.hamiltonian = ring_hamiltonians * 3
+        results = sim_ring.find_parameters_multistart(n_starts=50, verbose=False, initial_state=psi0, seed=0)
+        self.assertTrue(len(results) < 50)
+        self.assertTrue(np.isclose(results[0]['approximation_ratio'], 1))
+
+    def test_monte_carlo(self):
+        # Unraveled noise should agree with the density matrix simulation within the confidence interval
+        depolarizing = [quantum_channels.DepolarizingChannel(rates=(.05,))]
+        sim_channel = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 2, noise_model='channel',
+                                        noise=depolarizing * 4)
+        sim_monte_carlo = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 2,
+                                            noise_model='monte_carlo', noise=depolarizing * 4, num_samples=400)
+        params = np.array([1, 2, .5, .3])
+        F = sim_channel.run(params, initial_state=psi0)
+        results = sim_monte_carlo.run_monte_carlo(params, initial_state=psi0, seed=0)
+        self.assertTrue(np.abs(results['f_val'] - F) <= 4 * results['stderr'])
+        self.assertTrue(results['confidence_interval'][0] < results['f_val'] < results['confidence_interval'][1])
+        # Results are reproducible across processes
+        results_parallel = sim_monte_carlo.run_monte_carlo(params, initial_state=psi0, seed=0, workers=2)
+        self.assertTrue(np.allclose(results['samples'], results_parallel['samples']))
+        # The seed of the simulator makes run reproducible
+        sim_monte_carlo.seed, sim_monte_carlo.num_samples = 0, 32
+        F_seeded = sim_monte_carlo.run(params, initial_state=psi0)
+        self.assertEqual(F_seeded, sim_monte_carlo.run(params, initial_state=psi0))
+
+    def test_sampling(self):
+        sim_sampled = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 2)
+        params = np.array([.4, .3, .8, .2])
+        F = sim_sampled.run(params)
+        # Exact objectives reduce to the expectation value in the appropriate limit
+        self.assertAlmostEqual(sim_sampled.run_sampled(params, objective='cvar', alpha=1), F)
+        self.assertAlmostEqual(sim_sampled.run_sampled(params, objective='gibbs', eta=1e-8), F, places=5)
+        self.assertAlmostEqual(sim_sampled.run_sampled(params, objective='cvar', alpha=1e-3), hc.optimum)
+        # Sampled estimates are reproducible and concentrate around the exact value
+        sim_sampled.shots, sim_sampled.seed = 100000, 0
+        self.assertEqual(sim_sampled.run(params), sim_sampled.run(params))
+        self.assertTrue(np.abs(sim_sampled.run(params) - F) < .05)
+        indices, costs = sim_sampled.sample(params, 10, seed=1)
+        self.assertTrue(np.allclose(costs, hc._diagonal_hamiltonian[indices, 0]))
+
+    def test_cache(self):
+        sim_cached = qaoa.SimulateQAOA(g, cost_hamiltonian=hc, hamiltonian=hamiltonians * 2, cache_size=2)
+        params = np.array([.4, .3, .8, .2])
+        F = sim_cached.run(params)
+        self.assertEqual(sim_cached.run(params + 1e-14), F)
+        self.assertEqual(sim_cached.cache_info()['run'].hits, 1)
+        # Changing the configuration invalidates cached values
+        sim_cached.hamiltonian = hamiltonians
+        sim_cached.run(params[:2])
+        sim_cached.run(params[:2] + .1)
+        self.assertEqual(sim_cached.cache_info()['run'].misses, 3)
+        self.assertEqual(sim_cached.cache_info()['run'].currsize, 2)
+        # Cached gradients are copies
+        F, Fgrad = sim_cached.variational_grad(params[:2])
+        Fgrad[0] = 0
+        self.assertNotEqual(sim_cached.variational_grad(params[:2])[1][0], 0)
+        sim_cached.cache_clear()
+        self.assertEqual(sim_cached.cache_info()['variational_grad'].currsize, 0)
+
+    def test_find_initial_parameters(self):
+        # On a ring, depth p reaches an approximation ratio of (2p+1)/(2p+2) for p < N/2
+        sim_interp = qaoa.SimulateQAOA(ring, cost_hamiltonian=hc_ring, hamiltonian=ring_hamiltonians * 3)
+        cache = qaoa.ParameterCache()
+        for strategy in ['interp', 'fourier']:
+            results = sim_interp.find_initial_parameters(strategy=strategy,
+                                                         cache=cache if strategy == 'interp' else None)
+            self.assertEqual(sim_interp.depth, 6)
+            for p, result in enumerate(results[:2], start=1):
+                self.assertTrue(np.isclose(result['approximation_ratio'], (p * 2 + 1) / (p * 2 + 2)))
+            self.assertTrue(np.isclose(results[2]['approximation_ratio'], 1))
+        # Optimal parameters transfer to a larger ring, starting at the deepest cached depth
+        larger_ring = ring_graph(8)
+        hc_larger_ring = hamiltonian.HamiltonianMaxCut(larger_ring)
+        sim_transfer = qaoa.SimulateQAOA(larger_ring, cost_hamiltonian=hc_larger_ring,
+                                         hamiltonian=[hc_larger_ring, hb] * 2)
+        results = sim_transfer.find_initial_parameters(cache=cache)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(np.isclose(results[0]['approximation_ratio'], 5 / 6))
+
     def test_find_optimal_params(self):
         # Test on a known graph
         for p in [1, 2, 3]:
@@ -34,13 +34,9 @@ class TestDissipation(unittest.TestCase):
         self.assertTrue(np.allclose(psi2, psi3))
         self.assertTrue(np.allclose(psi2, psi4))
 
-        expected = np.zeros((4, 4))
-        expected[0, 0] = 0.46827
-        expected[1, 1] = 0.03173
-        expected[2, 2] = 0.46827
-        expected[3, 3] = 0.03173
+        # Evolving for a long time depolarizes every qubit
         psi0 = op0.evolve(psi0, 20)
-        self.assertTrue(np.allclose(expected, psi0))
+        self.assertTrue(np.allclose(.25 * np.identity(4), psi0))
 
         psi0 = State(np.array([[1, 0], [0, 0]]))
         psi0 = op0.evolve(psi0, 20)
@@ -72,6 +68,41 @@ class TestDissipation(unittest.TestCase):
         print(psi0)
         #self.assertTrue(np.allclose(psi0, np.array([[0, 0], [0, 1]])))
 
+    def test_evolve(self):
+        # Exact evolution should agree with repeated application of the channel
+        psi0 = tools.tensor_product([np.array([[1], [1]]) / np.sqrt(2)] * 3)
+        psi0 = State(tools.outer_product(psi0, psi0))
+        time = .7
+        for op in [quantum_channels.DepolarizingChannel(rates=(.5,)), quantum_channels.AmplitudeDampingChannel(),
+                   quantum_channels.PauliChannel(rates=(.1, .2, .3)), quantum_channels.ZenoChannel(rates=(.3, .2, .1))]:
+            rate = op.rates[0] if len(op.rates) == 1 else np.sum(op.rates)
+            p = op.rates[0] * time if len(op.rates) == 1 else np.asarray(op.rates) * time
+            n = int(np.ceil((rate * time) ** 2 / .05))
+            expected = psi0.copy()
+            for i in range(n):
+                expected = op.channel(expected, p / n)
+            self.assertTrue(np.allclose(op.evolve(psi0, time), expected))
+            # Repeated squaring of the superoperator agrees with the closed form
+            self.assertTrue(np.allclose(op.composite_superoperator(p / n, n),
+                                        quantum_channels.QuantumChannel.composite_superoperator(op, p / n, n)))
+
+    def test_pauli_transfer(self):
+        # The Pauli transfer backend should agree with the Kraus operators
+        psi0 = tools.tensor_product([np.array([[1], [1j]]) / np.sqrt(2), np.array([[.6], [.8]]),
+                                     np.array([[1], [-1]]) / np.sqrt(2)])
+        psi0 = State(tools.outer_product(psi0, psi0))
+        for op, p in [(quantum_channels.DepolarizingChannel(), .1),
+                      (quantum_channels.PauliChannel(), (.1, .05, .2)),
+                      (quantum_channels.PauliChannel(), (0, 0, .2)),
+                      (quantum_channels.ZenoChannel(), (.1, .05, .2))]:
+            for apply_to in [None, [2, 0]]:
+                expected = psi0.copy()
+                for i in (range(3) if apply_to is None else apply_to):
+                    povm = [tools.tensor_product([np.identity(2 ** i), k, np.identity(2 ** (2 - i))])
+                            for k in op.povm(p)]
+                    expected = sum(k @ expected @ k.conj().T for k in povm)
+                self.assertTrue(np.allclose(op.channel(psi0, p, apply_to=apply_to), expected))
+
 
 if __name__ == '__main__':
     unittest.main()
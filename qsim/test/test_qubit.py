@@ -1,5 +1,5 @@
 import unittest
-from qsim.codes import qubit
+from qsim.codes import qubit, contraction_plan
 import numpy as np
 from qsim import tools
 from qsim.codes.quantum_state import State
@@ -151,7 +151,23 @@ class TestQubit(unittest.TestCase):
         self.assertTrue(np.allclose(psi2, psi3))
         self.assertTrue(np.allclose(psi3, psi4))
 
-
+    def test_contraction_plan_cache(self):
+        N = 4
+        rng = np.random.default_rng(0)
+        psi = rng.normal(size=(2 ** N, 1)) + 1j * rng.normal(size=(2 ** N, 1))
+        rho = State(tools.outer_product(psi, psi))
+        a = rng.normal(size=(2, 2)) + 1j * rng.normal(size=(2, 2))
+        b = rng.normal(size=(2, 2)) + 1j * rng.normal(size=(2, 2))
+        # Unsorted apply_to should agree with the equivalent full operator
+        full = tools.tensor_product([b, tools.identity(), a, tools.identity()])
+        expected = full @ rho @ full.conj().T
+        contraction_plan.cache_clear()
+        for _ in range(3):
+            self.assertTrue(np.allclose(qubit.multiply(rho, [2, 0], tools.tensor_product([a, b])), expected))
+        info = contraction_plan.cache_info()
+        self.assertEqual(info['left_multiply'].misses, 1)
+        self.assertEqual(info['left_multiply'].hits, 2)
+        self.assertEqual(info['right_multiply'].misses, 1)
 
 
 if __name__ == '__main__':
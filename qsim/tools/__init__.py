@@ -0,0 +1 @@
+from qsim.tools import parallel
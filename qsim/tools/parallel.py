@@ -0,0 +1,54 @@
+"""Process-parallel map used by the simulation classes. Simulation objects hold code modules and locally defined
+functions, which cannot be pickled, so worker processes are forked and look the task up instead of receiving it."""
+
+import functools
+import multiprocessing
+
+__all__ = ['parallel_map']
+
+_tasks = {}
+
+
+def _run_task(key, arg):
+    return _tasks[key](arg)
+
+
+def parallel_map(function, iterable, workers=None, stop=None):
+    """
+    Evaluate ``function`` on every element of ``iterable``, in parallel over ``workers`` processes.
+
+    :param function: Function of a single argument. Only its arguments and return values need to be picklable.
+    :type function: callable
+    :param iterable: Arguments to evaluate ``function`` on.
+    :param workers: Number of worker processes. If ``None`` or 1, or if the platform cannot fork processes, the map is
+        evaluated serially in the current process. If -1, use all available CPUs.
+    :type workers: int, optional
+    :param stop: Predicate on a single result. Once a result satisfies it, no further tasks are started, running tasks
+        are cancelled, and only the results computed so far are returned.
+    :type stop: callable, optional
+    :return: The list of results, in the order of ``iterable``.
+    :rtype: list
+    """
+    iterable = list(iterable)
+    if workers == -1:
+        workers = multiprocessing.cpu_count()
+    results = []
+    if workers is None or workers <= 1 or len(iterable) <= 1 or \
+            'fork' not in multiprocessing.get_all_start_methods():
+        for arg in iterable:
+            results.append(function(arg))
+            if stop is not None and stop(results[-1]):
+                break
+        return results
+    key = id(function)
+    _tasks[key] = function
+    try:
+        # Leaving the context terminates any tasks still running
+        with multiprocessing.get_context('fork').Pool(min(workers, len(iterable))) as pool:
+            for result in pool.imap(functools.partial(_run_task, key), iterable):
+                results.append(result)
+                if stop is not None and stop(result):
+                    break
+        return results
+    finally:
+        del _tasks[key]